@@ -0,0 +1,56 @@
+"""Times create_grid against the per-column interp1d loop it replaced, on examples/sample.pro.
+
+Run from the repository root:
+
+    python benchmarks/create_grid.py
+"""
+
+import sys
+import timeit
+sys.path.append('.')
+
+import numpy as np
+from scipy import interpolate
+from pyniviz import tools
+
+variable = 'element density (kg m-3)'
+height_name = 'height [> 0: top, < 0: bottom of elem.] (cm)'
+
+
+def interp1d_loop(pro, vertical_grid):
+
+    offsets = pro['offsets']
+    heights = pro['columns'][height_name]
+    values = pro['columns'][variable]
+
+    grid = np.full((len(vertical_grid), len(offsets) - 1), np.nan)
+
+    for count in range(len(offsets) - 1):
+
+        column = slice(offsets[count], offsets[count + 1])
+
+        my_interp = interpolate.interp1d(heights[column],
+                                         values[column],
+                                         kind='nearest',
+                                         bounds_error=False,
+                                         fill_value=(np.nan, np.nan))
+
+        grid[:, count] = np.flip(my_interp(vertical_grid), axis=0)
+
+    return(grid)
+
+
+pro = tools.read_pro('examples/sample.pro', variable, columnar=True)
+
+info = tools.create_grid(pro, variable)
+vertical_grid = np.linspace(info['min_height'], info['max_height'], info['grid'].shape[0])
+
+assert np.array_equal(info['grid'], interp1d_loop(pro, vertical_grid), equal_nan=True)
+
+n = 20
+loop_time = timeit.timeit(lambda: interp1d_loop(pro, vertical_grid), number=n) / n
+grid_time = timeit.timeit(lambda: tools.create_grid(pro, variable), number=n) / n
+
+print(f"{len(pro['dates'])} timesteps, {info['grid'].shape[0]} rows")
+print(f"interp1d loop: {loop_time * 1000:.1f} ms")
+print(f"create_grid:   {grid_time * 1000:.1f} ms ({loop_time / grid_time:.0f}x faster)")
@@ -0,0 +1,262 @@
+"""Times and memory-profiles each stage of the `main.plot_pro` pipeline, plus read_smet, on synthetic files.
+
+The stages are run one after the other, as plot_pro runs them, each on the output of the one before:
+
+    read_pro      parse the variable from the .PRO file into columnar data
+    create_grid   put it onto the regular grid
+    plot_grid     draw the grid and render it to PNG (with the Agg backend, nothing is shown)
+    read_smet     read every field of the .smet file
+
+Each stage is timed over a few repeats (the best and the median are kept), then run once more under tracemalloc to
+measure the peak memory it allocates. The synthetic files (see synthetic.py) are written to benchmarks/data the first
+time a size is asked for and reused after that.
+
+Each run appends a record to benchmarks/results.jsonl with the commit, the machine and the sizes, and prints how the
+stages compare with the last record from the same machine and sizes, so slowdowns between versions stand out. The
+results only mean something on the machine they were measured on, so the file is kept out of git.
+
+Run from the repository root, e.g.
+
+    python benchmarks/pipeline.py --size small
+    python benchmarks/pipeline.py --timesteps 20000 --elements 300 --repeat 1
+    python benchmarks/pipeline.py --codes 0502 0503 0513    # a narrow file, three variables per timestep
+"""
+
+import sys
+import os
+import io
+import json
+import hashlib
+import time
+import argparse
+import datetime
+import platform
+import statistics
+import subprocess
+import tracemalloc
+sys.path.append('.')
+sys.path.append('benchmarks')
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from pyniviz import tools
+from synthetic import write_pro, write_smet
+
+# (timesteps, elements) of the preset sizes. 'large' writes a file of about 1 GB.
+
+SIZES = {'small': (500, 50),
+         'medium': (5000, 150),
+         'large': (30000, 500)}
+
+DATA_DIRECTORY = os.path.join('benchmarks', 'data')
+RESULTS_FILE = os.path.join('benchmarks', 'results.jsonl')
+
+
+def synthetic_files(n_steps, n_elements, var_codes=None, directory=DATA_DIRECTORY):
+
+    """Returns the paths of a synthetic .PRO file and .smet file of the given size, writing them if needed.
+
+    The .smet file is half-hourly over the same period as the hourly .PRO file. var_codes are the per-element codes
+    the .PRO file holds, see `synthetic.write_pro`.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+
+    name = f"synthetic_{n_steps}x{n_elements}"
+    if var_codes is not None:
+        name += f"_{len(var_codes)}codes_{hashlib.sha1(','.join(var_codes).encode()).hexdigest()[:8]}"
+
+    pro_path = os.path.join(directory, f"{name}.pro")
+    smet_path = os.path.join(directory, f"synthetic_{2 * n_steps}.smet")
+
+    if not os.path.exists(pro_path):
+        write_pro(pro_path + '.part', n_steps, n_elements, var_codes)
+        os.replace(pro_path + '.part', pro_path)
+
+    if not os.path.exists(smet_path):
+        write_smet(smet_path + '.part', 2 * n_steps, step='30min')
+        os.replace(smet_path + '.part', smet_path)
+
+    return(pro_path, smet_path)
+
+
+def render_grid(info, variable):
+
+    """Draws a grid the way plot_pro does and renders the figure to PNG bytes."""
+
+    fig, ax = plt.subplots(1, 1, figsize=(10, 6))
+
+    try:
+        tools.plot_grid(info, variable, None, None, None, None, None, None, None, 'plasma', 0, ax)
+        tools.grid_colorbar(fig, ax, variable)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=100)
+    finally:
+        plt.close(fig)
+
+    return(buffer.getvalue())
+
+
+def pipeline_stages(pro_path, smet_path, variable):
+
+    """The stages to benchmark, in order, as (name, function) pairs. Each function takes the outputs of the
+    stages run so far, keyed by stage name."""
+
+    return([('read_pro', lambda done: tools.read_pro(pro_path, variable, columnar=True)),
+            ('create_grid', lambda done: tools.create_grid(done['read_pro'], variable)),
+            ('plot_grid', lambda done: render_grid(done['create_grid'], variable)),
+            ('read_smet', lambda done: tools.read_smet(smet_path))])
+
+
+def measure(function, done, repeat):
+
+    """Times a stage repeat times, then measures its peak memory in one more run.
+
+    Returns:
+        output: what the stage returned
+        result (dict): 'best_s' and 'median_s', the best and median times in seconds, and 'peak_mb', the most
+            memory allocated through Python at any one time during the stage (numpy arrays included)
+    """
+
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function(done)
+        times.append(time.perf_counter() - start)
+
+    del output
+
+    tracemalloc.start()
+    try:
+        output = function(done)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return(output, {'best_s': min(times), 'median_s': statistics.median(times), 'peak_mb': peak / 1e6})
+
+
+def environment():
+
+    """Where and on what the benchmark ran, so records can be told apart."""
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return({'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'machine': platform.node(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'matplotlib': matplotlib.__version__})
+
+
+def run_benchmark(n_steps, n_elements, variable='element density (kg m-3)', repeat=3, var_codes=None):
+
+    """Runs every stage on synthetic files of the given size.
+
+    Args:
+        var_codes (list): optional, the per-element codes of the .PRO file, which must include variable's.
+            Defaults to `synthetic.DEFAULT_CODES`.
+
+    Returns:
+        record (dict): the environment, the sizes and a result (see `measure`) for each stage
+    """
+
+    pro_path, smet_path = synthetic_files(n_steps, n_elements, var_codes)
+
+    record = environment()
+    record.update({'timesteps': n_steps,
+                   'elements': n_elements,
+                   'codes': var_codes,
+                   'variable': variable,
+                   'pro_mb': os.path.getsize(pro_path) / 1e6,
+                   'smet_mb': os.path.getsize(smet_path) / 1e6,
+                   'stages': {}})
+
+    done = {}
+
+    for name, function in pipeline_stages(pro_path, smet_path, variable):
+        done[name], record['stages'][name] = measure(function, done, repeat)
+
+    return(record)
+
+
+def previous_record(record, results_file=RESULTS_FILE):
+
+    """The last stored record from the same machine with the same sizes, codes and variable, or None."""
+
+    if not os.path.exists(results_file):
+        return(None)
+
+    same = ['machine', 'timesteps', 'elements', 'codes', 'variable']
+    previous = None
+
+    with open(results_file) as f:
+        for line in f:
+            stored = json.loads(line)
+            if all(stored.get(key) == record[key] for key in same):
+                previous = stored
+
+    return(previous)
+
+
+def report(record, previous=None):
+
+    """Prints a table of the stages, with the change since the previous record if there is one."""
+
+    codes = 'default codes' if record.get('codes') is None else f"{len(record['codes'])} codes"
+
+    print(f"{record['timesteps']} timesteps x ~{record['elements']} elements, {codes}: .PRO {record['pro_mb']:.1f} MB, "
+          f".smet {record['smet_mb']:.1f} MB")
+    if previous:
+        print(f"compared with {previous['commit']} ({previous['date']})")
+
+    print(f"{'stage':<12} {'best (s)':>10} {'median (s)':>11} {'peak (MB)':>10}")
+
+    for name, result in record['stages'].items():
+
+        line = f"{name:<12} {result['best_s']:>10.3f} {result['median_s']:>11.3f} {result['peak_mb']:>10.1f}"
+
+        if previous and name in previous['stages']:
+            before = previous['stages'][name]
+            line += f"   time {result['best_s'] / before['best_s'] - 1:+.0%}, "
+            line += f"memory {result['peak_mb'] / max(before['peak_mb'], 1e-9) - 1:+.0%}"
+
+        print(line)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', choices=list(SIZES), default='small', help="preset size of the synthetic files")
+    parser.add_argument('--timesteps', type=int, help="number of timesteps, overrides --size")
+    parser.add_argument('--elements', type=int, help="typical number of elements, overrides --size")
+    parser.add_argument('--codes', nargs='+', default=None,
+                        help=".PRO codes the synthetic file holds besides the heights, see synthetic.DEFAULT_CODES")
+    parser.add_argument('--variable', default='element density (kg m-3)')
+    parser.add_argument('--repeat', type=int, default=3, help="number of timed runs of each stage")
+    parser.add_argument('--no-save', action='store_true', help="don't append the results to benchmarks/results.jsonl")
+    args = parser.parse_args()
+
+    n_steps = args.timesteps or SIZES[args.size][0]
+    n_elements = args.elements or SIZES[args.size][1]
+
+    variable = tools.variable_shortenings(args.variable)
+
+    if args.codes is not None and tools.pro_var_codes(variable)[-1] not in args.codes:
+        parser.error(f"--codes must include the code of --variable '{variable}'")
+
+    record = run_benchmark(n_steps, n_elements, variable, args.repeat, args.codes)
+
+    report(record, previous_record(record))
+
+    if not args.no_save:
+        with open(RESULTS_FILE, 'a') as f:
+            f.write(json.dumps(record) + '\n')
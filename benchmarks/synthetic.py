@@ -0,0 +1,192 @@
+"""Writes synthetic .PRO and .smet files of any size, for benchmarking pyniviz on files like the large ones real runs
+produce.
+
+The files follow the layout SNOWPACK writes (header, one block of lines per timestep, a placeholder value for the
+base of the column on each per-element line), with plausible, seeded random values, so they read exactly like
+real output. The number of elements drifts from timestep to timestep, as it does when snow falls and melts.
+
+Run from the repository root, e.g.
+
+    python benchmarks/synthetic.py big.pro --timesteps 20000 --elements 300
+    python benchmarks/synthetic.py big.smet --timesteps 200000
+"""
+
+import sys
+import argparse
+sys.path.append('.')
+
+import numpy as np
+import pandas as pd
+from pyniviz.tools import pro_code_dict, pro_var_codes
+
+# What read_pro reads by default, plus two stability indices
+
+DEFAULT_CODES = pro_var_codes()[2:] + ['0533', '0606']
+
+SMET_FIELDS = {'TA': 'K', 'RH': '-', 'VW': 'm/s', 'ISWR': 'W/m2', 'ILWR': 'W/m2', 'PSUM': 'kg/m2'}
+
+FORMATS = {}
+
+
+def row_format(n, fmt):
+
+    """A %-format string for n comma separated values, cached since the same few widths come up again and again."""
+
+    if (n, fmt) not in FORMATS:
+        FORMATS[(n, fmt)] = ','.join([fmt] * n)
+
+    return(FORMATS[(n, fmt)])
+
+
+def element_counts(n_steps, n_elements, rng):
+
+    """Number of elements at each timestep, drifting within 10% either side of n_elements."""
+
+    drift = np.cumsum(rng.integers(-1, 2, n_steps))
+    spread = max(1, n_elements // 10)
+
+    return(np.clip(n_elements + np.clip(drift, -spread, spread), 1, None))
+
+
+def write_pro(path,
+              n_steps=1000,
+              n_elements=100,
+              var_codes=None,
+              start='2020-01-01',
+              step='1h',
+              seed=0,
+              chunk_size=500):
+
+    """Writes a synthetic .PRO file.
+
+    Args:
+        path (str): where to write the file
+        n_steps (int): number of timesteps
+        n_elements (int): typical number of elements per timestep
+        var_codes (list): optional, the per-element .PRO codes to write besides the heights ('0501').
+            Defaults to `DEFAULT_CODES`.
+        start (str): date of the first timestep
+        step (str): pandas frequency of the timesteps
+        seed (int): seed of the random values
+        chunk_size (int): number of timesteps formatted at a time
+
+    Returns:
+        int: the size of the file in bytes
+    """
+
+    var_codes = DEFAULT_CODES if var_codes is None else list(var_codes)
+    code_dict = pro_code_dict(return_all=True)
+
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=n_steps, freq=step).strftime('%d.%m.%Y %H:%M:%S')
+    counts = element_counts(n_steps, n_elements, rng)
+
+    with open(path, 'w') as f:
+
+        f.write("[STATION_PARAMETERS]\nStationName= SYNTHETIC\nLatitude= 0.0\nLongitude= 0.0\nAltitude= 0\n"
+                "SlopeAngle= 0.00\nSlopeAzi= 0.00\n\n[HEADER]\n0500,Date\n")
+        for code in ['0501'] + var_codes:
+            f.write(f"{code},nElems,{code_dict[code]}\n")
+        f.write("\n[DATA]\n")
+
+        for first in range(0, n_steps, chunk_size):
+
+            block = []
+            widths = counts[first:first + chunk_size]
+            width = widths.max()
+
+            # Values for a whole chunk at once, as (timesteps, elements) arrays, trimmed per timestep below
+
+            thickness = rng.uniform(0.5, 2.0, (len(widths), width))
+            heights = np.concatenate((np.zeros((len(widths), 1)), np.cumsum(thickness, axis=1)), axis=1)
+            depth = np.linspace(0, 1, width)
+
+            values = {}
+            for code in var_codes:
+                if code == '0513':
+                    values[code] = rng.choice([110, 220, 330, 440, 550, 660, 772, 880], (len(widths), width))
+                elif code == '0503':
+                    values[code] = -10 * depth + rng.normal(0, 0.5, (len(widths), width))
+                elif code == '0502':
+                    values[code] = 150 + 250 * (1 - depth) + rng.normal(0, 10, (len(widths), width))
+                else:
+                    values[code] = rng.uniform(0, 1, (len(widths), width)) * (1 + depth)
+
+            for count, n in enumerate(widths.tolist()):
+
+                block.append(f"0500,{dates[first + count]}\n")
+                block.append(f"0501,{n + 1}," + row_format(n + 1, '%.2f') % tuple(heights[count, :n + 1].tolist()) + "\n")
+
+                for code in var_codes:
+                    if code == '0513':
+                        row = row_format(n, '%d') % tuple(values[code][count, :n].tolist())
+                        block.append(f"0513,{n + 2},000,{row},0\n")
+                    else:
+                        row = row_format(n, '%.3f') % tuple(values[code][count, :n].tolist())
+                        block.append(f"{code},{n + 1},-999.00,{row}\n")
+
+            f.write(''.join(block))
+
+        size = f.tell()
+
+    return(size)
+
+
+def write_smet(path, n_steps=10000, fields=None, start='2020-01-01', step='1h', seed=0, nodata_fraction=0.01):
+
+    """Writes a synthetic .smet file with a timestamp column.
+
+    Args:
+        path (str): where to write the file
+        n_steps (int): number of rows
+        fields (list): optional, the fields to write. Defaults to those in `SMET_FIELDS`.
+        start (str): time of the first row
+        step (str): pandas frequency of the rows
+        seed (int): seed of the random values
+        nodata_fraction (float): fraction of values written as nodata (-999)
+
+    Returns:
+        int: the size of the file in bytes
+    """
+
+    fields = list(SMET_FIELDS) if fields is None else list(fields)
+
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(start, periods=n_steps, freq=step).strftime('%Y-%m-%dT%H:%M:%S')
+
+    values = rng.uniform(0, 1, (n_steps, len(fields))) * 300
+    values[rng.uniform(0, 1, values.shape) < nodata_fraction] = -999
+
+    rows = [row_format(len(fields), '%.3f') % tuple(row) for row in values.tolist()]
+
+    with open(path, 'w') as f:
+
+        f.write("SMET 1.1 ASCII\n[HEADER]\nstation_id = SYNTHETIC\nnodata = -999\n"
+                f"plot_unit = time {' '.join(SMET_FIELDS.get(field, '-') for field in fields)}\n"
+                f"fields = timestamp {' '.join(fields)}\n[DATA]\n")
+
+        for first in range(0, n_steps, 100000):
+            f.write(''.join(f"{time} {row.replace(',', '  ')}\n"
+                            for time, row in zip(times[first:first + 100000], rows[first:first + 100000])))
+
+        size = f.tell()
+
+    return(size)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help="file to write, a .smet file if it ends in .smet, a .PRO file otherwise")
+    parser.add_argument('--timesteps', type=int, default=1000)
+    parser.add_argument('--elements', type=int, default=100)
+    parser.add_argument('--codes', nargs='*', default=None, help=".PRO codes to write, see DEFAULT_CODES")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.path.endswith('.smet'):
+        size = write_smet(args.path, args.timesteps, seed=args.seed)
+    else:
+        size = write_pro(args.path, args.timesteps, args.elements, args.codes, seed=args.seed)
+
+    print(f"Wrote {args.path}, {size / 1e6:.1f} MB")
@@ -0,0 +1,16 @@
+from pyniviz.animate import animate_profiles
+import datetime
+
+start_date = datetime.datetime(year=2020, month=1, day=29)
+end_date = datetime.datetime(year=2020, month=2, day=8)
+
+# One frame every 3 hours of temperature and grain size against height. Writes an .mp4 with ffmpeg if it's
+# installed, or use a .gif name to write one without it.
+
+animate_profiles('sample.pro',
+                 'profiles.mp4',
+                 variables=['temperature', 'grain size'],
+                 xmin=start_date,
+                 xmax=end_date,
+                 stride=3,
+                 fps=12)
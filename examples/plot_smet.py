@@ -3,4 +3,7 @@ sys.path.append('..')
 from pyniviz import main
 
 # Plot 2 m air temperature (TA) time series from sample.smet
-main.plot_smet('sample.smet', 'TA')
\ No newline at end of file
+main.plot_smet('sample.smet', 'TA')
+
+# Or several variables, stacked on a shared time axis
+main.plot_smet('sample.smet', ['TA', 'RH', 'VW'])
@@ -1,19 +1,14 @@
-from pyniviz import main
+from pyniviz.index import get_snapshot
 import datetime
 import matplotlib.pyplot as plt
 
 time_of_interest = datetime.datetime(year=2020,month=2,day=11,hour=7)
 
-# Get a list of dataframes where each dataframe represents
-# the snowpack at a given point (snapshot) in time.
+# Get the dataframe representing the snowpack at the time of interest.
+# Only that timestep is parsed: the first call writes a small index
+# (sample.pro.index.npz) of where each timestep starts in the file.
 
-list_of_snapshots = main.read_pro('sample.pro')
-
-for index, snapshot in enumerate(list_of_snapshots):
-    date = snapshot['dates'].iloc[0]
-
-    if date == time_of_interest:
-        df_to_plot = snapshot
+df_to_plot = get_snapshot('sample.pro', time_of_interest)
 
 
 fig, axs = plt.subplots(nrows=1,ncols=2, figsize = (10,5))
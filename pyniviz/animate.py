@@ -0,0 +1,368 @@
+"""Time-lapse videos of snow profiles, e.g. temperature and grain size against height through a season.
+
+Frames are drawn with blitting: the axes, labels and ticks are drawn once, and for each frame only the profile
+lines and the date are redrawn onto a copy of that background, by updating the data of the existing `Line2D`
+artists. Each frame goes straight to the video writer as it's drawn, so frames are never stored. Long videos can
+be split into chunks drawn by several processes and joined at the end.
+
+Videos are written with ffmpeg, any format it knows (.mp4, .webm, .gif, ...). Without ffmpeg, GIFs can still be
+written with Pillow, which does keep every frame (as an 8 bit palette image) until the file is written.
+"""
+
+import os
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from pyniviz.tools import read_pro, variable_shortenings, select_timesteps
+
+height_name = 'height [> 0: top, < 0: bottom of elem.] (cm)'
+
+class ProfileAnimator:
+
+    """Draws the profiles of some variables at one timestep after another onto one reused figure.
+
+    Args:
+        pro (dict): columnar .PRO data holding the variables, see `tools.read_pro_columns`
+        variables (list): full names of the variables, one panel each
+        limits (dict): optional, (min, max) of the x axis of each variable and of the heights (keyed by the
+            height column's name). Defaults to the range over all the timesteps in pro, so the axes never move.
+        figsize (tuple): optional, width and height in inches
+        dpi (int): optional, dots per inch
+        color (str): optional, colour of the profile lines
+    """
+
+    def __init__(self, pro, variables, limits=None, figsize=None, dpi=100, color='k'):
+
+        self.pro = pro
+        self.variables = list(variables)
+        self.limits = profile_limits(pro, self.variables) if limits is None else limits
+
+        self.fig = Figure(figsize=figsize or (4 * len(self.variables), 5), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+
+        axes = self.fig.subplots(1, len(self.variables), squeeze=False, sharey=True)[0]
+
+        self.lines = []
+
+        for ax, variable in zip(axes, self.variables):
+            line, = ax.plot([], [], color=color, animated=True)
+            self.lines.append(line)
+            ax.set_xlim(self.limits[variable])
+            ax.set_ylim(self.limits[height_name])
+            ax.set_xlabel(variable, fontsize='large')
+
+        axes[0].set_ylabel('Height (cm)', fontsize='large')
+
+        self.date_text = axes[0].annotate('', xy=(0, 1.05), xycoords='axes fraction', fontsize='large',
+                                          animated=True)
+
+        self.artists = self.lines + [self.date_text]
+        self.background = None
+
+    @property
+    def size(self):
+
+        """Width and height of the frames in pixels."""
+
+        return(self.canvas.get_width_height())
+
+    def update(self, step):
+
+        """Puts the profiles of one timestep into the lines and the date into the title, without drawing.
+
+        Returns:
+            the artists that changed
+        """
+
+        elements = slice(self.pro['offsets'][step], self.pro['offsets'][step + 1])
+        heights = self.pro['columns'][height_name][elements]
+
+        for line, variable in zip(self.lines, self.variables):
+            line.set_data(self.pro['columns'][variable][elements], heights)
+
+        self.date_text.set_text(pd.Timestamp(self.pro['dates'][step]).strftime('%d/%m/%Y %H:%M'))
+
+        return(self.artists)
+
+    def render(self, step):
+
+        """Draws one timestep's frame by blitting the changed artists onto the background.
+
+        Returns:
+            memoryview of the frame as 8 bit RGBA, valid until the next frame is drawn
+        """
+
+        if self.background is None:
+            self.canvas.draw()
+            self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+        self.canvas.restore_region(self.background)
+
+        for artist in self.update(step):
+            artist.axes.draw_artist(artist)
+
+        return(self.canvas.buffer_rgba())
+
+    def frames(self, steps=None):
+
+        """Yields the frame of each of steps (all the timesteps by default) in turn, see `render`."""
+
+        steps = range(len(self.pro['dates'])) if steps is None else steps
+
+        for step in steps:
+            yield self.render(step)
+
+def profile_limits(pro, variables, margin=0.05):
+
+    """The range of each variable and of the heights over all the timesteps, widened by a margin either side.
+
+    Args:
+        pro (dict): columnar .PRO data
+        variables (list): full names of the variables
+        margin (float): optional, fraction of each range to add either side
+
+    Returns:
+        limits (dict): (min, max) for each variable and for the heights
+    """
+
+    limits = {}
+
+    for variable in [height_name] + list(variables):
+
+        values = pro['columns'][variable]
+        low, high = (float(np.nanmin(values)), float(np.nanmax(values))) if np.isfinite(values).any() else (0, 1)
+        pad = margin * (high - low) or 0.5
+
+        limits[variable] = (low - pad, high + pad)
+
+    return(limits)
+
+class FFmpegWriter:
+
+    """Streams raw RGBA frames into an ffmpeg process that encodes them to a video file.
+
+    Args:
+        out_path (str): the video to write, its extension picks the format
+        size (tuple): width and height of the frames in pixels
+        fps (float): frames per second
+    """
+
+    def __init__(self, out_path, size, fps):
+
+        command = ['ffmpeg', '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f"{size[0]}x{size[1]}", '-r', str(fps), '-i', '-']
+
+        # Most video codecs need even dimensions
+
+        if not out_path.endswith('.gif'):
+            command += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p']
+
+        self.process = subprocess.Popen(command + [out_path], stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+
+        self.process.stdin.write(frame)
+
+    def close(self):
+
+        self.process.stdin.close()
+        error = self.process.stderr.read()
+        if self.process.wait():
+            raise RuntimeError(f"ffmpeg failed: {error.decode(errors='replace')}")
+
+class PillowGifWriter:
+
+    """Writes frames to a GIF with Pillow, for when ffmpeg isn't installed. Frames are kept (as 8 bit palette
+    images) until close.
+
+    Args:
+        out_path (str): the GIF to write
+        size (tuple): width and height of the frames in pixels
+        fps (float): frames per second
+    """
+
+    def __init__(self, out_path, size, fps):
+
+        self.out_path = out_path
+        self.size = size
+        self.fps = fps
+        self.frames = []
+
+    def write(self, frame):
+
+        from PIL import Image
+
+        self.frames.append(Image.frombuffer('RGBA', self.size, bytes(frame), 'raw', 'RGBA', 0, 1)
+                           .convert('RGB').quantize(256))
+
+    def close(self):
+
+        if self.frames:
+            self.frames[0].save(self.out_path, save_all=True, append_images=self.frames[1:],
+                                duration=1000 / self.fps, loop=0)
+        self.frames = []
+
+def frame_writer(out_path, size, fps):
+
+    """Opens the writer for a video: ffmpeg if it's installed, otherwise Pillow for GIFs."""
+
+    if shutil.which('ffmpeg'):
+        return(FFmpegWriter(out_path, size, fps))
+
+    if out_path.endswith('.gif'):
+        return(PillowGifWriter(out_path, size, fps))
+
+    raise ValueError(f"Writing {os.path.splitext(out_path)[1]} videos needs ffmpeg, which wasn't found. "
+                     f"Install it, or write a .gif instead.")
+
+def join_videos(paths, out_path, fps):
+
+    """Joins videos made by `render_video` into one, in order.
+
+    With ffmpeg the streams are copied without re-encoding (GIFs are re-encoded); without it GIFs are joined with
+    Pillow.
+    """
+
+    if shutil.which('ffmpeg'):
+
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.writelines(f"file '{os.path.abspath(path)}'\n" for path in paths)
+
+        try:
+            codec = ['-c:v', 'gif'] if out_path.endswith('.gif') else ['-c', 'copy']
+            subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', f.name]
+                           + codec + [out_path], check=True, capture_output=True)
+        finally:
+            os.remove(f.name)
+
+    else:
+
+        from PIL import Image, ImageSequence
+
+        frames = []
+        for path in paths:
+            with Image.open(path) as gif:
+                frames += [frame.copy() for frame in ImageSequence.Iterator(gif)]
+
+        frames[0].save(out_path, save_all=True, append_images=frames[1:], duration=1000 / fps, loop=0)
+
+def render_video(pro, variables, out_path, fps=24, dpi=100, figsize=None, limits=None):
+
+    """Draws the profiles at every timestep in pro and streams them into a video.
+
+    Args:
+        pro (dict): columnar .PRO data holding the variables, see `tools.read_pro_columns`
+        variables (list): full names of the variables, one panel each
+        out_path (str): the video to write, e.g. 'season.mp4' or 'season.gif'
+        fps, dpi, figsize, limits: see `animate_profiles` and `ProfileAnimator`
+
+    Returns:
+        int: the number of frames
+    """
+
+    animator = ProfileAnimator(pro, variables, limits, figsize, dpi)
+
+    writer = frame_writer(out_path, animator.size, fps)
+
+    n_frames = 0
+
+    try:
+        for frame in animator.frames():
+            writer.write(frame)
+            n_frames += 1
+    finally:
+        writer.close()
+
+    return(n_frames)
+
+def render_chunk(path, variables, dates, out_path, fps, dpi, figsize, limits, cache):
+
+    """Reads and renders some of the frames of a video, the work done by each process of `animate_profiles`."""
+
+    pro = read_pro(path, variables, columnar=True, cache=cache, xmin=pd.Timestamp(dates[0]).to_pydatetime(),
+                   xmax=pd.Timestamp(dates[-1]).to_pydatetime())
+    pro = select_frames(pro, dates)
+
+    return(render_video(pro, variables, out_path, fps, dpi, figsize, limits))
+
+def select_frames(pro, dates):
+
+    """Keeps only the timesteps of pro at the given dates."""
+
+    return(select_timesteps(pro, np.flatnonzero(np.isin(pro['dates'], np.asarray(dates, dtype='datetime64[ns]')))))
+
+def animate_profiles(path,
+                     out_path,
+                     variables=('temperature', 'grain size'),
+                     xmin=None,
+                     xmax=None,
+                     stride=1,
+                     fps=24,
+                     dpi=100,
+                     figsize=None,
+                     processes=1,
+                     cache=None):
+
+    """Makes a time-lapse video of snow profiles from a .PRO file, one frame per timestep.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        out_path (str): the video to write, e.g. 'season.mp4' or 'season.gif'
+        variables (list): optional, the variables to plot against height, one panel each. Can be .pro recognised
+            codes or niviz approved shortenings.
+        xmin (datetime.datetime): optional, time of the first frame
+        xmax (datetime.datetime): optional, time of the last frame
+        stride (int): optional, use every stride-th timestep, e.g. 24 for daily frames from hourly output
+        fps (float): optional, frames per second
+        dpi (int): optional, dots per inch of the frames
+        figsize (tuple): optional, width and height of the frames in inches
+        processes (int): optional, split the frames into this many chunks, each rendered to its own video by its
+            own process, then join them
+        cache (bool or str): optional, cache the parsed .PRO data on disk (see `tools.read_pro`)
+
+    Returns:
+        int: the number of frames
+    """
+
+    variables = [variables] if isinstance(variables, str) else list(variables)
+    variables = [variable_shortenings(variable) for variable in variables]
+
+    pro = read_pro(path, variables, columnar=True, cache=cache, xmin=xmin, xmax=xmax)
+    pro = select_frames(pro, pro['dates'][::stride])
+
+    if len(pro['dates']) == 0:
+        raise ValueError(f"No timesteps of {path} to animate")
+
+    # The axes limits come from the whole video, so they don't jump between chunks
+
+    limits = profile_limits(pro, variables)
+
+    processes = min(processes or 1, len(pro['dates']))
+
+    if processes == 1:
+        return(render_video(pro, variables, out_path, fps, dpi, figsize, limits))
+
+    chunks = np.array_split(pro['dates'], processes)
+    directory = tempfile.mkdtemp()
+    extension = os.path.splitext(out_path)[1]
+    parts = [os.path.join(directory, f"part{count}{extension}") for count in range(processes)]
+
+    del pro
+
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            n_frames = sum(executor.map(render_chunk, [path] * processes, [variables] * processes, chunks, parts,
+                                        [fps] * processes, [dpi] * processes, [figsize] * processes,
+                                        [limits] * processes, [cache] * processes))
+
+        join_videos(parts, out_path, fps)
+
+    finally:
+        shutil.rmtree(directory)
+
+    return(n_frames)
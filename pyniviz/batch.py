@@ -0,0 +1,281 @@
+"""Renders plots for whole directories of .PRO files in parallel.
+
+From the command line, e.g.:
+
+    python -m pyniviz.batch "runs/*.pro" -v temperature density -o plots --ymin 400 --ymax 420
+    python -m pyniviz.batch "runs/*.pro" -v density -o plots --xmin 2021-01-01 --xmax "2021-03-01 12:00"
+
+"""
+
+import os
+import re
+import glob
+import time
+import argparse
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+
+def use_agg_backend():
+
+    """Switches matplotlib to the non-interactive Agg backend. Used to initialise the worker processes."""
+
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+
+def output_name(path, variable):
+
+    """Returns the file name a plot of a variable from a .PRO file is saved under, e.g. 'run1_grain_size_mm.png'."""
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', variable).strip('_')
+
+    return(f"{stem}_{slug}.png")
+
+def render_file(path, variables, output_dir, plot_kwargs, dpi=150):
+
+    """Plots some variables from one .PRO file and saves each to a PNG, without ever showing a figure.
+
+    Any error is caught and reported in the returned record, so one bad file can't stop a batch.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        variables (list): variables to plot, .pro recognised codes or niviz approved shortenings
+        output_dir (str): directory to write the PNGs to
+        plot_kwargs (dict): vmin, vmax, xmin, xmax, ymin, ymax, c_scheme and yax_shift as taken by `main.plot_pro`
+        dpi (int): resolution of the PNGs
+
+    Returns:
+        record (dict): path, status ('ok' or 'failed'), seconds taken, the files written and any error
+    """
+
+    import matplotlib.pyplot as plt
+    from pyniviz.tools import read_pro, create_grids, plot_grid, grid_colorbar, variable_shortenings, read_window
+
+    start = time.perf_counter()
+    outputs = []
+
+    try:
+        variables = [variable_shortenings(variable) for variable in variables]
+
+        xmin, xmax = plot_kwargs.get('xmin'), plot_kwargs.get('xmax')
+        ymin, ymax = plot_kwargs.get('ymin'), plot_kwargs.get('ymax')
+
+        window = read_window(xmin, xmax, ymin, ymax)
+
+        pro = read_pro(path, variables, columnar=True, xmin=window[0], xmax=window[1])
+
+        grids = create_grids(pro, variables, xmin, xmax, ymin, ymax)
+
+        for variable in variables:
+
+            fig, ax = plt.subplots(1 ,1 ,figsize=(10 ,6))
+
+            try:
+                plot_grid(grids[variable],
+                          variable,
+                          plot_kwargs.get('vmin'),
+                          plot_kwargs.get('vmax'),
+                          xmin,
+                          xmax,
+                          ymin,
+                          ymax,
+                          None,
+                          plot_kwargs.get('c_scheme', 'plasma'),
+                          plot_kwargs.get('yax_shift', 0),
+                          ax)
+
+                grid_colorbar(fig, ax, variable)
+
+                file_name = os.path.join(output_dir, output_name(path, variable))
+                fig.savefig(file_name, dpi=dpi, bbox_inches='tight')
+                outputs.append(file_name)
+
+            finally:
+                plt.close(fig)
+
+    except Exception as e:
+        return({'path': path,
+                'status': 'failed',
+                'seconds': time.perf_counter() - start,
+                'outputs': outputs,
+                'error': f"{type(e).__name__}: {e}",
+                'traceback': traceback.format_exc()})
+
+    return({'path': path,
+            'status': 'ok',
+            'seconds': time.perf_counter() - start,
+            'outputs': outputs,
+            'error': None,
+            'traceback': None})
+
+def failed_record(path, error):
+
+    """The record of a file whose worker failed outside `render_file`, see `render_file` for the keys."""
+
+    return({'path': path,
+            'status': 'failed',
+            'seconds': None,
+            'outputs': [],
+            'error': error,
+            'traceback': None})
+
+def render_files(queue, variables, output_dir, plot_kwargs, dpi, max_workers):
+
+    """Renders the files in a queue in a new process pool, until the queue is empty or a worker process dies.
+
+    No more files than there are workers are handed to the pool at once, so when a worker dies (e.g. killed for
+    running out of memory, or crashing in C code) the files it could have been rendering are known and the files
+    still queued are left untouched.
+
+    Args:
+        queue (collections.deque): paths of the .PRO files, taken from the left as they're handed out
+        variables, output_dir, plot_kwargs, dpi: see `render_file`
+        max_workers (int): number of processes
+
+    Returns:
+        records (list): a record (see `render_file`) for each file rendered
+        crashed (list): the paths being rendered when a worker died, empty if none did
+    """
+
+    records = []
+    running = {}
+    crashed = []
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=use_agg_backend) as executor:
+
+        while (queue and not crashed) or running:
+
+            while queue and not crashed and len(running) < max_workers:
+                path = queue.popleft()
+                try:
+                    running[executor.submit(render_file, path, variables, output_dir, plot_kwargs, dpi)] = path
+                except BrokenProcessPool:
+                    queue.appendleft(path)
+                    crashed = list(running.values())
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED) if running else (set(), set())
+
+            for future in finished:
+
+                path = running.pop(future)
+
+                # render_file catches its own errors, these are for the worker process itself failing
+
+                try:
+                    records.append(future.result())
+                except BrokenProcessPool:
+                    crashed.append(path)
+                except Exception as e:
+                    records.append(failed_record(path, f"{type(e).__name__}: {e}"))
+
+    return(records, crashed)
+
+def render_batch(pattern,
+                 variables,
+                 output_dir,
+                 max_workers=None,
+                 dpi=150,
+                 **plot_kwargs):
+
+    """Plots variables from every .PRO file matching a glob pattern, spreading the files over a process pool.
+
+    Each worker process uses the Agg backend, reads its file once for all the variables and writes one PNG per
+    variable into output_dir. Failures are recorded rather than raised, including a worker process dying: the files
+    it may have been rendering are retried one at a time, so only the file that kills a worker is marked failed.
+    A summary is written to output_dir/summary.csv as well as returned.
+
+    Args:
+        pattern (str): glob pattern for the .PRO files, e.g. 'runs/*.pro'. A list of paths is also accepted.
+        variables (list): variables to plot, .pro recognised codes or niviz approved shortenings
+        output_dir (str): directory to write the PNGs and the summary to, created if needed
+        max_workers (int): optional, number of processes. Defaults to the number of cores.
+        dpi (int): optional, resolution of the PNGs
+        **plot_kwargs: optional, any of vmin, vmax, xmin, xmax, ymin, ymax, c_scheme and yax_shift
+
+    Returns:
+        summary (pd.DataFrame): one row per file with its status, time taken, outputs and error, if any
+    """
+
+    paths = sorted(glob.glob(pattern)) if isinstance(pattern, str) else list(pattern)
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    max_workers = min(max_workers or os.cpu_count() or 1, max(len(paths), 1))
+
+    queue = deque(paths)
+    records = []
+
+    while queue:
+
+        done, crashed = render_files(queue, variables, output_dir, plot_kwargs, dpi, max_workers)
+        records += done
+
+        # A worker died: any of the files in flight could have killed it, so each is retried alone to find out
+        # which, then the rest of the queue carries on in a fresh pool
+
+        for path in crashed:
+
+            done, died = render_files(deque([path]), variables, output_dir, plot_kwargs, dpi, 1)
+            records += done
+
+            if died:
+                records.append(failed_record(path, 'BrokenProcessPool: the worker process died rendering this file'))
+
+    summary = pd.DataFrame(records, columns=['path', 'status', 'seconds', 'outputs', 'error', 'traceback'])
+    summary = summary.sort_values('path').reset_index(drop=True)
+
+    summary.drop(columns='traceback').to_csv(os.path.join(output_dir, 'summary.csv'), index=False)
+
+    return(summary)
+
+def main(argv=None):
+
+    """Command line entry point, see the module docstring."""
+
+    parser = argparse.ArgumentParser(description='Plot variables from many .PRO files in parallel.')
+    parser.add_argument('pattern', help="glob pattern for the .PRO files, quoted, e.g. 'runs/*.pro'")
+    parser.add_argument('-v', '--variables', nargs='+', required=True, help='variables to plot')
+    parser.add_argument('-o', '--output-dir', required=True, help='directory to write the PNGs to')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of processes (default: cores)')
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--vmin', type=float)
+    parser.add_argument('--vmax', type=float)
+    parser.add_argument('--xmin', type=pd.Timestamp, help="first time to plot, e.g. '2021-01-01 12:00'")
+    parser.add_argument('--xmax', type=pd.Timestamp, help="last time to plot")
+    parser.add_argument('--ymin', type=float)
+    parser.add_argument('--ymax', type=float)
+    parser.add_argument('--yax-shift', type=float, default=0)
+    parser.add_argument('--c-scheme', default='plasma')
+
+    args = parser.parse_args(argv)
+
+    summary = render_batch(args.pattern,
+                           args.variables,
+                           args.output_dir,
+                           max_workers=args.workers,
+                           dpi=args.dpi,
+                           vmin=args.vmin,
+                           vmax=args.vmax,
+                           xmin=args.xmin.to_pydatetime() if args.xmin is not None else None,
+                           xmax=args.xmax.to_pydatetime() if args.xmax is not None else None,
+                           ymin=args.ymin,
+                           ymax=args.ymax,
+                           yax_shift=args.yax_shift,
+                           c_scheme=args.c_scheme)
+
+    for _, row in summary.iterrows():
+        if row['status'] == 'ok':
+            print(f"ok      {row['path']} ({row['seconds']:.2f} s)")
+        else:
+            print(f"failed  {row['path']}: {row['error']}")
+
+    n_failed = (summary['status'] == 'failed').sum()
+    print(f"{len(summary) - n_failed} of {len(summary)} files rendered to {args.output_dir}")
+
+    return(1 if n_failed else 0)
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,232 @@
+import os
+import hashlib
+import numpy as np
+from pyniviz.tools import read_pro_columns, pro_code_dict, pro_var_codes
+
+def default_cache_dir():
+
+    """Returns the directory parsed .PRO files are cached in when no other directory is given.
+
+    This is $XDG_CACHE_HOME/pyniviz, falling back to ~/.cache/pyniviz.
+    """
+
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+
+    return(os.path.join(base, 'pyniviz'))
+
+def cache_file(path, cache_dir):
+
+    """Returns the location of the cache entry for a .PRO file.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        cache_dir (str): the cache directory
+
+    Returns:
+        String pointing to the .npz file the parsed data of that .PRO file is cached in.
+    """
+
+    key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+
+    return(os.path.join(cache_dir, f"{key}.npz"))
+
+def read_pro_cached(path, var_codes, cache_dir=None, max_bytes=2 ** 30):
+
+    """Reads a .PRO file through an on-disk cache, see `read_pro_columns` for what is returned.
+
+    Parsed data is saved as an uncompressed .npz file in cache_dir, one per .PRO file. An entry is only used while
+    the size and modification time of the .PRO file match those recorded in it. When a file has no entry yet, the
+    default variables (see `pro_var_codes`) that its header lists are parsed along with the requested ones, so
+    plotting one variable after another only parses the file once. If an entry lacks some of the requested
+    variables, only those are parsed and then added to it. Whenever the cache grows beyond max_bytes, the least
+    recently used entries are deleted.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file to be read
+        var_codes (list): four character .PRO codes to read
+        cache_dir (str): Optional, where to keep the cache. Defaults to `default_cache_dir()`.
+        max_bytes (int): Optional, the size the cache directory is trimmed to. Defaults to 1 GiB.
+
+    Returns:
+        pro (dict): columnar .PRO data, as returned by `read_pro_columns`
+    """
+
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    entry = cache_file(path, cache_dir)
+    source = os.stat(path)
+    code_dict = pro_code_dict(return_all=True)
+
+    wanted = [code for code in var_codes if code != '0500']
+
+    pro = load_cache_entry(entry, source)
+
+    if pro is None:
+
+        # Parse the other default variables while at it, so the next variable asked for is already cached. A header
+        # may list a variable that isn't written at every timestep, in which case just the wanted ones are parsed.
+
+        prefetch = wanted + [code for code in header_codes(path) if code not in wanted]
+
+        try:
+            pro = read_pro_columns(path, prefetch)
+        except ValueError:
+            pro = read_pro_columns(path, wanted)
+
+        save_cache_entry(entry, pro, source)
+        evict(cache_dir, max_bytes, keep=entry)
+
+    elif any(code_dict[code] not in pro['columns'] for code in wanted):
+
+        parsed = read_pro_columns(path, [code for code in wanted if code_dict[code] not in pro['columns']])
+
+        if np.array_equal(pro['offsets'], parsed['offsets']):
+            pro['columns'].update(parsed['columns'])
+        else:
+            pro = parsed
+
+        save_cache_entry(entry, pro, source)
+        evict(cache_dir, max_bytes, keep=entry)
+
+    else:
+        os.utime(entry)
+
+    keep = [code_dict[code] for code in wanted] + ['thickness_m']
+
+    pro['columns'] = {varname: values for varname, values in pro['columns'].items() if varname in keep}
+
+    return(pro)
+
+def header_codes(path):
+
+    """Returns the default codes (see `pro_var_codes`) that the header of a .PRO file lists, height and date aside.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+
+    Returns:
+        var_codes (list): four character .PRO codes
+    """
+
+    listed = set()
+
+    with open(path, 'r') as f:
+        for line in f:
+            if line.startswith('[DATA]'):
+                break
+            listed.add(line[:4])
+
+    return([code for code in pro_var_codes()[2:] if code in listed])
+
+def load_cache_entry(entry, source):
+
+    """Loads a cache entry, returning None if there isn't one or it no longer matches the .PRO file.
+
+    Args:
+        entry (str): location of the cache entry
+        source (os.stat_result): stat of the .PRO file the entry was made from
+
+    Returns:
+        pro (dict): columnar .PRO data, or None
+    """
+
+    if not os.path.exists(entry):
+        return(None)
+
+    try:
+        with np.load(entry) as npz:
+
+            if (npz['source_size'] != source.st_size) or (npz['source_mtime_ns'] != source.st_mtime_ns):
+                return(None)
+
+            code_dict = pro_code_dict(return_all=True)
+
+            columns = {}
+            for key in npz.files:
+                if key.startswith('code_'):
+                    columns[code_dict[key[5:]]] = npz[key]
+            columns['thickness_m'] = npz['thickness_m']
+
+            pro = {'dates': npz['dates'],
+                   'offsets': npz['offsets'],
+                   'columns': columns}
+
+    except (OSError, ValueError, KeyError):
+        return(None)
+
+    return(pro)
+
+def save_cache_entry(entry, pro, source):
+
+    """Writes columnar .PRO data to a cache entry.
+
+    The file is written under a temporary name and then moved into place, so a reader never sees half an entry.
+
+    Args:
+        entry (str): location of the cache entry
+        pro (dict): columnar .PRO data
+        source (os.stat_result): stat of the .PRO file the data was read from
+    """
+
+    inverse = {value: key for key, value in pro_code_dict(return_all=True).items()}
+
+    arrays = {'dates': pro['dates'],
+              'offsets': pro['offsets'],
+              'source_size': np.int64(source.st_size),
+              'source_mtime_ns': np.int64(source.st_mtime_ns)}
+
+    for varname, values in pro['columns'].items():
+        if varname == 'thickness_m':
+            arrays['thickness_m'] = values
+        else:
+            arrays[f"code_{inverse[varname]}"] = values
+
+    temporary = f"{entry}.{os.getpid()}.tmp"
+
+    with open(temporary, 'wb') as f:
+        np.savez(f, **arrays)
+
+    os.replace(temporary, entry)
+
+def evict(cache_dir, max_bytes, keep=None):
+
+    """Deletes the least recently used cache entries until the cache is no bigger than max_bytes.
+
+    Args:
+        cache_dir (str): the cache directory
+        max_bytes (int): the size to trim the cache to
+        keep (str): Optional, an entry that must not be deleted (e.g. the one just written)
+    """
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.npz'):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, os.path.join(cache_dir, name)))
+
+    total = sum(size for _, size, _ in entries)
+
+    for _, size, entry in sorted(entries):
+
+        if total <= max_bytes:
+            break
+
+        if entry != keep:
+            os.remove(entry)
+            total -= size
+
+def clear_cache(cache_dir=None):
+
+    """Deletes every entry in the cache directory.
+
+    Args:
+        cache_dir (str): Optional, the cache directory. Defaults to `default_cache_dir()`.
+    """
+
+    cache_dir = cache_dir or default_cache_dir()
+
+    if os.path.isdir(cache_dir):
+        evict(cache_dir, 0)
@@ -0,0 +1,172 @@
+"""Bulk quantities of the whole snow (and ice) column, for every timestep of a run at once.
+
+Everything is worked out from columnar .PRO data (see `tools.read_pro_columns`) with sums over each timestep's
+run of elements, so there's no loop over timesteps.
+"""
+
+import numpy as np
+import pandas as pd
+from pyniviz.tools import read_pro, grain_type_digits
+
+# Specific heat capacity of ice (J kg-1 K-1), used for the cold content
+
+C_ICE = 2100.
+
+BULK_NEEDS = {'depth (cm)': [],
+              'surface height (cm)': [],
+              'SWE (kg m-2)': ['element density (kg m-3)'],
+              'mean density (kg m-3)': ['element density (kg m-3)'],
+              'mean temperature (degC)': ['element temperature (degC)'],
+              'top temperature (degC)': ['element temperature (degC)'],
+              'bottom temperature (degC)': ['element temperature (degC)'],
+              'cold content (J m-2)': ['element density (kg m-3)', 'element temperature (degC)'],
+              'total LWC (mm)': ['liquid water content by volume (%)'],
+              'ice thickness (cm)': ['grain type (Swiss Code F1F2F3)'],
+              'snow depth (cm)': ['grain type (Swiss Code F1F2F3)']}
+
+def column_sums(values, offsets):
+
+    """Sums values over each column (timestep) of columnar data, NaN counting as 0.
+
+    Args:
+        values (np.array): one value per element, columns stored back to back
+        offsets (np.array): start of each column in values, plus the total length as a final entry
+
+    Returns:
+        sums (np.array): one sum per column, 0 for empty columns
+    """
+
+    lengths = np.diff(offsets)
+    sums = np.zeros(len(lengths))
+
+    if offsets[-1]:
+        not_empty = lengths > 0
+        sums[not_empty] = np.add.reduceat(np.nan_to_num(values, nan=0.), offsets[:-1][not_empty])
+
+    return(sums)
+
+def column_ends(values, offsets, end='top'):
+
+    """Picks the top (last) or bottom (first) element's value of each column, NaN for empty columns."""
+
+    lengths = np.diff(offsets)
+    picked = np.full(len(lengths), np.nan)
+
+    not_empty = lengths > 0
+    picked[not_empty] = values[offsets[1:][not_empty] - 1 if end == 'top' else offsets[:-1][not_empty]]
+
+    return(picked)
+
+def bulk_quantities(pro, quantities=None):
+
+    """Computes bulk quantities of the column for every timestep.
+
+    Available quantities (each needs the .PRO variables listed in `BULK_NEEDS`, thickness and height are always
+    there):
+        'depth (cm)': total thickness of all the elements
+        'surface height (cm)': height of the top element
+        'SWE (kg m-2)': sum of density x thickness
+        'mean density (kg m-3)': SWE / depth
+        'mean temperature (degC)': thickness weighted mean temperature
+        'top temperature (degC)', 'bottom temperature (degC)': temperature of the top and bottom elements
+        'cold content (J m-2)': energy needed to warm the column to 0 degC, sum of c_ice x density x thickness x
+            (0 - temperature) over elements below 0 degC
+        'total LWC (mm)': liquid water in the column, sum of volumetric LWC x thickness
+        'ice thickness (cm)', 'snow depth (cm)': thickness of the elements that are, and aren't, ice formations
+            (grain type F1 = 8), like the ice/snow split SNOWPACK's sea ice runs use
+
+    Args:
+        pro (dict): columnar .PRO data, see `tools.read_pro_columns`
+        quantities (list): optional, the quantities to compute. Defaults to all those the variables in pro allow.
+
+    Returns:
+        df (pandas dataframe): one column per quantity, indexed by date
+    """
+
+    columns = pro['columns']
+
+    if quantities is None:
+        quantities = [quantity for quantity, needs in BULK_NEEDS.items() if all(need in columns for need in needs)]
+
+    unknown = [quantity for quantity in quantities if quantity not in BULK_NEEDS]
+    if unknown:
+        raise ValueError(f"Unknown bulk quantities {unknown}, choose from {list(BULK_NEEDS)}")
+
+    missing = sorted({need for quantity in quantities for need in BULK_NEEDS[quantity] if need not in columns})
+    if missing:
+        raise ValueError(f"The .PRO data lacks {missing}, which the requested bulk quantities need")
+
+    offsets = pro['offsets']
+    thickness = columns['thickness_m']
+    depth = column_sums(thickness, offsets)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+
+        bulk = {}
+
+        for quantity in quantities:
+
+            if quantity == 'depth (cm)':
+                bulk[quantity] = 100 * depth
+
+            elif quantity == 'surface height (cm)':
+                bulk[quantity] = column_ends(columns['height [> 0: top, < 0: bottom of elem.] (cm)'], offsets)
+
+            elif quantity == 'SWE (kg m-2)':
+                bulk[quantity] = column_sums(columns['element density (kg m-3)'] * thickness, offsets)
+
+            elif quantity == 'mean density (kg m-3)':
+                bulk[quantity] = column_sums(columns['element density (kg m-3)'] * thickness, offsets) / depth
+
+            elif quantity == 'mean temperature (degC)':
+                temperature = columns['element temperature (degC)']
+                weights = np.where(np.isnan(temperature), 0, thickness)
+                bulk[quantity] = column_sums(temperature * weights, offsets) / column_sums(weights, offsets)
+
+            elif quantity == 'top temperature (degC)':
+                bulk[quantity] = column_ends(columns['element temperature (degC)'], offsets, 'top')
+
+            elif quantity == 'bottom temperature (degC)':
+                bulk[quantity] = column_ends(columns['element temperature (degC)'], offsets, 'bottom')
+
+            elif quantity == 'cold content (J m-2)':
+                deficit = np.maximum(-columns['element temperature (degC)'], 0)
+                bulk[quantity] = C_ICE * column_sums(columns['element density (kg m-3)'] * thickness * deficit,
+                                                     offsets)
+
+            elif quantity == 'total LWC (mm)':
+                bulk[quantity] = 10 * column_sums(columns['liquid water content by volume (%)'] * thickness,
+                                                  offsets)
+
+            else:
+                ice = grain_type_digits(columns['grain type (Swiss Code F1F2F3)'], 'F1') == 8
+                ice_thickness = 100 * column_sums(np.where(ice, thickness, 0), offsets)
+                bulk[quantity] = ice_thickness if quantity == 'ice thickness (cm)' else 100 * depth - ice_thickness
+
+    df = pd.DataFrame(bulk, index=pd.DatetimeIndex(pro['dates']), columns=list(quantities))
+
+    return(df)
+
+def read_bulk(path, quantities=None, cache=None, xmin=None, xmax=None):
+
+    """Reads just the .PRO variables some bulk quantities need and computes them, see `bulk_quantities`.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        quantities (list): optional, the quantities to compute. Defaults to all of them.
+        cache (bool or str): optional, cache the parsed .PRO data on disk (see `tools.read_pro`)
+        xmin (datetime.datetime): optional, only read timesteps from this time
+        xmax (datetime.datetime): optional, only read timesteps up to this time
+
+    Returns:
+        df (pandas dataframe): one column per quantity, indexed by date
+    """
+
+    quantities = list(BULK_NEEDS) if quantities is None else list(quantities)
+
+    needs = ['height [> 0: top, < 0: bottom of elem.] (cm)']
+    needs += sorted({need for quantity in quantities for need in BULK_NEEDS.get(quantity, [])})
+
+    pro = read_pro(path, needs, columnar=True, cache=cache, xmin=xmin, xmax=xmax)
+
+    return(bulk_quantities(pro, quantities))
@@ -0,0 +1,237 @@
+"""Statistics over ensembles of .PRO runs, e.g. 50 perturbed members compared against a reference run.
+
+Every member is gridded onto the same vertical grid and time axis, in parallel, and folded into running
+statistics as soon as its grid arrives, so only one grid per member is ever held at a time.
+"""
+
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from pyniviz.tools import read_pro, create_grid, align_grid, variable_shortenings, check_difference_with_conditions, \
+    read_window
+
+class RunningStats:
+
+    """Per-cell count, mean, standard deviation, min and max of a stream of equally shaped grids.
+
+    The mean and variance are updated with Welford's algorithm, which is numerically stable and needs only the
+    current mean and sum of squared deviations. NaN cells are skipped, so each cell has its own count.
+
+    Args:
+        shape (tuple): the shape of the grids
+    """
+
+    def __init__(self, shape):
+
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+        self.min = np.full(shape, np.nan)
+        self.max = np.full(shape, np.nan)
+
+    def add(self, grid):
+
+        """Folds one more grid into the statistics."""
+
+        valid = ~np.isnan(grid)
+        values = np.where(valid, grid, 0)
+
+        self.count += valid
+
+        delta = values - self.mean
+        self.mean += np.where(valid, delta / np.maximum(self.count, 1), 0)
+        self._m2 += np.where(valid, delta * (values - self.mean), 0)
+
+        self.min = np.fmin(self.min, grid)
+        self.max = np.fmax(self.max, grid)
+
+    def std(self, ddof=0):
+
+        """The per-cell standard deviation, NaN where there are no more than ddof values."""
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = self._m2 / (self.count - ddof)
+
+        return(np.sqrt(np.where(self.count > ddof, variance, np.nan)))
+
+    def result(self, ddof=0):
+
+        """Returns the statistics as a dictionary of grids, NaN where no grid had a value."""
+
+        empty = self.count == 0
+
+        return({'count': self.count,
+                'mean': np.where(empty, np.nan, self.mean),
+                'std': self.std(ddof),
+                'min': self.min,
+                'max': self.max})
+
+def member_grid(path, variable, xmin, xmax, ymin, ymax, grid_options, cache=None):
+
+    """Reads one .PRO file and grids a variable, the work done for each member in a worker process.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        variable (str): full name of the variable
+        xmin, xmax, ymin, ymax: see `tools.create_grid`
+        grid_options (dict): any other keyword arguments for `tools.create_grid`, e.g. kind or time_bins
+        cache (bool or str): optional, see `tools.read_pro`
+
+    Returns:
+        info (dict): as returned by `tools.create_grid`
+    """
+
+    window = read_window(xmin, xmax, ymin, ymax)
+
+    pro = read_pro(path, variable, columnar=True, cache=cache, xmin=window[0], xmax=window[1])
+
+    return(create_grid(pro, variable, xmin, xmax, ymin, ymax, **grid_options))
+
+def ensemble_stats(paths,
+                   variable,
+                   ymin,
+                   ymax,
+                   xmin=None,
+                   xmax=None,
+                   reference=None,
+                   percentiles=(),
+                   max_workers=None,
+                   cache=None,
+                   align='nearest',
+                   tolerance=None,
+                   **grid_options):
+
+    """Grids a variable from many .PRO runs in parallel and computes per-cell statistics over them.
+
+    All members share the vertical grid given by ymin and ymax, and the time axis of the reference run (or of the
+    first path if there's no reference), onto which each member is matched with `tools.align_grid`. Cells a member
+    has no data or no matching timestep for don't count towards the statistics of that cell.
+
+    The mean, std, min and max are accumulated as each member arrives, so memory stays that of a few grids however
+    many members there are. Percentiles need every member's value in a cell, so if they're asked for, the member
+    grids are also written to a temporary float32 memmap on disk (members x rows x columns x 4 bytes, in the
+    system's temporary directory, deleted afterwards), which is read back a block of rows at a time. Percentiles
+    are therefore computed from values rounded to float32.
+
+    Args:
+        paths (list): Strings pointing to the locations of the member .PRO files
+        variable (str): Variable to use, can be a .pro recognised code or a niviz approved shortening. Grain type,
+            being categorical, can't be used.
+        ymin (float): min height of the shared grid, required
+        ymax (float): max height of the shared grid, required
+        xmin (datetime.datetime): optional, represents time from which data is used
+        xmax (datetime.datetime): optional, represents time to which data is used
+        reference (str): optional, path to a reference .PRO run. Adds its grid and the difference of the ensemble
+            mean from it.
+        percentiles (list): optional, percentiles (0-100) to compute per cell, e.g. [10, 50, 90]
+        max_workers (int): optional, number of processes. Defaults to the number of cores.
+        cache (bool or str): optional, cache the parsed .PRO data on disk (see `tools.read_pro`)
+        align (str): optional, how members' timesteps are matched to the shared time axis, see `tools.align_grid`
+        tolerance (datetime.timedelta): optional, the furthest a member's timestep may be from its match
+        **grid_options: optional, passed on to `tools.create_grid`, e.g. kind, grid_resolution or time_bins
+
+    Returns:
+        stats (dict): 'count', 'mean', 'std', 'min' and 'max' grids, 'percentiles' (a dictionary of grids keyed by
+            percentile), 'reference' and 'difference' grids if there's a reference, plus 'max_height',
+            'min_height' and 'dates' like `tools.create_grid` returns
+    """
+
+    variable = variable_shortenings(variable)
+
+    check_difference_with_conditions(ymin, ymax, variable)
+
+    paths = list(paths)
+
+    if not paths:
+        raise ValueError("No .PRO files given for the ensemble")
+
+    first = member_grid(reference or paths[0], variable, xmin, xmax, ymin, ymax, grid_options, cache)
+    dates = np.array(first['dates'], dtype='datetime64[ns]')
+    shape = first['grid'].shape
+
+    stats = RunningStats(shape)
+
+    members = None
+    if len(percentiles):
+        scratch = tempfile.NamedTemporaryFile(suffix='.npy', delete=False)
+        scratch.close()
+        members = np.lib.format.open_memmap(scratch.name, mode='w+', dtype=np.float32, shape=(len(paths),) + shape)
+
+    try:
+
+        max_workers = min(max_workers or os.cpu_count() or 1, len(paths))
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+
+            futures = {executor.submit(member_grid, path, variable, xmin, xmax, ymin, ymax, grid_options, cache):
+                       count for count, path in enumerate(paths) if reference or count > 0}
+
+            if not reference:
+                stats.add(first['grid'])
+                if members is not None:
+                    members[0] = first['grid']
+
+            # Futures are dropped as soon as their grid is folded in, or every member's grid would stay held
+
+            for future in as_completed(futures):
+
+                count = futures.pop(future)
+                grid = align_grid(future.result(), dates, align, tolerance)[0]
+
+                stats.add(grid)
+                if members is not None:
+                    members[count] = grid
+
+                del future, grid
+
+        result = stats.result()
+        result['percentiles'] = {}
+
+        if members is not None:
+            members.flush()
+            result['percentiles'] = member_percentiles(members, percentiles)
+
+    finally:
+        if members is not None:
+            del members
+            os.remove(scratch.name)
+
+    if reference:
+        result['reference'] = first['grid']
+        result['difference'] = result['mean'] - first['grid']
+
+    result.update({'max_height': first['max_height'],
+                   'min_height': first['min_height'],
+                   'dates': first['dates']})
+
+    return(result)
+
+def member_percentiles(members, percentiles, max_cells=2 ** 22):
+
+    """Per-cell percentiles over the first axis of a stack of member grids, ignoring NaN.
+
+    Args:
+        members (np.array): array (often a memmap) of shape (members, rows, columns)
+        percentiles (list): percentiles (0-100) to compute
+        max_cells (int): optional, roughly how many values to load at a time
+
+    Returns:
+        dict: a grid for each percentile
+    """
+
+    n_members, n_rows, n_columns = members.shape
+
+    grids = {p: np.full((n_rows, n_columns), np.nan) for p in percentiles}
+
+    block = max(1, max_cells // max(n_members * n_columns, 1))
+
+    for first in range(0, n_rows, block):
+
+        values = np.asarray(members[:, first:first + block], dtype=np.float64)
+        has_data = ~np.isnan(values).all(axis=0)
+
+        for p in percentiles:
+            grids[p][first:first + block][has_data] = np.nanpercentile(values[:, has_data], p, axis=0)
+
+    return(grids)
@@ -0,0 +1,384 @@
+"""Exports parsed .PRO data to compressed, chunked file formats, so a run's text only has to be parsed once.
+
+Two layouts are written:
+
+- Parquet (`export_parquet`): a long-form table with one row per element and one column per variable, plus the
+  date, the timestep number and the element number. `tools.read_pro` reads these files as it does .PRO files, so
+  every plotting function can be pointed at them.
+- NetCDF or Zarr (`export_grids`): the regridded cube, one (height x time) array per variable, as `create_grid`
+  makes. `load_grids` returns them laid out for `tools.plot_grid`.
+
+Both exporters read the .PRO file a chunk of timesteps at a time (see `tools.iter_pro_chunks`) and write each chunk
+before reading the next, so files larger than memory can be converted.
+
+These formats need optional packages: pyarrow for Parquet, netCDF4 to write NetCDF, zarr to write Zarr and xarray to
+load either grid format. `pip install pyniviz[export]` installs them all.
+"""
+
+import importlib
+import numpy as np
+import pandas as pd
+from pyniviz.tools import iter_pro_chunks, pro_var_codes, pro_code_dict, regrid_columns, column_bottoms, round
+
+def optional_import(module, purpose):
+
+    """Imports an optional dependency, saying what it's needed for if it isn't installed."""
+
+    try:
+        return(importlib.import_module(module))
+    except ImportError as e:
+        raise ImportError(f"{purpose} needs {module.split('.')[0]}, which isn't installed. "
+                          f"Install it, or all the export dependencies with pip install pyniviz[export]") from e
+
+def export_parquet(path, out_path, var_to_plot=None, chunk_size=1000, compression='zstd'):
+
+    """Converts a .PRO file to a Parquet table with one row per element.
+
+    Each chunk of timesteps becomes a row group, so readers can skip the parts of the run outside a time window.
+    Timesteps without any elements are kept as a single row with element number 0.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        out_path (str): where to write the Parquet file
+        var_to_plot (str or list): Optional, the variable(s) to export. Defaults to the same set as `tools.read_pro`.
+        chunk_size (int): Optional, the number of timesteps read and written at a time
+        compression (str): Optional, the Parquet compression codec
+
+    Returns:
+        int: the number of timesteps written
+    """
+
+    pq = optional_import('pyarrow.parquet', 'Exporting to Parquet')
+
+    writer = None
+    n_steps = 0
+
+    try:
+        for chunk in iter_pro_chunks(path, pro_var_codes(var_to_plot), chunk_size=chunk_size):
+
+            table = element_table(chunk, n_steps)
+
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, table.schema, compression=compression)
+
+            writer.write_table(table)
+            n_steps += len(chunk['dates'])
+
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return(n_steps)
+
+def element_table(pro, first_step=0):
+
+    """Lays columnar .PRO data out as a pyarrow table with one row per element, see `export_parquet`.
+
+    Args:
+        pro (dict): columnar .PRO data, see `tools.read_pro_columns`
+        first_step (int): Optional, the number of the first timestep in pro within the whole run
+
+    Returns:
+        pyarrow.Table
+    """
+
+    pa = optional_import('pyarrow', 'Exporting to Parquet')
+
+    lengths = np.diff(pro['offsets'])
+    rows = np.maximum(lengths, 1)
+    row_starts = np.cumsum(rows) - rows
+
+    element = np.arange(rows.sum()) - np.repeat(row_starts, rows) + 1
+    element[row_starts[lengths == 0]] = 0
+    real = element > 0
+
+    table = {'date': np.repeat(pro['dates'], rows),
+             'step': np.repeat(np.arange(first_step, first_step + len(lengths), dtype=np.int64), rows),
+             'element': element.astype(np.int32)}
+
+    for varname, values in pro['columns'].items():
+        column = np.full(len(element), np.nan)
+        column[real] = values
+        table[varname] = column
+
+    return(pa.table(table))
+
+def read_parquet_pro(path, var_to_plot=None, xmin=None, xmax=None):
+
+    """Reads a Parquet file written by `export_parquet` back into columnar .PRO data.
+
+    Only the columns needed are read, and row groups outside [xmin, xmax] are skipped.
+
+    Args:
+        path (str): String pointing to the location of the Parquet file
+        var_to_plot (str or list): Optional, the variable(s) to read. Defaults to the same set as `tools.read_pro`.
+        xmin (datetime.datetime): Optional, only read timesteps from this time on
+        xmax (datetime.datetime): Optional, only read timesteps up to this time
+
+    Returns:
+        pro (dict): columnar .PRO data, see `tools.read_pro_columns`
+    """
+
+    pq = optional_import('pyarrow.parquet', 'Reading Parquet')
+
+    available = pq.read_schema(path).names
+    code_dict = pro_code_dict(return_all=True)
+
+    varnames = [code_dict[code] for code in pro_var_codes(var_to_plot) if code != '0500'] + ['thickness_m']
+    varnames = [varname for varname in varnames if varname in available]
+
+    filters = []
+    if xmin:
+        filters.append(('date', '>=', pd.Timestamp(xmin)))
+    if xmax:
+        filters.append(('date', '<=', pd.Timestamp(xmax)))
+
+    table = pq.read_table(path, columns=['date', 'step', 'element'] + varnames, filters=filters or None)
+
+    step = table['step'].to_numpy()
+    element = table['element'].to_numpy()
+    real = element > 0
+
+    step_starts = np.flatnonzero(np.diff(step, prepend=-1))
+
+    if len(step_starts):
+        lengths = np.add.reduceat(real.astype(np.int64), step_starts)
+    else:
+        lengths = np.zeros(0, dtype=np.int64)
+
+    pro = {'dates': table['date'].to_numpy()[step_starts].astype('datetime64[ns]'),
+           'offsets': np.concatenate(([0], np.cumsum(lengths))).astype(np.int64),
+           'columns': {varname: table[varname].to_numpy()[real] for varname in varnames}}
+
+    return(pro)
+
+def export_grids(path,
+                 out_path,
+                 var_to_plot=None,
+                 ymin=None,
+                 ymax=None,
+                 kind='nearest',
+                 grid_resolution=100,
+                 spacing=None,
+                 chunk_size=1000,
+                 dtype=np.float32):
+
+    """Regrids variables from a .PRO file and writes the grids to NetCDF ('.nc') or Zarr ('.zarr') as it goes.
+
+    The grids match what `tools.create_grid` makes for the whole run. If ymin and ymax aren't given they're found
+    the same way, which takes an extra pass over the file reading only the heights. Each variable is stored as
+    'code_XXXX' (its .PRO code) with dimensions (height, time), ascending in both, compressed and chunked
+    chunk_size timesteps at a time, and with its full name as the long_name attribute.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        out_path (str): where to write, the format is chosen by the extension, '.nc' or '.zarr'
+        var_to_plot (str or list): Optional, the variable(s) to export. Defaults to the same set as `tools.read_pro`.
+        ymin, ymax, kind, grid_resolution, spacing, dtype: see `tools.create_grid`
+        chunk_size (int): Optional, the number of timesteps read and written at a time
+
+    Returns:
+        int: the number of timesteps written
+    """
+
+    if out_path.endswith('.nc'):
+        writer = NetcdfGridWriter(out_path)
+    elif out_path.rstrip('/').endswith('.zarr'):
+        writer = ZarrGridWriter(out_path)
+    else:
+        raise ValueError(f"Can't tell the format to write from {out_path}, it should end in .nc or .zarr")
+
+    height_name = 'height [> 0: top, < 0: bottom of elem.] (cm)'
+    code_dict = pro_code_dict(return_all=True)
+
+    var_codes = [code for code in pro_var_codes(var_to_plot) if code not in ['0500', '0501']]
+    varnames = [code_dict[code] for code in var_codes]
+
+    if ymin is None or ymax is None:
+        ymin, ymax = height_limits(path)
+
+    if spacing:
+        grid_resolution = int(np.round((ymax - ymin) / spacing)) + 1
+    vertical_grid = np.linspace(ymin, ymax, grid_resolution)
+
+    n_steps = 0
+
+    try:
+        writer.start(vertical_grid, var_codes, varnames, dtype, chunk_size, {'kind': kind, 'source': str(path)})
+
+        for chunk in iter_pro_chunks(path, ['0500', '0501'] + var_codes, chunk_size=chunk_size):
+
+            offsets = chunk['offsets']
+            bottoms = column_bottoms(chunk) if kind == 'layer' and offsets[-1] else None
+            values = np.stack([chunk['columns'][varname] for varname in varnames])
+
+            grids = regrid_columns(chunk['columns'][height_name], values, offsets, vertical_grid, kind, bottoms,
+                                   dtype)
+
+            writer.append(chunk['dates'], grids)
+            n_steps += len(chunk['dates'])
+
+    finally:
+        writer.close()
+
+    return(n_steps)
+
+def height_limits(path, chunk_size=10000):
+
+    """Finds the y limits `tools.create_grid` would choose for a .PRO file, reading only the heights.
+
+    Returns:
+        (min_height, max_height): the lowest bottom and highest top element heights, rounded out to 5 cm
+    """
+
+    height_name = 'height [> 0: top, < 0: bottom of elem.] (cm)'
+
+    lowest, highest = np.inf, -np.inf
+
+    for chunk in iter_pro_chunks(path, ['0500', '0501'], chunk_size=chunk_size):
+
+        offsets = chunk['offsets']
+        heights = chunk['columns'][height_name]
+        not_empty = np.diff(offsets) > 0
+
+        if not_empty.any():
+            lowest = min(lowest, np.min(heights[offsets[:-1][not_empty]]))
+            highest = max(highest, np.max(heights[offsets[1:][not_empty] - 1]))
+
+    return(round(lowest ,5 ,'down'), round(highest ,5 ,'up'))
+
+class NetcdfGridWriter:
+
+    """Writes grids to a NetCDF file with netCDF4, growing an unlimited time dimension, see `export_grids`."""
+
+    def __init__(self, out_path):
+
+        self.netCDF4 = optional_import('netCDF4', 'Exporting to NetCDF')
+        self.out_path = out_path
+        self.dataset = None
+
+    def start(self, vertical_grid, var_codes, varnames, dtype, chunk_size, attributes):
+
+        self.dataset = self.netCDF4.Dataset(self.out_path, 'w')
+        self.dataset.setncatts(attributes)
+
+        self.dataset.createDimension('height', len(vertical_grid))
+        self.dataset.createDimension('time', None)
+
+        height = self.dataset.createVariable('height', 'f8', ('height',))
+        height.units = 'cm'
+        height[:] = vertical_grid
+
+        time = self.dataset.createVariable('time', 'f8', ('time',))
+        time.units = 'seconds since 1970-01-01 00:00:00'
+        time.calendar = 'standard'
+
+        self.variables = []
+        for code, varname in zip(var_codes, varnames):
+            variable = self.dataset.createVariable(f"code_{code}", dtype, ('height', 'time'), zlib=True,
+                                                   complevel=4, chunksizes=(len(vertical_grid), chunk_size),
+                                                   fill_value=np.nan)
+            variable.long_name = varname
+            self.variables.append(variable)
+
+    def append(self, dates, grids):
+
+        start = len(self.dataset.dimensions['time'])
+        end = start + len(dates)
+
+        self.dataset['time'][start:end] = (dates - np.datetime64('1970-01-01')) / np.timedelta64(1, 's')
+
+        for variable, grid in zip(self.variables, grids):
+            variable[:, start:end] = grid
+
+    def close(self):
+
+        if self.dataset is not None:
+            self.dataset.close()
+
+class ZarrGridWriter:
+
+    """Writes grids to a Zarr store through xarray, appending along time, see `export_grids`."""
+
+    def __init__(self, out_path):
+
+        self.xarray = optional_import('xarray', 'Exporting to Zarr')
+        optional_import('zarr', 'Exporting to Zarr')
+        self.out_path = out_path
+        self.started = False
+
+    def start(self, vertical_grid, var_codes, varnames, dtype, chunk_size, attributes):
+
+        self.vertical_grid = vertical_grid
+        self.var_codes = var_codes
+        self.varnames = varnames
+        self.chunk_size = chunk_size
+        self.attributes = attributes
+
+    def append(self, dates, grids):
+
+        dataset = self.xarray.Dataset(
+            {f"code_{code}": (('height', 'time'), grid, {'long_name': varname})
+             for code, varname, grid in zip(self.var_codes, self.varnames, grids)},
+            coords={'height': ('height', self.vertical_grid, {'units': 'cm'}),
+                    'time': dates},
+            attrs=self.attributes)
+
+        if self.started:
+            dataset.to_zarr(self.out_path, append_dim='time')
+        else:
+            encoding = {f"code_{code}": {'chunks': (len(self.vertical_grid), self.chunk_size)}
+                        for code in self.var_codes}
+            dataset.to_zarr(self.out_path, mode='w', encoding=encoding)
+            self.started = True
+
+    def close(self):
+
+        pass
+
+def load_grids(path, var_to_plot=None, xmin=None, xmax=None):
+
+    """Loads grids written by `export_grids`, as the dictionaries `tools.create_grids` returns.
+
+    Each can be passed straight to `tools.plot_grid`. Only the variables and time window asked for are read.
+
+    Args:
+        path (str): String pointing to the location of the '.nc' file or '.zarr' store
+        var_to_plot (str or list): Optional, the variable(s) to load. Defaults to all of them.
+        xmin (datetime.datetime): Optional, only load timesteps from this time on
+        xmax (datetime.datetime): Optional, only load timesteps up to this time
+
+    Returns:
+        grids (dict): keyed by variable, each value a dictionary as returned by `tools.create_grid`
+    """
+
+    xr = optional_import('xarray', 'Loading exported grids')
+
+    if path.rstrip('/').endswith('.zarr'):
+        dataset = xr.open_zarr(path)
+    else:
+        dataset = xr.open_dataset(path)
+
+    code_dict = pro_code_dict(return_all=True)
+
+    if var_to_plot is None:
+        names = [name for name in dataset.data_vars if name.startswith('code_')]
+    else:
+        names = [f"code_{code}" for code in pro_var_codes(var_to_plot) if code not in ['0500', '0501']]
+
+    with dataset:
+
+        dataset = dataset.sel(time=slice(xmin, xmax))
+
+        heights = dataset['height'].values
+        dates = list(pd.to_datetime(dataset['time'].values))
+
+        grids = {}
+
+        for name in names:
+            grids[code_dict[name[5:]]] = {'grid': np.flip(dataset[name].values, axis=0),
+                                          'max_height': heights[-1],
+                                          'min_height': heights[0],
+                                          'dates': dates}
+
+    return(grids)
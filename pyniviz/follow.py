@@ -0,0 +1,339 @@
+import os
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from pyniviz.tools import iter_pro_line_chunks, pro_var_codes, regrid_columns, plot_grid, grid_colorbar, \
+    variable_shortenings, transform_grid_for_grain_type, round
+
+class ProFollower:
+
+    """Follows a .PRO file that SNOWPACK is still writing, gridding and plotting only the newly appended timesteps.
+
+    Each call to `poll` reads the file from where the last call stopped, parses the complete timesteps it finds and
+    appends them as new columns of the grid. `draw` puts the grid on a figure the first time it's called, and after
+    that only swaps the image data in place.
+
+    The vertical grid runs between ymin and ymax if they're given. Otherwise it starts out between the lowest and
+    highest heights found in the first poll that has data, and whenever the snowpack grows out of it, it's widened
+    (with some room to spare) and the file is gridded again from the start.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file to follow
+        variable (str): Variable to plot, can be a .pro recognised code or a niviz approved shortening
+        vmin (float): optional, min value for the colorbar
+        vmax (float): optional, max value for the colorbar
+        ymin (float): optional, represents min height to which data appears on the plot
+        ymax (float): optional, represents max height to which data appears on the plot
+        c_scheme (str): optional, represents the scheme of the colorbar e.g. 'plasma', 'Blues'.
+        yax_shift (float): optional, shifts the y axis ticks down a bit (useful if shifted to a ref value , e.g. 400cm)
+        grid_resolution (int): optional, number of rows in the grid
+    """
+
+    def __init__(self, path, variable, vmin=None, vmax=None, ymin=None, ymax=None, c_scheme='plasma',
+                 yax_shift=0, grid_resolution=100):
+
+        self.path = path
+        self.variable = variable_shortenings(variable)
+        self.var_codes = pro_var_codes(self.variable)
+        self.vmin, self.vmax = vmin, vmax
+        self.ymin, self.ymax = ymin, ymax
+        self.c_scheme = c_scheme
+        self.yax_shift = yax_shift
+        self.grid_resolution = grid_resolution
+
+        self.position = None
+        self.last_size = None
+        self.vertical_grid = None
+        self.dates = []
+        self._buffer = np.full((grid_resolution, 0), np.nan)
+        self.n_columns = 0
+
+        self.fig, self.ax, self.image = None, None, None
+
+    @property
+    def info(self):
+
+        """The grid so far, as the dictionary `tools.create_grid` returns."""
+
+        return({'grid': self._buffer[:, :self.n_columns],
+                'max_height': self.vertical_grid[-1] if self.vertical_grid is not None else self.ymax,
+                'min_height': self.vertical_grid[0] if self.vertical_grid is not None else self.ymin,
+                'dates': self.dates})
+
+    def reset(self):
+
+        """Forgets everything read so far, so the next poll starts from the top of the file."""
+
+        self.position = None
+        self.dates = []
+        self.n_columns = 0
+        if not self.fixed_heights:
+            self.vertical_grid = None
+
+    @property
+    def fixed_heights(self):
+
+        """Whether the vertical grid was set by ymin and ymax rather than by the data."""
+
+        return(self.ymin is not None and self.ymax is not None)
+
+    def poll(self, final=False):
+
+        """Reads and grids the complete timesteps appended to the file since the last poll.
+
+        A timestep counts as complete once the next one has started, or once all the lines that are needed for the
+        variable have been written in full. The last line of a file often has no line end, so the last timestep
+        is also taken as complete when its lines all hold as many values as they say they do and the file hasn't
+        grown since the previous poll, or when final is True. If the file has shrunk (e.g. SNOWPACK was restarted)
+        everything is read again from the start.
+
+        Args:
+            final (bool): optional, the writer has finished, so whatever is in the file is complete
+
+        Returns:
+            int: the number of timesteps gridded, which is all of them if the vertical grid had to be widened
+        """
+
+        size = os.path.getsize(self.path)
+
+        if self.position is not None and size < self.position:
+            self.reset()
+
+        at_end = final or size == self.last_size
+        self.last_size = size
+
+        pro = self.read_new(at_end)
+
+        # Start again on a taller grid. It spans the heights read before as well as the new ones, so this only
+        # repeats if the file grows taller again in the meantime.
+
+        while pro is not None and not self.fixed_heights and self.vertical_grid is not None and self.outgrown(pro):
+            self.widen(pro)
+            self.position, self.dates, self.n_columns = None, [], 0
+            pro = self.read_new(at_end)
+
+        if pro is None:
+            return(0)
+
+        self.append(pro)
+
+        return(len(pro['dates']))
+
+    def read_new(self, at_end=False):
+
+        """Parses the complete timesteps from the current position on, and moves the position past them.
+
+        Args:
+            at_end (bool): optional, see `complete_length`
+
+        Returns:
+            pro (dict): columnar .PRO data, or None if there are no complete timesteps yet
+        """
+
+        with open(self.path, 'rb') as f:
+
+            if self.position is None:
+                data = f.read()
+                marker = data.find(b'[DATA]')
+                if marker == -1 or data.find(b'\n', marker) == -1:
+                    return(None)
+                self.position = data.find(b'\n', marker) + 1
+                data = data[self.position:]
+            else:
+                f.seek(self.position)
+                data = f.read()
+
+        consumed = self.complete_length(data, at_end)
+
+        if consumed == 0:
+            return(None)
+
+        lines = data[:consumed].decode().splitlines()
+        self.position += consumed
+
+        chunks = list(iter_pro_line_chunks(lines, self.path, self.var_codes, chunk_size=None)) \
+            if any(line.startswith('0500') for line in lines) else []
+
+        return(chunks[0] if chunks else None)
+
+    def complete_length(self, data, at_end=False):
+
+        """Returns how many bytes at the start of data hold complete timesteps.
+
+        Args:
+            data (bytes): the file contents from the current position on
+            at_end (bool): optional, nothing more is being written, so a last line without a line end is complete
+                if it holds all its values
+
+        Returns:
+            int: a position in data just after a line end, or the end of data
+        """
+
+        finished = data.endswith(b'\n') or (at_end and whole_line(data[data.rfind(b'\n') + 1:]))
+
+        last_date = data.rfind(b'\n0500,')
+
+        if data.startswith(b'0500,') and last_date == -1:
+            last_date = 0
+        elif last_date == -1:
+            return(len(data) if finished else data.rfind(b'\n') + 1)
+        else:
+            last_date += 1
+
+        # The last block is complete if every code needed is there and nothing is left half written
+
+        block = data[last_date:]
+
+        if finished and all((b'\n' + code.encode() + b',') in b'\n' + block for code in self.var_codes):
+            return(len(data))
+
+        return(last_date)
+
+    def height_range(self, pro):
+
+        """The lowest element bottom and highest element top in some timesteps, rounded out to 5 cm."""
+
+        offsets = pro['offsets']
+        heights = pro['columns']['height [> 0: top, < 0: bottom of elem.] (cm)']
+
+        return(round(np.min(heights[offsets[:-1]]), 5, 'down'), round(np.max(heights[offsets[1:] - 1]), 5, 'up'))
+
+    def outgrown(self, pro):
+
+        """Whether some timesteps reach above or below the vertical grid."""
+
+        min_height, max_height = self.height_range(pro)
+
+        return(min_height < self.vertical_grid[0] or max_height > self.vertical_grid[-1])
+
+    def widen(self, pro, headroom=0.25):
+
+        """Makes the vertical grid span some timesteps as well as what it spans already, plus headroom (a fraction
+        of the new span) above, so a growing snowpack doesn't outgrow it again straight away."""
+
+        min_height, max_height = self.height_range(pro)
+        min_height, max_height = min(min_height, self.vertical_grid[0]), max(max_height, self.vertical_grid[-1])
+        max_height = round(max_height + headroom * (max_height - min_height), 5, 'up')
+
+        self.vertical_grid = np.linspace(min_height, max_height, self.grid_resolution)
+
+    def append(self, pro):
+
+        """Grids some newly read timesteps and adds them as columns on the right of the grid.
+
+        Args:
+            pro (dict): columnar .PRO data, see `tools.read_pro_columns`
+        """
+
+        offsets = pro['offsets']
+        heights = pro['columns']['height [> 0: top, < 0: bottom of elem.] (cm)']
+
+        if self.vertical_grid is None:
+            if self.fixed_heights:
+                min_height, max_height = self.ymin, self.ymax
+            else:
+                min_height, max_height = self.height_range(pro)
+            self.vertical_grid = np.linspace(min_height, max_height, self.grid_resolution)
+
+        new_columns = np.flip(regrid_columns(heights, pro['columns'][self.variable], offsets, self.vertical_grid),
+                              axis=0)
+
+        # Grow the buffer geometrically, so appending stays cheap however often we poll
+
+        needed = self.n_columns + new_columns.shape[1]
+
+        if needed > self._buffer.shape[1]:
+            grown = np.full((self.grid_resolution, max(needed, 2 * self._buffer.shape[1])), np.nan)
+            grown[:, :self.n_columns] = self._buffer[:, :self.n_columns]
+            self._buffer = grown
+
+        self._buffer[:, self.n_columns:needed] = new_columns
+        self.n_columns = needed
+
+        self.dates.extend(pd.to_datetime(pro['dates']))
+
+    def draw(self, ax=None):
+
+        """Plots the grid, or if it's been plotted already, updates the existing image in place.
+
+        Args:
+            ax (matplotlib axes): optional, axes to draw on the first time. A new figure is made if not given.
+
+        Returns:
+            the matplotlib AxesImage showing the grid, or None if there's no data yet
+        """
+
+        info = self.info
+
+        if self.n_columns == 0:
+            return(None)
+
+        if self.image is None:
+
+            if ax is None:
+                self.fig, ax = plt.subplots(1 ,1 ,figsize=(10 ,6))
+            else:
+                self.fig = ax.figure
+            self.ax = ax
+
+            plot_grid(info, self.variable, self.vmin, self.vmax, None, None, None, None,
+                      None, self.c_scheme, self.yax_shift, ax)
+            grid_colorbar(self.fig, ax, self.variable)
+
+            self.image = ax.images[-1]
+
+        else:
+
+            grid = info['grid']
+            if "grain type" in self.variable:
+                grid = transform_grid_for_grain_type(grid)
+
+            x_lims = mdates.date2num([info['dates'][0], info['dates'][-1]])
+
+            self.image.set_data(grid)
+            self.image.set_extent([x_lims[0],
+                                   x_lims[1],
+                                   info['min_height'] - self.yax_shift,
+                                   info['max_height'] - self.yax_shift])
+            self.ax.set_xlim(x_lims)
+            self.ax.set_ylim(info['min_height'] - self.yax_shift, info['max_height'] - self.yax_shift)
+
+            self.fig.canvas.draw_idle()
+
+        return(self.image)
+
+    def run(self, interval=60, max_polls=None):
+
+        """Polls the file and redraws the plot every interval seconds.
+
+        Args:
+            interval (float): optional, seconds between polls
+            max_polls (int): optional, stop after this many polls. By default it runs until the figure is closed.
+        """
+
+        polls = 0
+
+        while max_polls is None or polls < max_polls:
+
+            if self.poll() or self.image is None:
+                self.draw()
+
+            polls += 1
+
+            if self.fig is not None and not plt.fignum_exists(self.fig.number):
+                break
+
+            plt.pause(interval)
+
+def whole_line(line):
+
+    """Whether a .PRO data line (without its line end) holds as many values as its count says, e.g. whether
+    '0502,3,100.0,240.5,300.1' was written in full."""
+
+    fields = line.split(b',')
+
+    try:
+        return(len(line) > 4 and line[4:5] == b',' and len(fields) == int(fields[1]) + 2)
+    except (IndexError, ValueError):
+        return(False)
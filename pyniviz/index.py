@@ -0,0 +1,336 @@
+import os
+import mmap
+import numpy as np
+import pandas as pd
+from pyniviz.tools import iter_pro_line_chunks, build_pro_columns, pro_var_codes, pro_code_dict, split_pro_line, \
+    snowpro_list_from_columns, in_time_window
+
+INDEX_KEYS = ['dates', 'starts', 'ends', 'codes', 'line_starts', 'line_lengths']
+
+def index_file(path):
+
+    """Returns the location of the sidecar index of a .PRO file, e.g. 'run.pro.index.npz' for 'run.pro'."""
+
+    return(f"{path}.index.npz")
+
+def build_index(path):
+
+    """Scans a .PRO file and records where each timestep's block of lines, and each line in it, starts.
+
+    Only the first few characters of each line are looked at, nothing is parsed but the dates.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+
+    Returns:
+        index (dict): 'dates' (datetime64 array), 'starts' (byte offset of each date line), 'ends' (byte offset
+            just past the last line of each timestep's block), 'codes' (the codes of the data lines found),
+            'line_starts' and 'line_lengths' (arrays of shape (timesteps, codes) giving the byte offset and length
+            of each timestep's line of each code, -1 and 0 if a timestep lacks that line)
+    """
+
+    date_strings, starts, blocks = [], [], []
+    in_data = False
+    position = 0
+
+    with open(path, 'rb') as f:
+
+        for line in f:
+
+            if in_data:
+                if line[:5] == b'0500,':
+                    starts.append(position)
+                    date_strings.append(line[5:].decode().rstrip())
+                    blocks.append({})
+                elif blocks and line[4:5] == b',':
+                    blocks[-1][line[:4].decode()] = (position, len(line))
+            elif line.startswith(b'[DATA]'):
+                in_data = True
+
+            position += len(line)
+
+    starts = np.array(starts, dtype=np.int64)
+    ends = np.append(starts[1:], position).astype(np.int64)
+
+    codes = sorted(set().union(*blocks))
+    column = {code: count for count, code in enumerate(codes)}
+
+    line_starts = np.full((len(blocks), len(codes)), -1, dtype=np.int64)
+    line_lengths = np.zeros((len(blocks), len(codes)), dtype=np.int64)
+
+    for step, block in enumerate(blocks):
+        for code, (start, length) in block.items():
+            line_starts[step, column[code]] = start
+            line_lengths[step, column[code]] = length
+
+    index = {'dates': pd.to_datetime(date_strings, format="%d.%m.%Y %H:%M:%S").to_numpy().astype('datetime64[ns]'),
+             'starts': starts,
+             'ends': ends,
+             'codes': np.array(codes, dtype='<U4'),
+             'line_starts': line_starts,
+             'line_lengths': line_lengths}
+
+    return(index)
+
+def load_index(path):
+
+    """Returns the timestep index of a .PRO file, (re)building the sidecar index file if it's missing or stale.
+
+    The sidecar records the size and modification time of the .PRO file it was built from, and is rebuilt as soon
+    as either changes. If the sidecar can't be written next to the .PRO file, the index is still returned.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+
+    Returns:
+        index (dict): see `build_index`
+    """
+
+    source = os.stat(path)
+    sidecar = index_file(path)
+
+    if os.path.exists(sidecar):
+        try:
+            with np.load(sidecar) as npz:
+                if npz['source_size'] == source.st_size and npz['source_mtime_ns'] == source.st_mtime_ns:
+                    return({key: npz[key] for key in INDEX_KEYS})
+        except (OSError, ValueError, KeyError):
+            pass
+
+    index = build_index(path)
+
+    try:
+        temporary = f"{sidecar}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            np.savez(f,
+                     source_size=np.int64(source.st_size),
+                     source_mtime_ns=np.int64(source.st_mtime_ns),
+                     **index)
+        os.replace(temporary, sidecar)
+    except OSError:
+        pass
+
+    return(index)
+
+def read_blocks(path, start, end, var_codes):
+
+    """Parses the timesteps stored between two byte offsets of a .PRO file.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        start (int): byte offset of the first date line to read
+        end (int): byte offset just past the last line to read
+        var_codes (list): four character .PRO codes to read
+
+    Returns:
+        pro (dict): columnar .PRO data, see `tools.read_pro_columns`
+    """
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).decode().splitlines()
+
+    if not lines:
+        return(build_pro_columns(path, var_codes, [], {}, {}))
+
+    return(next(iter_pro_line_chunks(lines, path, var_codes, chunk_size=None)))
+
+def get_snapshot(path, time, var_to_plot=None, nearest=True):
+
+    """Reads the state of the snowpack at one time, parsing only that timestep's lines of the .PRO file.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        time (datetime.datetime): the time of interest
+        var_to_plot (str or list): Optional, the variable(s) to read. Defaults to the same set as `tools.read_pro`.
+        nearest (bool): Optional, if True (default) return the timestep closest to time, otherwise time must match
+            a timestep exactly
+
+    Returns:
+        df (pandas dataframe): the snowpack at that time, laid out like the dataframes `tools.read_pro` returns
+    """
+
+    index = load_index(path)
+
+    if len(index['dates']) == 0:
+        raise ValueError(f"No timesteps found in {path}, is it a .PRO file?")
+
+    target = np.datetime64(pd.Timestamp(time), 'ns')
+
+    position = np.searchsorted(index['dates'], target)
+
+    if nearest:
+        candidates = [p for p in (position - 1, position) if 0 <= p < len(index['dates'])]
+        position = min(candidates, key=lambda p: abs(index['dates'][p] - target))
+    elif position == len(index['dates']) or index['dates'][position] != target:
+        raise KeyError(f"No timestep at {time} in {path}")
+
+    pro = read_blocks(path, index['starts'][position], index['ends'][position], pro_var_codes(var_to_plot))
+
+    return(snowpro_list_from_columns(pro)[0])
+
+def get_snapshots(path, xmin=None, xmax=None, var_to_plot=None, columnar=False):
+
+    """Reads the timesteps in [xmin, xmax], seeking straight to them and parsing nothing else.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        xmin (datetime.datetime): Optional, the start of the time range
+        xmax (datetime.datetime): Optional, the end of the time range
+        var_to_plot (str or list): Optional, the variable(s) to read. Defaults to the same set as `tools.read_pro`.
+        columnar (bool): Optional, if True return columnar data (see `tools.read_pro_columns`)
+
+    Returns:
+        list of dataframes (one per timestep), or the columnar dictionary if columnar=True.
+    """
+
+    index = load_index(path)
+
+    steps = np.flatnonzero(in_time_window(index['dates'], xmin, xmax))
+
+    if len(steps):
+        start, end = index['starts'][steps[0]], index['ends'][steps[-1]]
+    else:
+        start, end = 0, 0
+
+    pro = read_blocks(path, start, end, pro_var_codes(var_to_plot))
+
+    if columnar:
+        return(pro)
+
+    return(snowpro_list_from_columns(pro))
+
+def read_code_lines(path, index, code, steps):
+
+    """Reads one code's lines of some timesteps of a .PRO file, seeking straight to each with the index.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        index (dict): the file's index, see `load_index`
+        code (str): the four character .PRO code
+        steps (np.array): the timesteps to read the lines of
+
+    Returns:
+        lines (list): one string per timestep
+    """
+
+    codes = list(index['codes'])
+
+    if code not in codes:
+        raise ValueError(f"There are no '{code}' lines in {path}")
+
+    starts = index['line_starts'][steps, codes.index(code)]
+    lengths = index['line_lengths'][steps, codes.index(code)]
+
+    if (starts < 0).any():
+        raise ValueError(f"Some timesteps have no '{code}' line in {path}")
+
+    if len(starts) == 0:
+        return([])
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return([mapped[start:start + length].decode() for start, length in zip(starts.tolist(), lengths.tolist())])
+
+def read_columns(path, var_codes, steps=None, index=None):
+
+    """Parses some codes for some timesteps of a .PRO file, reading only those lines.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        var_codes (list): four character .PRO codes to read. Heights ('0501') are always read.
+        steps (np.array): Optional, the timesteps to read, all of them by default
+        index (dict): Optional, the file's index if it's already loaded, see `load_index`
+
+    Returns:
+        pro (dict): columnar .PRO data, see `tools.read_pro_columns`
+    """
+
+    if index is None:
+        index = load_index(path)
+
+    steps = np.arange(len(index['dates'])) if steps is None else np.asarray(steps, dtype=np.int64)
+
+    var_codes = ['0500', '0501'] + [code for code in var_codes if code not in ['0500', '0501']]
+
+    chunks, counts = {}, {}
+
+    for code in var_codes[1:]:
+        split = [split_pro_line(line) for line in read_code_lines(path, index, code, steps)]
+        counts[code] = [count for count, _ in split]
+        chunks[code] = [data for _, data in split]
+
+    return(build_pro_columns(path, var_codes, index['dates'][steps], chunks, counts))
+
+class LazyColumns(dict):
+
+    """The 'columns' of columnar .PRO data that parses any column it doesn't hold yet the first time it's asked for.
+
+    Looking a variable up by name (e.g. columns['stability index Sk38']) reads just that code's lines for the
+    timesteps this data covers, using the byte-offset index of the file. `in`, `keys()` and iterating only see the
+    columns loaded so far.
+
+    The index and the columns already loaded only hold for the file as it was when they were read, so if its size or
+    modification time has changed since, looking up a new column raises a ValueError rather than reading lines from
+    the wrong places. Read the file again to carry on.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        index (dict): the file's index, see `load_index`
+        steps (np.array): the timesteps of the file the columns hold
+        columns (dict): the columns loaded already, at least the heights
+        source (os.stat_result): optional, stat of the file taken before the index and columns were read. Defaults
+            to a stat taken now.
+    """
+
+    def __init__(self, path, index, steps, columns, source=None):
+
+        super().__init__(columns)
+        self.path = path
+        self.index = index
+        self.steps = steps
+        self.source = os.stat(path) if source is None else source
+
+    def __missing__(self, varname):
+
+        if varname not in pro_code_dict(return_all=True).values():
+            raise KeyError(varname)
+
+        code = pro_var_codes(varname)[-1]
+
+        now = os.stat(self.path)
+
+        if (now.st_size, now.st_mtime_ns) != (self.source.st_size, self.source.st_mtime_ns):
+            raise ValueError(f"{self.path} has changed since it was read, so '{varname}' can't be loaded to match "
+                             f"the rest of the data. Read the file again.")
+
+        self[varname] = read_columns(self.path, [code], self.steps, self.index)['columns'][varname]
+
+        return(self[varname])
+
+def read_pro_lazy(path, var_to_plot=None, xmin=None, xmax=None):
+
+    """Reads just the requested variables of a .PRO file, loading any others later when they're first used.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        var_to_plot (str or list): Optional, variable(s) to read now: .PRO names, pyniviz shortenings or codes.
+            By default only the heights are read.
+        xmin (datetime.datetime): Optional, only read timesteps from this time on
+        xmax (datetime.datetime): Optional, only read timesteps up to this time
+
+    Returns:
+        pro (dict): columnar .PRO data, see `tools.read_pro_columns`, with `LazyColumns` as its columns
+    """
+
+    source = os.stat(path)
+    index = load_index(path)
+
+    if len(index['dates']) == 0:
+        raise ValueError(f"No timesteps found in {path}, is it a .PRO file?")
+
+    steps = np.flatnonzero(in_time_window(index['dates'], xmin, xmax))
+
+    pro = read_columns(path, pro_var_codes(var_to_plot) if var_to_plot else ['0500', '0501'], steps, index)
+    pro['columns'] = LazyColumns(path, index, steps, pro['columns'], source)
+
+    return(pro)
@@ -1,7 +1,13 @@
 
-from pyniviz.tools import read_pro, create_grid, plot_grid,\
-    variable_shortenings, read_smet, check_difference_with_conditions
+from pyniviz.tools import read_pro, create_grid, create_grids, plot_grid, plot_mesh, plotted_mappable,\
+    difference_grids, variable_shortenings, read_smet, check_difference_with_conditions, get_grain_tick_labels, \
+    read_window
+from pyniviz.profiling import PipelineReport, stage
 import datetime
+import warnings
+from contextlib import nullcontext
+import numpy as np
+import matplotlib.pyplot as plt
 
 def plot_pro(path,
              variable,
@@ -15,7 +21,20 @@ def plot_pro(path,
              c_scheme='plasma',
              yax_shift=0,
              subplot=None,
-             difference_with=None):
+             difference_with=None,
+             cache=None,
+             kind='nearest',
+             grid_resolution=100,
+             spacing=None,
+             renderer='raster',
+             time_bins=None,
+             how=None,
+             align='nearest',
+             tolerance=None,
+             report=False,
+             profile=None,
+             dpi=500,
+             show=True):
 
     """
 
@@ -31,47 +50,328 @@ def plot_pro(path,
         file_name (str): optional, if present represents where the image should be saved
         c_scheme (str): optional, represents the scheme of the colorbar e.g. 'plasma', 'Blues'.
         yax_shift (float): optional, shifts the y axis ticks down a bit (useful if shifted to a ref value , e.g. 400cm)
+        subplot (matplotlib axes): optional, axes to draw onto instead of making a new figure
+        difference_with (str): optional, path to a second .PRO file whose grid is subtracted from the first
+        cache (bool or str): optional, cache the parsed .PRO data on disk (see `tools.read_pro`)
+        kind (str): optional, 'nearest' (default), 'linear' or 'layer', see `tools.create_grid`
+        grid_resolution (int): optional, number of rows in the grid
+        spacing (float): optional, vertical spacing of the grid rows in cm, overrides grid_resolution
+        renderer (str): optional, 'raster' (default) to draw the regridded image, or 'mesh' to draw every element
+            as it is (see `tools.plot_mesh`). kind, grid_resolution, spacing, time_bins and how only apply to
+            'raster'.
+        time_bins (int or str): optional, aggregate the timesteps into this many columns, or into bins of a pandas
+            frequency such as '6h' or '1D', see `tools.create_grid`. Useful for long runs.
+        how (str): optional, 'mean', 'min', 'max', 'last', 'mode' or 'grain type', how timesteps in a bin are
+            combined, see `tools.reduce_time_bins`
+        align (str): optional, how the timesteps of difference_with are matched to those of path: 'nearest'
+            (default), 'asof', 'interpolate' or 'exact', see `tools.align_grid`
+        tolerance (datetime.timedelta): optional, the furthest apart two matched timesteps may be
+        report (bool or PipelineReport): optional, if True time each stage of the pipeline (reading, gridding,
+            plotting, saving) and measure its memory, see `profiling.PipelineReport`. Pass a PipelineReport to
+            choose its options or to add these stages to one that's already collecting.
+        profile (str): optional, also dump cProfile statistics of the whole call to this file (e.g. 'plot.prof')
+        dpi (int): optional, resolution file_name is saved at
+        show (bool): optional, if False the figure isn't shown but closed once saved, see `tools.plot_grid`
 
     Returns:
+        report (PipelineReport): the stages timed, if report or profile were given, otherwise None
 
     """
 
     variable = variable_shortenings(variable)
 
-    spl = read_pro(path,variable)
+    # With fixed y limits only the requested time window needs reading. Otherwise the whole run is read,
+    # because the automatic y limits are taken from all of it.
 
-    info  = create_grid(spl,
-                         variable,
-                         xmin,
-                         xmax,
-                         ymin,
-                         ymax)
+    window = read_window(xmin, xmax, ymin, ymax)
 
-    if difference_with:
-        check_difference_with_conditions(ymin,ymax,variable)
-        spl2 = read_pro(difference_with, variable)
-        info2 = create_grid(spl2, variable, xmin, xmax, ymin, ymax)
-        info['grid'] = info['grid'] - info2['grid']
+    if renderer not in ('raster', 'mesh'):
+        raise ValueError(f"renderer must be 'raster' or 'mesh', not {renderer!r}")
+
+    if renderer == 'mesh' and difference_with:
+        raise ValueError("difference_with needs renderer='raster', two runs' elements don't line up")
+
+    if profile and not isinstance(report, PipelineReport):
+        report = PipelineReport(profile=profile)
+    elif report is True:
+        report = PipelineReport()
+
+    with report or nullcontext():
+
+        spl = read_pro(path,variable,columnar=True,cache=cache,xmin=window[0],xmax=window[1])
+
+        if renderer == 'mesh':
+
+            with stage('plot_mesh', elements=int(spl['offsets'][-1])):
+                plot_mesh(spl, variable, vmin, vmax, xmin, xmax, ymin, ymax, file_name, c_scheme, yax_shift, subplot,
+                          dpi, show)
+
+        else:
+
+            with stage('create_grid', kind=kind) as record:
+                info  = create_grid(spl,
+                                     variable,
+                                     xmin,
+                                     xmax,
+                                     ymin,
+                                     ymax,
+                                     kind,
+                                     grid_resolution,
+                                     spacing,
+                                     time_bins=time_bins,
+                                     how=how)
+                record.update(timesteps=len(info['dates']), cells=info['grid'].size)
+
+            if difference_with:
+                check_difference_with_conditions(ymin,ymax,variable)
+                spl2 = read_pro(difference_with, variable, columnar=True, cache=cache, xmin=window[0],
+                                xmax=window[1])
+                with stage('create_grid', kind=kind) as record:
+                    info2 = create_grid(spl2, variable, xmin, xmax, ymin, ymax, kind, grid_resolution, spacing,
+                                        time_bins=time_bins, how=how)
+                    record.update(timesteps=len(info2['dates']), cells=info2['grid'].size)
+                with stage('difference_grids', align=align):
+                    info = difference_grids(info, info2, align, tolerance)
+                if info['unmatched']:
+                    warnings.warn(f"{len(info['unmatched'])} of {len(info['dates'])} timesteps had no counterpart "
+                                  f"in {difference_with} and are left blank, from {info['unmatched'][0]} to "
+                                  f"{info['unmatched'][-1]}")
+
+            with stage('plot_grid', cells=info['grid'].size):
+                plot_grid(info,
+                             variable,
+                             vmin,
+                             vmax,
+                             xmin,
+                             xmax,
+                             ymin,
+                             ymax,
+                             file_name,
+                             c_scheme,
+                             yax_shift,
+                             subplot,
+                             dpi,
+                             show)
+
+    return(report or None)
+
+
+def plot_pro_panels(path,
+                    variables,
+                    vmins=None,
+                    vmaxs=None,
+                    c_schemes='plasma',
+                    xmin=None,
+                    xmax=None,
+                    ymin=None,
+                    ymax=None,
+                    file_name=None,
+                    yax_shift=0,
+                    ncols=2,
+                    cache=None,
+                    renderer='raster',
+                    time_bins=None,
+                    how=None,
+                    dpi=500,
+                    show=True):
+
+    """Plots several variables from one .PRO file side by side, each panel with its own colorbar.
+
+    The file is read once for all the variables, and all the grids are made in one go. Panels are laid out in
+    rows of ncols, like examples/multiplot.py does by hand: colorbars sit above their panels, except on the
+    bottom row of a multi-row figure where they go underneath.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file to be read
+        variables (list): Variables to plot, each a .pro recognised code or a niviz approved shortening
+        vmins (list): optional, min value for each colorbar (None entries are fine)
+        vmaxs (list): optional, max value for each colorbar (None entries are fine)
+        c_schemes (str or list): optional, the colorbar scheme for all panels, or a list with one per panel
+        xmin (datetime.datetime): optional, represents time from which data appears on the plot
+        xmax (datetime.datetime): optional, represents time to which data appears on the plot
+        ymin (float): optional, represents min height to which data appears on the plot
+        ymax (float): optional, represents max height to which data appears on the plot
+        file_name (str): optional, if present represents where the image should be saved
+        yax_shift (float): optional, shifts the y axis ticks down a bit (useful if shifted to a ref value , e.g. 400cm)
+        ncols (int): optional, number of panels per row
+        cache (bool or str): optional, cache the parsed .PRO data on disk (see `tools.read_pro`)
+        renderer (str): optional, 'raster' (default) or 'mesh', see `plot_pro`
+        time_bins (int or str): optional, aggregate the timesteps, see `plot_pro`
+        how (str): optional, how timesteps in a bin are combined, see `plot_pro`
+        dpi (int): optional, resolution file_name is saved at
+        show (bool): optional, if False the figure isn't shown but closed once saved. It's still returned, and can
+            be saved again.
+
+    Returns:
+        fig (matplotlib figure): the figure holding the panels
+
+    """
+
+    variables = [variable_shortenings(variable) for variable in variables]
+    n_panels = len(variables)
+
+    vmins = vmins if vmins is not None else [None] * n_panels
+    vmaxs = vmaxs if vmaxs is not None else [None] * n_panels
+    c_schemes = [c_schemes] * n_panels if isinstance(c_schemes, str) else c_schemes
+
+    if renderer not in ('raster', 'mesh'):
+        raise ValueError(f"renderer must be 'raster' or 'mesh', not {renderer!r}")
+
+    window = read_window(xmin, xmax, ymin, ymax)
+
+    pro = read_pro(path, variables, columnar=True, cache=cache, xmin=window[0], xmax=window[1])
+
+    if renderer == 'raster':
+        grids = create_grids(pro, variables, xmin, xmax, ymin, ymax, time_bins=time_bins, how=how)
+
+    # Make a gridspec with a thin colorbar row next to each row of panels
+
+    ncols = min(ncols, n_panels)
+    nrows = int(np.ceil(n_panels / ncols))
+
+    cbar_below = [nrows > 1 and row == nrows - 1 for row in range(nrows)]
+
+    heights = []
+    for row in range(nrows):
+        heights += [1, 0.1] if cbar_below[row] else [0.1, 1]
+
+    fig = plt.figure(figsize=(5 * ncols, 1 + 4.5 * nrows))
+    gs = fig.add_gridspec(ncols=ncols, nrows=2 * nrows, height_ratios=heights)
+
+    axes = []
+
+    for count, (variable, vmin, vmax, c_scheme) in enumerate(zip(variables, vmins, vmaxs, c_schemes)):
+
+        row, col = divmod(count, ncols)
+        plot_row, cbar_row = (2 * row, 2 * row + 1) if cbar_below[row] else (2 * row + 1, 2 * row)
+
+        ax_plot = fig.add_subplot(gs[plot_row, col])
+        ax_cbar = fig.add_subplot(gs[cbar_row, col])
+
+        if renderer == 'raster':
+            plot_grid(grids[variable], variable, vmin, vmax, xmin, xmax, ymin, ymax,
+                      None, c_scheme, yax_shift, ax_plot)
+        else:
+            plot_mesh(pro, variable, vmin, vmax, xmin, xmax, ymin, ymax,
+                      None, c_scheme, yax_shift, ax_plot)
+
+        cbar = fig.colorbar(plotted_mappable(ax_plot), cax=ax_cbar, orientation='horizontal')
+
+        if "grain type" in variable:
+            cbar.set_ticks(np.arange(1, 10))
+            cbar.set_ticklabels(get_grain_tick_labels(), rotation=90, fontsize='small')
+        else:
+            cbar.set_label(variable, fontsize='x-large')
+
+        if not cbar_below[row]:
+            ax_cbar.xaxis.set_label_position('top')
+            ax_cbar.xaxis.set_ticks_position('top')
+
+        if col > 0:
+            ax_plot.set_ylabel("")
+
+        axes.append((ax_plot, ax_cbar))
+
+    if file_name:
+        fig.savefig(file_name ,dpi=dpi, bbox_inches='tight')
+
+    if show:
+        plt.show()
+    else:
+        plt.close(fig)
+
+    return(fig)
+
+
+def plot_ensemble(paths,
+                  variable,
+                  ymin,
+                  ymax,
+                  statistic='mean',
+                  reference=None,
+                  vmin=None,
+                  vmax=None,
+                  xmin=None,
+                  xmax=None,
+                  file_name=None,
+                  c_scheme='plasma',
+                  yax_shift=0,
+                  subplot=None,
+                  max_workers=None,
+                  cache=None,
+                  **grid_options):
+
+    """Plots one per-cell statistic of an ensemble of .PRO runs, see `ensemble.ensemble_stats`.
+
+    Args:
+        paths (list): Strings pointing to the locations of the member .PRO files
+        variable (str): Variable to plot, can be a .pro recognised code or a niviz approved shortening
+        ymin (float): represents min height to which data appears on the plot, required
+        ymax (float): represents max height to which data appears on the plot, required
+        statistic (str or float): optional, 'mean' (default), 'std', 'min', 'max', 'count', 'difference' (ensemble
+            mean minus the reference run) or a number, which plots that percentile
+        reference (str): optional, path to the reference .PRO run, needed for statistic='difference'
+        vmin, vmax, xmin, xmax, file_name, c_scheme, yax_shift, subplot: see `plot_pro`
+        max_workers (int): optional, number of processes reading the members
+        cache (bool or str): optional, cache the parsed .PRO data on disk (see `tools.read_pro`)
+        **grid_options: optional, passed on to `tools.create_grid`, e.g. kind, grid_resolution or time_bins
+
+    Returns:
+        stats (dict): everything `ensemble.ensemble_stats` computed
+    """
+
+    from pyniviz.ensemble import ensemble_stats
+
+    if statistic == 'difference' and not reference:
+        raise ValueError("statistic='difference' needs a reference run")
+
+    percentiles = [] if isinstance(statistic, str) else [statistic]
+
+    stats = ensemble_stats(paths, variable, ymin, ymax, xmin, xmax, reference, percentiles, max_workers, cache,
+                           **grid_options)
+
+    info = {'grid': stats[statistic] if isinstance(statistic, str) else stats['percentiles'][statistic],
+            'max_height': stats['max_height'],
+            'min_height': stats['min_height'],
+            'dates': stats['dates']}
 
     plot_grid(info,
-                 variable,
-                 vmin,
-                 vmax,
-                 xmin,
-                 xmax,
-                 ymin,
-                 ymax,
-                 file_name,
-                 c_scheme,
-                 yax_shift,
-                 subplot)
+              f"{variable_shortenings(variable)}, {statistic if isinstance(statistic, str) else f'p{statistic:g}'}",
+              vmin,
+              vmax,
+              xmin,
+              xmax,
+              ymin,
+              ymax,
+              file_name,
+              c_scheme,
+              yax_shift,
+              subplot)
 
+    return(stats)
 
-def plot_smet(path, var): 
+
+def plot_smet(path, var):
+
+    """Plots time series from a .smet file, each variable on its own axes sharing the time axis.
+
+    Args:
+        path (str): String pointing to the location of the .smet file to be read
+        var (str or list): Variable(s) to plot, as named on the fields line of the .smet file
+
+    Returns:
+        axes (array of matplotlib axes): one per variable
+    """
 
     df = read_smet(path, var)
 
-    df.plot()
+    axes = df.plot(subplots=True, sharex=True, legend=False, figsize=(10, 2 + 2 * len(df.columns)))
+
+    for ax, variable in zip(axes, df.columns):
+        unit = df.attrs['units'].get(variable, '-')
+        ax.set_ylabel(variable if unit == '-' else f"{variable} ({unit})")
+
+    return(axes)
 
 
 # SAMPLE VARIABLES
@@ -0,0 +1,189 @@
+"""Timing and memory reports for the stages of the plotting pipeline, to find out where a slow plot spends its time.
+
+The pipeline functions mark their stages with `stage`, which does nothing unless a `PipelineReport` is active.
+Activate one by using it as a context manager around any pyniviz calls, or by passing report=True to
+`main.plot_pro`:
+
+    with PipelineReport() as report:
+        main.plot_pro('run.pro', 'density', file_name='density.png')
+    print(report)
+"""
+
+import os
+import time
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+ACTIVE_REPORTS = []
+
+class PipelineReport:
+
+    """Records the wall time, peak memory and sizes handled (bytes, lines, timesteps, ...) of each pipeline stage.
+
+    `stages` holds one dictionary per stage, in the order the stages started, with the keys:
+        'stage': the name of the stage, e.g. 'read_pro', 'create_grid', 'plot_grid' or 'savefig'
+        'depth': 0 for top level stages, 1 for stages run inside them (e.g. 'savefig' inside 'plot_grid'), ...
+        'seconds': wall time
+        'peak_mb': the most memory the stage allocated (through Python, numpy arrays included) on top of what was
+            allocated when it started, if memory is True
+    plus whatever the stage counts, e.g. 'path', 'bytes' (written by 'savefig' and 'render'), 'timesteps',
+    'elements' or 'cells'. 'read_pro' records 'file_bytes', the size of the whole file even when only a time window
+    of it was read, and 'lines_estimate', the number of lines the data read would take up in a .PRO file (worked
+    out from the timesteps and variables read, not counted).
+
+    Args:
+        memory (bool): optional, measure peak memory with tracemalloc. This slows the pipeline down a little.
+        profile (str): optional, path of a file to dump cProfile statistics of everything run while the report is
+            active to, for a closer look with pstats or snakeviz
+        callback (function): optional, called with each stage's dictionary as soon as the stage ends
+    """
+
+    def __init__(self, memory=True, profile=None, callback=None):
+
+        self.memory = memory
+        self.profile = profile
+        self.callback = callback
+
+        self.stages = []
+        self._open = []
+        self._started_tracing = False
+        self._profiler = None
+        self._entered = 0
+
+    def __enter__(self):
+
+        # Entering a report that's already active (e.g. one passed to plot_pro inside its own with block) just
+        # carries on collecting
+
+        self._entered += 1
+        if self._entered > 1:
+            return(self)
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+        ACTIVE_REPORTS.append(self)
+
+        return(self)
+
+    def __exit__(self, *exc_info):
+
+        self._entered -= 1
+        if self._entered:
+            return
+
+        ACTIVE_REPORTS.remove(self)
+
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile)
+            self._profiler = None
+
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __str__(self):
+
+        if not self.stages:
+            return("No stages recorded")
+
+        df = self.to_dataframe()
+        df['stage'] = ['  ' * depth + name for depth, name in zip(df['depth'], df['stage'])]
+        width = df['stage'].str.len().max()
+
+        # Counts come out as floats when some stages lack them, show them as whole numbers again
+
+        for column in df.columns.drop(['seconds', 'peak_mb'], errors='ignore'):
+            if df[column].dtype.kind == 'f' and (df[column].dropna() % 1 == 0).all():
+                df[column] = pd.Series(['' if np.isnan(value) else str(int(value)) for value in df[column]],
+                                       index=df.index, dtype=object)
+
+        return(df.drop(columns='depth').to_string(index=False, na_rep='', float_format=lambda x: f"{x:.3f}",
+                                                  formatters={'stage': lambda name: f"{name:<{width}}"}))
+
+    @property
+    def total_seconds(self):
+
+        """The wall time of all the top level stages."""
+
+        return(sum(record['seconds'] for record in self.stages if record['depth'] == 0))
+
+    def to_dataframe(self):
+
+        """Returns the stages as a pandas dataframe, one row per stage."""
+
+        return(pd.DataFrame(self.stages))
+
+    def start(self, name, counts):
+
+        """Opens a stage, see `stage`."""
+
+        record = {'stage': name, 'depth': len(self._open), **counts}
+        self.stages.append(record)
+
+        base = None
+
+        if self.memory:
+            base, peak = tracemalloc.get_traced_memory()
+            if self._open:
+                self._open[-1]['peak'] = max(self._open[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+
+        self._open.append({'record': record, 'base': base, 'peak': base, 'start': time.perf_counter()})
+
+        return(record)
+
+    def finish(self, record):
+
+        """Closes the stage last opened, see `stage`."""
+
+        opened = self._open.pop()
+        record['seconds'] = time.perf_counter() - opened['start']
+
+        if self.memory:
+            peak = max(opened['peak'], tracemalloc.get_traced_memory()[1])
+            record['peak_mb'] = (peak - opened['base']) / 1e6
+            if self._open:
+                self._open[-1]['peak'] = max(self._open[-1]['peak'], peak)
+
+        if self.callback:
+            self.callback(record)
+
+@contextmanager
+def stage(name, **counts):
+
+    """Marks a stage of the pipeline for the active `PipelineReport`, if there is one.
+
+    Yields a dictionary that the stage can add counts to as it learns them, e.g. record['timesteps'] = 100.
+
+    Args:
+        name (str): the name of the stage
+        **counts: anything already known about the stage, e.g. path or bytes
+    """
+
+    if not ACTIVE_REPORTS:
+        yield {}
+        return
+
+    report = ACTIVE_REPORTS[-1]
+    record = report.start(name, counts)
+
+    try:
+        yield record
+    finally:
+        report.finish(record)
+
+def file_size(path):
+
+    """The size of a file in bytes, or None if it isn't a file (e.g. a Zarr store)."""
+
+    return(os.path.getsize(path) if os.path.isfile(path) else None)
@@ -0,0 +1,183 @@
+"""Headless rendering of plots to PNG or SVG bytes, for servers and batch jobs.
+
+Figures here are made on the Agg canvas directly rather than through pyplot, so they're never shown, never block
+and never pile up in pyplot's list of open figures. A `FigurePool` keeps a few figures to reuse between renders;
+each is cleared as soon as its render is done, which drops the grid and everything drawn, so a long running
+worker's memory stays flat.
+
+    pool = FigurePool()
+    png = render_pro('run.pro', 'density', dpi=100, pool=pool)
+"""
+
+import io
+import threading
+from contextlib import contextmanager
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from pyniviz.tools import read_pro, create_grid, plot_grid, grid_colorbar, variable_shortenings, read_window
+from pyniviz.profiling import stage
+
+class FigurePool:
+
+    """A thread safe pool of Agg figures to reuse between renders.
+
+    Args:
+        size (int): optional, the most idle figures to keep. Figures beyond that are dropped once used, so up to
+            size figures are reused and any more in use at once are made as needed.
+    """
+
+    def __init__(self, size=4):
+
+        self.size = size
+        self.created = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+
+        return(self)
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+    @contextmanager
+    def figure(self, figsize=(10, 6), dpi=100):
+
+        """Lends out a cleared figure with a single axes, and takes it back cleared once the block ends.
+
+        Args:
+            figsize (tuple): width and height in inches
+            dpi (int): dots per inch
+
+        Yields:
+            fig, ax: the matplotlib figure and its axes
+        """
+
+        with self._lock:
+            fig = self._idle.pop() if self._idle else None
+
+        if fig is None:
+            fig = Figure()
+            FigureCanvasAgg(fig)
+            self.created += 1
+
+        fig.set_size_inches(figsize)
+        fig.set_dpi(dpi)
+
+        try:
+            yield fig, fig.add_subplot(1, 1, 1)
+        finally:
+            fig.clear()
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(fig)
+
+    def close(self):
+
+        """Drops all the idle figures."""
+
+        with self._lock:
+            self._idle.clear()
+
+def render_grid(information,
+                var_to_plot,
+                vmin=None,
+                vmax=None,
+                xmin=None,
+                xmax=None,
+                ymin=None,
+                ymax=None,
+                c_scheme='plasma',
+                yax_shift=0,
+                format='png',
+                dpi=100,
+                figsize=(10, 6),
+                colorbar=True,
+                bbox_inches=None,
+                pool=None,
+                buffer=None):
+
+    """Draws a grid like `tools.plot_grid` and renders it to PNG or SVG, without pyplot.
+
+    Args:
+        information (dict): the grid and its axes, as returned by `tools.create_grid`
+        var_to_plot (str): variable plotted, used to name the colorbar
+        vmin, vmax, xmin, xmax, ymin, ymax, c_scheme, yax_shift: see `tools.plot_grid`
+        format (str): optional, 'png' (default), 'svg' or anything else matplotlib can save
+        dpi (int): optional, dots per inch
+        figsize (tuple): optional, width and height in inches
+        colorbar (bool): optional, draw the colorbar
+        bbox_inches (str): optional, 'tight' to trim the margins (slower), see `matplotlib.figure.Figure.savefig`
+        pool (FigurePool): optional, pool to take the figure from. By default a figure is made for this render
+            and dropped after it.
+        buffer (file-like): optional, binary buffer or file to write to instead of returning bytes
+
+    Returns:
+        bytes of the rendered image, or buffer if one was given
+    """
+
+    pool = pool or FigurePool(size=0)
+
+    out = io.BytesIO() if buffer is None else buffer
+
+    with stage('render', format=format, dpi=dpi) as record:
+
+        with pool.figure(figsize, dpi) as (fig, ax):
+
+            plot_grid(information, var_to_plot, vmin, vmax, xmin, xmax, ymin, ymax, None, c_scheme, yax_shift, ax)
+
+            if colorbar:
+                grid_colorbar(fig, ax, var_to_plot)
+
+            fig.savefig(out, format=format, dpi=dpi, bbox_inches=bbox_inches)
+
+        if buffer is None:
+            record['bytes'] = out.getbuffer().nbytes
+
+    return(out.getvalue() if buffer is None else buffer)
+
+def render_pro(path,
+               variable,
+               vmin=None,
+               vmax=None,
+               xmin=None,
+               xmax=None,
+               ymin=None,
+               ymax=None,
+               c_scheme='plasma',
+               yax_shift=0,
+               format='png',
+               dpi=100,
+               figsize=(10, 6),
+               pool=None,
+               buffer=None,
+               cache=None,
+               **grid_options):
+
+    """Reads, grids and renders a .PRO variable like `main.plot_pro`, returning the image instead of showing it.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        variable (str): Variable to plot, can be a .pro recognised code or a niviz approved shortening
+        vmin, vmax, xmin, xmax, ymin, ymax, c_scheme, yax_shift: see `main.plot_pro`
+        format, dpi, figsize, pool, buffer: see `render_grid`
+        cache (bool or str): optional, cache the parsed .PRO data on disk (see `tools.read_pro`). Worth it for a
+            server rendering the same runs again and again.
+        **grid_options: optional, passed on to `tools.create_grid`, e.g. kind, grid_resolution or time_bins
+
+    Returns:
+        bytes of the rendered image, or buffer if one was given
+    """
+
+    variable = variable_shortenings(variable)
+
+    window = read_window(xmin, xmax, ymin, ymax)
+
+    pro = read_pro(path, variable, columnar=True, cache=cache, xmin=window[0], xmax=window[1])
+
+    with stage('create_grid'):
+        information = create_grid(pro, variable, xmin, xmax, ymin, ymax, **grid_options)
+
+    return(render_grid(information, variable, vmin, vmax, xmin, xmax, ymin, ymax, c_scheme, yax_shift, format, dpi,
+                       figsize, pool=pool, buffer=buffer))
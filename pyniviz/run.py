@@ -0,0 +1,291 @@
+"""A SNOWPACK run: its .PRO profiles and its .smet forcing, read lazily and sliced together by time."""
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from pyniviz.tools import read_pro, read_smet, create_grid, plot_grid, grid_colorbar, variable_shortenings, \
+    select_timesteps, in_time_window, align_grid
+from pyniviz.derived import BULK_NEEDS, bulk_quantities
+
+class SnowpackRun:
+
+    """The .PRO output of a SNOWPACK run together with the .smet file that forced it.
+
+    Nothing is read until it is needed, and each file is read at most once: .PRO variables are parsed the first
+    time they're asked for (and added to what's already held), the .smet file is read whole the first time any of
+    it is needed. Windows made with `window` or by slicing, e.g. run[xmin:xmax], share the data already read with
+    the run they were made from.
+
+    Args:
+        pro_path (str): String pointing to the location of the .PRO file
+        smet_path (str): optional, String pointing to the location of the .smet file
+        cache (bool or str): optional, cache the parsed .PRO data on disk (see `tools.read_pro`)
+    """
+
+    height_name = 'height [> 0: top, < 0: bottom of elem.] (cm)'
+
+    def __init__(self, pro_path, smet_path=None, cache=None):
+
+        self.pro_path = pro_path
+        self.smet_path = smet_path
+        self.cache = cache
+        self.xmin, self.xmax = None, None
+
+        self._store = {'pro': None, 'smet': None}
+
+    def __repr__(self):
+
+        return(f"SnowpackRun({self.pro_path!r}, {self.smet_path!r}, window=({self.xmin}, {self.xmax}))")
+
+    def __getitem__(self, window):
+
+        if not isinstance(window, slice) or window.step is not None:
+            raise TypeError("Runs are sliced by time, e.g. run[datetime(2020, 1, 1):datetime(2020, 2, 1)]")
+
+        return(self.window(window.start, window.stop))
+
+    def window(self, xmin=None, xmax=None):
+
+        """Returns a view of the run between xmin and xmax (inclusive), sharing everything already read.
+
+        Args:
+            xmin (datetime.datetime): optional, the start of the window
+            xmax (datetime.datetime): optional, the end of the window
+
+        Returns:
+            SnowpackRun
+        """
+
+        view = SnowpackRun(self.pro_path, self.smet_path, self.cache)
+        view._store = self._store
+        view.xmin, view.xmax = xmin, xmax
+
+        return(view)
+
+    def profiles(self, variables=None):
+
+        """Returns the columnar .PRO data in the window, see `tools.read_pro_columns`.
+
+        Args:
+            variables (str or list): optional, .pro recognised codes or niviz approved shortenings to include.
+                Heights and thicknesses are always included.
+
+        Returns:
+            pro (dict): columnar .PRO data holding only the timesteps in the window
+        """
+
+        if variables is None:
+            variables = []
+        elif isinstance(variables, str):
+            variables = [variables]
+
+        variables = [variable_shortenings(variable) for variable in variables]
+        wanted = [self.height_name, 'thickness_m']
+        wanted += [variable for variable in variables if variable not in wanted]
+
+        stored = self._store['pro']
+        missing = wanted if stored is None else [v for v in wanted if v not in stored['columns']]
+
+        if missing:
+            parsed = read_pro(self.pro_path, missing, columnar=True, cache=self.cache)
+            if stored is None:
+                self._store['pro'] = parsed
+            else:
+                stored['columns'].update(parsed['columns'])
+
+        pro = self._store['pro']
+        steps = np.flatnonzero(in_time_window(pro['dates'], self.xmin, self.xmax))
+
+        return(select_timesteps(pro, steps, wanted))
+
+    @property
+    def dates(self):
+
+        """The dates of the .PRO timesteps in the window, a datetime64 array."""
+
+        pro = self._store['pro'] or self.profiles()
+
+        return(pro['dates'][in_time_window(pro['dates'], self.xmin, self.xmax)])
+
+    def forcing(self, variables=None, align=None):
+
+        """Returns the .smet time series in the window, optionally put onto the .PRO timesteps.
+
+        Args:
+            variables (str or list): optional, fields of the .smet file. Defaults to all of them.
+            align (str): optional, leave as None to keep the .smet time steps, or put the series on the .PRO
+                timesteps with 'nearest', 'asof', 'interpolate' or 'exact' (see `tools.align_grid`), or with 'mean'
+                or 'sum' to reduce all the .smet values since the previous .PRO timestep (e.g. 'sum' for PSUM)
+
+        Returns:
+            df (pandas dataframe): one column per variable, indexed by time
+        """
+
+        if self.smet_path is None:
+            raise ValueError("This run has no .smet file")
+
+        if self._store['smet'] is None:
+            self._store['smet'] = read_smet(self.smet_path)
+
+        smet = self._store['smet']
+
+        if variables is not None:
+            smet = smet[[variables] if isinstance(variables, str) else list(variables)]
+
+        if align is None:
+            return(smet[in_time_window(smet.index.to_numpy(), self.xmin, self.xmax)])
+
+        dates = self.dates
+
+        if align in ['mean', 'sum']:
+            values = interval_reduce(smet.index.to_numpy(), smet.to_numpy(), dates, align)
+        else:
+            values = align_grid({'grid': smet.to_numpy().T, 'dates': smet.index}, dates, align)[0].T
+
+        return(pd.DataFrame(values, index=pd.DatetimeIndex(dates), columns=smet.columns))
+
+    def bulk(self, quantities=None):
+
+        """Returns bulk quantities of the column (depth, SWE, ...) at each .PRO timestep in the window.
+
+        Args:
+            quantities (list): optional, see `derived.bulk_quantities`. Defaults to all of them.
+
+        Returns:
+            df (pandas dataframe): one column per quantity, indexed by date
+        """
+
+        quantities = list(BULK_NEEDS) if quantities is None else list(quantities)
+        needs = sorted({need for quantity in quantities for need in BULK_NEEDS.get(quantity, [])})
+
+        return(bulk_quantities(self.profiles(needs), quantities))
+
+    def grid(self, variable, **grid_options):
+
+        """Grids a .PRO variable over the window, see `tools.create_grid`.
+
+        Args:
+            variable (str): .pro recognised code or niviz approved shortening
+            **grid_options: optional, passed on to `tools.create_grid`, e.g. ymin, ymax, kind or time_bins
+
+        Returns:
+            info (dict): as returned by `tools.create_grid`
+        """
+
+        variable = variable_shortenings(variable)
+
+        return(create_grid(self.profiles(variable), variable, **grid_options))
+
+    def plot(self,
+             variable,
+             smet_variables=(),
+             bulk_variables=(),
+             vmin=None,
+             vmax=None,
+             ymin=None,
+             ymax=None,
+             file_name=None,
+             c_scheme='plasma',
+             yax_shift=0,
+             **grid_options):
+
+        """Plots a .PRO variable with .smet series and bulk quantities stacked above it, all on one time axis.
+
+        Args:
+            variable (str): .PRO variable for the bottom panel, a .pro recognised code or niviz approved shortening
+            smet_variables (list): optional, .smet fields to plot, one panel each, above the profile
+            bulk_variables (list): optional, bulk quantities (see `derived.bulk_quantities`) to plot, one panel
+                each, between the .smet series and the profile
+            vmin, vmax, ymin, ymax, file_name, c_scheme, yax_shift: see `main.plot_pro`
+            **grid_options: optional, passed on to `tools.create_grid`, e.g. kind or time_bins
+
+        Returns:
+            fig (matplotlib figure)
+        """
+
+        variable = variable_shortenings(variable)
+        smet_variables = [smet_variables] if isinstance(smet_variables, str) else list(smet_variables)
+        bulk_variables = [bulk_variables] if isinstance(bulk_variables, str) else list(bulk_variables)
+
+        n_series = len(smet_variables) + len(bulk_variables)
+
+        fig, axes = plt.subplots(n_series + 1, 1, sharex=True, figsize=(10, 6 + 1.5 * n_series),
+                                 gridspec_kw={'height_ratios': [1] * n_series + [3]}, squeeze=False)
+        axes = axes[:, 0]
+
+        info = self.grid(variable, ymin=ymin, ymax=ymax, **grid_options)
+
+        plot_grid(info, variable, vmin, vmax, self.xmin, self.xmax, ymin, ymax, None, c_scheme, yax_shift, axes[-1])
+
+        if smet_variables:
+
+            forcing = self.forcing(smet_variables)
+            units = self._store['smet'].attrs.get('units', {})
+
+            for ax, field in zip(axes[:-1], smet_variables):
+                ax.plot(forcing.index, forcing[field], color='k', linewidth=0.8)
+                unit = units.get(field, '-')
+                ax.set_ylabel(field if unit == '-' else f"{field} ({unit})")
+                ax.tick_params(right=True)
+
+        if bulk_variables:
+
+            bulk = self.bulk(bulk_variables)
+
+            for ax, quantity in zip(axes[len(smet_variables):-1], bulk_variables):
+                ax.plot(bulk.index, bulk[quantity], color='k', linewidth=0.8)
+                ax.set_ylabel(quantity)
+                ax.tick_params(right=True)
+
+        if self.xmin and self.xmax:
+            axes[-1].set_xlim(mdates.date2num([self.xmin, self.xmax]))
+        elif info['dates']:
+            axes[-1].set_xlim(mdates.date2num([info['dates'][0], info['dates'][-1]]))
+
+        grid_colorbar(fig, axes[-1], variable, room_from=list(axes))
+
+        if file_name:
+            fig.savefig(file_name ,dpi=500, bbox_inches='tight')
+
+        return(fig)
+
+def interval_reduce(times, values, dates, how='mean'):
+
+    """Reduces time series values over the intervals ending at each of some dates, ignoring NaN.
+
+    Interval i runs from just after dates[i - 1] up to and including dates[i]. The first interval is taken to be as
+    long as the second.
+
+    Args:
+        times (np.array): ascending datetime64 times of the values
+        values (np.array): array of shape (len(times), number of series)
+        dates (np.array): ascending datetime64 interval ends
+        how (str): 'mean' or 'sum'
+
+    Returns:
+        reduced (np.array): array of shape (len(dates), number of series), NaN for intervals without values
+    """
+
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    times = np.asarray(times, dtype='datetime64[ns]')
+
+    if len(dates) == 0:
+        return(np.zeros((0, values.shape[1])))
+
+    first_start = dates[0] - (dates[1] - dates[0]) if len(dates) > 1 else dates[0]
+    ends = np.searchsorted(times, dates, side='right')
+    starts = np.concatenate(([np.searchsorted(times, first_start, side='right')], ends[:-1]))
+
+    valid = ~np.isnan(values)
+    sums = np.vstack((np.zeros(values.shape[1]), np.cumsum(np.where(valid, values, 0), axis=0)))
+    counts = np.vstack((np.zeros(values.shape[1]), np.cumsum(valid, axis=0)))
+
+    total = sums[ends] - sums[starts]
+    count = counts[ends] - counts[starts]
+
+    if how == 'sum':
+        return(np.where(count > 0, total, np.nan))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return(np.where(count > 0, total / count, np.nan))
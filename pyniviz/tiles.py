@@ -0,0 +1,249 @@
+"""Multi-resolution tile pyramids of .PRO grids, for viewers that pan and zoom through long runs.
+
+The finest level is the grid `tools.create_grid` makes, one column per timestep. Each coarser level halves it in
+time and in height, averaging each 2 x 2 block of cells (or, for grain type, taking the most common primary grain
+shape), down to a level that fits in a single tile. Every level is cut into square tiles, written as PNG images
+coloured like `tools.plot_grid` colours them, or as .npy arrays of the values, with a manifest.json describing the
+layout:
+
+    out_dir/manifest.json
+    out_dir/dates.json                  the date of every column of the finest level
+    out_dir/<level>/<row>/<column>.png  level 0 is the coarsest, row 0 is the top of the grid
+
+Tiles holding no data at all are not written; a viewer can draw them as empty.
+"""
+
+import os
+import json
+import math
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import matplotlib.image
+from pyniviz.tools import read_pro, create_grid, grid_colormap, get_grain_tick_labels, variable_shortenings, \
+    reduce_time_bins, read_window
+
+def downsample(grid, how='mean'):
+
+    """Halves a grid in both directions, combining each 2 x 2 block of cells and ignoring NaN.
+
+    A grid with an odd number of rows or columns is padded with NaN first.
+
+    Args:
+        grid (np.array): 2D grid
+        how (str): 'mean', 'mode' for categorical values (ties go to the smallest value) or 'grain type' for the
+            most common primary grain shape, see `tools.reduce_time_bins`
+
+    Returns:
+        np.array: grid of half the rows and columns, rounded up
+    """
+
+    if how not in ('mean', 'mode', 'grain type'):
+        raise ValueError(f"how must be 'mean', 'mode' or 'grain type', not {how!r}")
+
+    n_rows, n_columns = grid.shape
+    padded = np.full((n_rows + n_rows % 2, n_columns + n_columns % 2), np.nan, dtype=grid.dtype)
+    padded[:n_rows, :n_columns] = grid
+
+    blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).transpose(0, 2, 1, 3)
+    blocks = blocks.reshape(blocks.shape[0], blocks.shape[1], 4)
+
+    if how == 'mean':
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            return(np.nanmean(blocks, axis=2))
+
+    # Each block is a bin of four columns to the time binning reducers
+
+    reduced = reduce_time_bins(blocks.reshape(-1, 4), np.array([0]), how)
+
+    return(reduced.reshape(blocks.shape[:2]))
+
+def pyramid_levels(grid, tile_size=256, how='mean'):
+
+    """Builds every level of the pyramid, from one that fits a single tile up to grid itself.
+
+    Args:
+        grid (np.array): the finest level
+        tile_size (int): width and height of a tile in cells
+        how (str): 'mean', 'mode' or 'grain type', see `downsample`
+
+    Returns:
+        levels (list): the grids, coarsest first
+    """
+
+    levels = [grid]
+
+    while max(levels[0].shape) > tile_size:
+        levels.insert(0, downsample(levels[0], how))
+
+    return(levels)
+
+def tile_rgba(values, cmap, vmin, vmax):
+
+    """Colours a tile of values with a colormap, NaN transparent, as 8 bit RGBA."""
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normed = (values - vmin) / (vmax - vmin) if vmax > vmin else np.zeros_like(values)
+
+    return(cmap(np.ma.masked_invalid(normed), bytes=True))
+
+def write_tile(values, tile_path, format, cmap, vmin, vmax):
+
+    """Writes one tile, the work done for each tile in a worker process.
+
+    Args:
+        values (np.array): the tile's values, tile_size x tile_size
+        tile_path (str): where to write it
+        format (str): 'png' or 'npy'
+        cmap (matplotlib colormap), vmin, vmax (float): how to colour PNG tiles
+    """
+
+    os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+
+    if format == 'png':
+        matplotlib.image.imsave(tile_path, tile_rgba(values, cmap, vmin, vmax), format='png')
+    else:
+        np.save(tile_path, values.astype(np.float32))
+
+def export_tiles(path,
+                 out_dir,
+                 variable,
+                 xmin=None,
+                 xmax=None,
+                 ymin=None,
+                 ymax=None,
+                 vmin=None,
+                 vmax=None,
+                 c_scheme='plasma',
+                 format='png',
+                 tile_size=256,
+                 grid_resolution=1024,
+                 kind='nearest',
+                 max_workers=None,
+                 cache=None):
+
+    """Grids a .PRO variable and writes it as a tile pyramid, see the module description for the layout.
+
+    Args:
+        path (str): String pointing to the location of the .PRO file
+        out_dir (str): directory to write the pyramid to, made if needed
+        variable (str): Variable to export, can be a .pro recognised code or a niviz approved shortening
+        xmin, xmax, ymin, ymax: optional, see `tools.create_grid`
+        vmin (float): optional, value at the bottom of the colormap of PNG tiles. Defaults to the lowest value.
+        vmax (float): optional, value at the top of the colormap of PNG tiles. Defaults to the highest value.
+        c_scheme (str): optional, the colormap of PNG tiles, e.g. 'plasma'. Grain type always uses
+            `tools.grain_type_colormap`.
+        format (str): optional, 'png' for coloured images or 'npy' for arrays of the values (grain types as three
+            digit codes), for viewers that colour tiles themselves
+        tile_size (int): optional, width and height of a tile in cells
+        grid_resolution (int): optional, number of rows in the finest level
+        kind (str): optional, 'nearest', 'linear' or 'layer', see `tools.create_grid`
+        max_workers (int): optional, number of processes writing tiles. Defaults to the number of cores, 1 writes
+            them all in this process.
+        cache (bool or str): optional, cache the parsed .PRO data on disk (see `tools.read_pro`)
+
+    Returns:
+        manifest (dict): what's written to manifest.json
+    """
+
+    if format not in ('png', 'npy'):
+        raise ValueError(f"format must be 'png' or 'npy', not {format!r}")
+
+    variable = variable_shortenings(variable)
+    categorical = "grain type" in variable
+
+    window = read_window(xmin, xmax, ymin, ymax)
+
+    pro = read_pro(path, variable, columnar=True, cache=cache, xmin=window[0], xmax=window[1])
+    info = create_grid(pro, variable, xmin, xmax, ymin, ymax, kind, grid_resolution, dtype=np.float32)
+
+    if not len(info['dates']):
+        raise ValueError(f"No timesteps of {path} to export")
+
+    how = 'grain type' if categorical else 'mean'
+
+    levels = pyramid_levels(info['grid'], tile_size, how)
+
+    # Colour limits are fixed over the whole pyramid, so neighbouring tiles and levels match
+
+    coloured, cmap, vmin, vmax = grid_colormap(info['grid'], variable, vmin, vmax, c_scheme)
+    if vmin is None:
+        vmin = float(np.nanmin(coloured))
+    if vmax is None:
+        vmax = float(np.nanmax(coloured))
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    jobs = []
+    manifest_levels = []
+
+    for level, grid in enumerate(levels):
+
+        tiles_y, tiles_x = math.ceil(grid.shape[0] / tile_size), math.ceil(grid.shape[1] / tile_size)
+
+        manifest_levels.append({'level': level,
+                                'rows': grid.shape[0],
+                                'columns': grid.shape[1],
+                                'tiles_y': tiles_y,
+                                'tiles_x': tiles_x,
+                                'cells_per_cell': 2 ** (len(levels) - 1 - level)})
+
+        for row in range(tiles_y):
+            for column in range(tiles_x):
+
+                values = np.full((tile_size, tile_size), np.nan, dtype=np.float32)
+                part = grid[row * tile_size:(row + 1) * tile_size, column * tile_size:(column + 1) * tile_size]
+
+                if np.isnan(part).all():
+                    continue
+
+                values[:part.shape[0], :part.shape[1]] = part
+
+                if format == 'png':
+                    values = grid_colormap(values, variable, vmin, vmax, c_scheme)[0]
+
+                jobs.append((values, os.path.join(out_dir, str(level), str(row), f"{column}.{format}")))
+
+    max_workers = min(max_workers or os.cpu_count() or 1, max(len(jobs), 1))
+
+    if max_workers == 1:
+        for values, tile_path in jobs:
+            write_tile(values, tile_path, format, cmap, vmin, vmax)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(write_tile, values, tile_path, format, cmap, vmin, vmax)
+                       for values, tile_path in jobs]
+            for future in futures:
+                future.result()
+
+    dates = pd.DatetimeIndex(info['dates'])
+
+    with open(os.path.join(out_dir, 'dates.json'), 'w') as f:
+        json.dump([date.isoformat() for date in dates], f)
+
+    manifest = {'variable': variable,
+                'source': os.path.basename(str(path)),
+                'format': format,
+                'tile_size': tile_size,
+                'tiles': '{level}/{row}/{column}.' + format,
+                'tile_count': len(jobs),
+                'levels': manifest_levels,
+                'start': dates[0].isoformat(),
+                'end': dates[-1].isoformat(),
+                'dates': 'dates.json',
+                'min_height': float(info['min_height']),
+                'max_height': float(info['max_height']),
+                'aggregation': how,
+                'colormap': cmap.name,
+                'vmin': vmin,
+                'vmax': vmax}
+
+    if categorical:
+        manifest['labels'] = get_grain_tick_labels()
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return(manifest)
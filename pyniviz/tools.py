@@ -4,9 +4,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from math import floor, ceil
-from scipy import interpolate
-import math
 from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.collections import PolyCollection
+from pyniviz.profiling import stage, file_size
 
 def get_shortenings():
 
@@ -38,9 +38,9 @@ def variable_shortenings(code):
 
     """Handles user input of what variable to plot.
 
-    If the code is a .PRO recognized code, then that same code is returned. Else if it's a pyniviz recognised
-    shortening of the code (e.g. `density`), then the full code is found and returned. Finally if neither of those
-    is the case, an error is raised.
+    If the code is a .PRO recognized variable name, then that same name is returned. Else if it's a pyniviz
+    recognised shortening (e.g. `density`) or a four character .PRO code (e.g. '0533'), then the full name is found
+    and returned. Finally if none of those is the case, an error is raised.
 
     Args:
         code (str): a string code to represent what variable the user is interested in.
@@ -51,347 +51,1619 @@ def variable_shortenings(code):
         """
 
     shortenings = get_shortenings()
+    code_dict = pro_code_dict(return_all=True)
+
+    if code.lower() in list(shortenings.keys()):
+        return(shortenings[code.lower()])
+    elif code in list(shortenings.values()) or code in code_dict.values():
+        return(code)
+    elif code in code_dict:
+        return(code_dict[code])
+    else:
+        raise ValueError(f"Variable '{code}' not recognised, must be a .PRO code or variable name, or one of "
+                         f"{list(zip(shortenings.keys(), shortenings.values()))}")
+
+
+def grain_type_colormap():
+
+    """Returns a matplotlib colormap suitable for grain-type classification plots"""
+
+    colors = [('lime'),  # 1, precipitation particles
+              ('green'),  # 2, Decomposing fragmented PP
+              ('yellow'),  # 3 Rounded Grains (RG)
+              ('orange'),  # 4 Faceted Crystals
+              ('blue'),  # 5 Depth Hoar
+              ('gray'),  # 6 Surface Hoar
+              ('red'),  # 7 Melt FOrms
+              ('cyan'),  # 8 Ice formations
+              ('black'),  # 9 Rounded faceted particles
+              ]
+
+
+    cmap_name = 'grain_type_map'
+
+    my_cmap = LinearSegmentedColormap.from_list(cmap_name, colors, N=9)
+
+    return(my_cmap)
+
+def get_grain_tick_labels():
+
+    """Returns a list of labels for a grain-type classification plot"""
+
+    grain_tick_labels = ['Precipitation particles',
+                         'Decomposing fragmented PP',
+                         'Rounded Grains',
+                         'Faceted Crystals',
+                         'Depth Hoar',
+                         'Surface Hoar',
+                         'Melt Forms',
+                         'Ice',
+                         'Rounded faceted particles']
+
+    return(grain_tick_labels)
+
+##############################################################################################
+
+def vectorized_rounder():
+
+    """Returns a vectorised function that picks out the leading digit of numbers (e.g. 8 from 880)
+
+    Kept for backwards compatibility, this is `grain_type_digits` with part='F1'.
+    """
+
+    def vf(grid):
+        return(grain_type_digits(grid, 'F1'))
+
+    return(vf)
+
+def grain_type_digits(grid, part='F1'):
+
+    """Picks digits out of a grid of Swiss-code grain types (F1F2F3, e.g. 880), all at once.
+
+    F1 is the leading digit of each value and F2 the one after it. NaN and values below 1 (no grain type) give NaN.
+
+    Args:
+        grid (np.array): a grid of grain types
+        part (str): 'F1' (primary grain shape), 'F2' (secondary grain shape) or 'F1F2' (both, e.g. 88)
+
+    Returns:
+        digits (np.array): float array the same shape as grid
+    """
+
+    grid = np.asarray(grid, dtype=np.float64)
+    valid = grid >= 1
+
+    # Power of ten of the leading digit, looked up rather than taken from a log so it's exact
+
+    powers = 10.0 ** np.arange(0, 309)
+    leading_power = powers[np.searchsorted(powers, np.where(valid, grid, 1), side='right') - 1]
+
+    leading = np.floor(grid / leading_power)
+    leading_two = np.floor(grid / leading_power * 10)
+
+    if part == 'F1':
+        digits = leading
+    elif part == 'F2':
+        digits = leading_two % 10
+    elif part == 'F1F2':
+        digits = leading_two
+    else:
+        raise ValueError(f"Grain type part '{part}' not recognised, must be 'F1', 'F2' or 'F1F2'")
+
+    return(np.where(valid, digits, np.nan))
+
+def transform_grid_for_grain_type(grid):
+
+    """Transforms a grid of three-digit grain-types to one suitable for plotting.
+
+    The grid passed in is left untouched. To line the 9 grain classes up with the colormap, plot the result with
+    vmin=0.5 and vmax=9.5 (as `plot_grid` does).
+
+    Args:
+        grid (np.array): a grid of three-digit grain types (Swiss classifiction F1F2F3
+
+    Returns:
+        grid (np.array): a new grid holding the primary grain shape (F1, 1-9) of each cell
+    """
+
+    return(grain_type_digits(grid, 'F1'))
+
+
+def create_grid(spl,
+                 var_to_plot,
+                 xmin=None,
+                 xmax=None,
+                 ymin=None,
+                 ymax=None,
+                 kind='nearest',
+                 grid_resolution=100,
+                 spacing=None,
+                 dtype=np.float64,
+                 time_bins=None,
+                 how=None):
+
+    """Takes the list of dataframes and makes a 2D numpy array of a given variable and some info.
+
+    Args:
+        spl (list or dict): list of dataframes, each frame representing the snowpack at a point in time, or the
+            columnar dictionary returned by `read_pro_columns`
+        var_to_plot: (string): a .PRO recognized string code of the variable to plot. Must be a col in dataframes
+        xmin (datetime.datetime): dt object representing the time from which the list of dataframes should be analysed
+        xmax (datetime.datetime): dt object representing the time to which the list of dataframes should be analysed
+        ymin (float): value in centimeters representing the height from which the .PRO snowpack should be analysed
+        ymax (float): value in centimeters representing the height to which the .PRO snowpack should be analysed
+        kind (str): how the elements are put onto the regular grid: 'nearest' (default) or 'linear' interpolation
+            between element tops, or 'layer' to fill each element's true extent from its bottom to its top
+        grid_resolution (int): number of rows in the grid, 100 by default
+        spacing (float): optional, vertical spacing of the rows in centimeters. Overrides grid_resolution.
+        dtype: optional, data type of the grid, e.g. np.float32 to halve the memory of very fine grids
+        time_bins (int or str): optional, aggregate the timesteps into this many columns of equal duration, or
+            into bins of a pandas frequency such as '6h' or '1D'. By default every timestep gets its own column.
+        how (str): optional, how the timesteps in a bin are combined, see `reduce_time_bins`. Defaults to
+            'grain type' (the most common primary grain shape) for grain type and 'mean' for anything else.
+
+    Returns:
+        return_dict (dict): a dictionary containing both the grid and some other info about its x/y axes
+
+        """
+
+    return(create_grids(spl, [var_to_plot], xmin, xmax, ymin, ymax, kind, grid_resolution, spacing,
+                        dtype, time_bins, how)[var_to_plot])
+
+
+def create_grids(spl,
+                 vars_to_plot,
+                 xmin=None,
+                 xmax=None,
+                 ymin=None,
+                 ymax=None,
+                 kind='nearest',
+                 grid_resolution=100,
+                 spacing=None,
+                 dtype=np.float64,
+                 time_bins=None,
+                 how=None):
+
+    """Like `create_grid`, but for several variables at once.
+
+    The interpolation indices only depend on the element heights, so they are worked out once and used for every
+    variable.
+
+    Args:
+        spl (list or dict): list of dataframes or columnar .PRO data, see `create_grid`
+        vars_to_plot (list): .PRO recognized string codes of the variables to grid
+        xmin, xmax, ymin, ymax, kind, grid_resolution, spacing, dtype, time_bins: see `create_grid`
+        how (str or list): optional, see `create_grid`. A list gives one reducer per variable.
+
+    Returns:
+        grids (dict): keyed by variable, each value a dictionary as returned by `create_grid`
+    """
+
+    height_name = 'height [> 0: top, < 0: bottom of elem.] (cm)'
+
+    needed = [height_name] + list(vars_to_plot) + (['thickness_m'] if kind == 'layer' else [])
+
+    if isinstance(spl, dict):
+        pro = spl
+    else:
+        pro = columns_from_snowpro_list(spl, needed)
+
+    offsets = pro['offsets']
+    heights = pro['columns'][height_name]
+
+    # Find the lowest and the highest heights to calibrate the ylims
+
+    if ymin is not None and ymax is not None:
+        max_height = ymax
+        min_height = ymin
+    else:
+        max_height = np.max(heights[offsets[1:] - 1])
+        min_height = np.min(heights[offsets[:-1]])
+        max_height = round(max_height ,5 ,'up')
+        min_height = round(min_height ,5 ,'down')
+
+    if spacing:
+        grid_resolution = int(np.round((max_height - min_height) / spacing)) + 1
+    vertical_grid = np.linspace(min_height ,max_height ,grid_resolution)
+
+    # Trim the timesteps to fit specified xmin, xmax
+
+    if xmin and xmax:
+
+        in_window = (pro['dates'] > np.datetime64(pd.Timestamp(xmin))) & (pro['dates'] < np.datetime64(pd.Timestamp(xmax)))
+        pro = select_timesteps(pro, np.flatnonzero(in_window), needed)
+
+    offsets = pro['offsets']
+    heights = pro['columns'][height_name]
+    values = np.stack([pro['columns'][var_to_plot] for var_to_plot in vars_to_plot])
+    dates = list(pd.to_datetime(pro['dates']))
+
+    bottoms = column_bottoms(pro) if kind == 'layer' and offsets[-1] else None
+
+    if time_bins:
+
+        if how is None or isinstance(how, str):
+            how = [how] * len(vars_to_plot)
+        how = [h or ('grain type' if "grain type" in var_to_plot else 'mean')
+               for h, var_to_plot in zip(how, vars_to_plot)]
+
+        labels = time_bin_labels(pro['dates'], time_bins)
+        stacked_grids, bin_starts = aggregate_columns(heights, values, offsets, vertical_grid, labels, how, kind,
+                                                      bottoms, dtype)
+        dates = list(pd.to_datetime(pro['dates'][bin_starts]))
+
+    else:
+        stacked_grids = regrid_columns(heights, values, offsets, vertical_grid, kind, bottoms, dtype)
+
+    grids = {}
+
+    for var_to_plot, grid in zip(vars_to_plot, stacked_grids):
+
+        grids[var_to_plot] = {'grid':np.flip(grid, axis=0),
+                              'max_height':max_height,
+                              'min_height':min_height,
+                              'dates':dates}
+
+    return(grids)
+
+
+def column_bottoms(pro):
+
+    """Returns the height of the bottom of each timestep's column: its lowest element's top minus its thickness.
+
+    Args:
+        pro (dict): columnar .PRO data holding heights and 'thickness_m', with at least one element
+
+    Returns:
+        bottoms (np.array): one height (cm) per timestep
+    """
+
+    offsets = pro['offsets']
+    first_element = np.minimum(offsets[:-1], offsets[-1] - 1)
+
+    return(pro['columns']['height [> 0: top, < 0: bottom of elem.] (cm)'][first_element]
+           - 100 * pro['columns']['thickness_m'][first_element])
+
+
+def time_bin_labels(dates, time_bins):
+
+    """Numbers the time bins each timestep falls into, for aggregating a run into fewer columns.
+
+    Args:
+        dates (np.array): ascending datetime64 array
+        time_bins (int or str): the number of bins of equal duration to spread dates over, or a pandas frequency
+            such as '6h' or '1D' (the older upper case hour alias, e.g. '6H', works too)
+
+    Returns:
+        labels (np.array): for each date, the bin it is in. Bins are numbered from 0 in time order, skipping
+            those that hold no dates, so consecutive timesteps have equal or consecutive labels.
+    """
+
+    if len(dates) == 0:
+        return(np.zeros(0, dtype=np.int64))
+
+    if isinstance(time_bins, str):
+
+        try:
+            freq = pd.tseries.frequencies.to_offset(time_bins)
+        except ValueError:
+            freq = pd.tseries.frequencies.to_offset(time_bins[:-1] + 'h' if time_bins.endswith('H') else time_bins)
+
+        labels = pd.Series(np.arange(len(dates)), index=pd.DatetimeIndex(dates)) \
+            .groupby(pd.Grouper(freq=freq)).ngroup().to_numpy()
+
+    else:
+        times = dates.astype('datetime64[ns]').astype(np.int64)
+        edges = np.linspace(times[0], times[-1], int(time_bins) + 1)
+        labels = np.clip(np.searchsorted(edges, times, side='right') - 1, 0, int(time_bins) - 1)
+
+    return(np.unique(labels, return_inverse=True)[1].astype(np.int64))
+
+
+def aggregate_columns(heights, values, offsets, vertical_grid, labels, how, kind='nearest', bottoms=None,
+                      dtype=np.float64, max_cells=2 ** 20):
+
+    """Regrids columns (see `regrid_columns`) and combines those in the same time bin into one column.
+
+    Whole bins are regridded and reduced a few at a time, so the memory used grows with the number of bins rather
+    than the number of timesteps.
+
+    Args:
+        heights, values, offsets, vertical_grid, kind, bottoms, dtype, max_cells: see `regrid_columns`. values
+            must be stacked, of shape (number of variables, len(heights)).
+        labels (np.array): the time bin of each column, as returned by `time_bin_labels`
+        how (list): the reducer for each variable, see `reduce_time_bins`
+
+    Returns:
+        grid (np.array): array of shape (number of variables, len(vertical_grid), number of bins)
+        bin_starts (np.array): index of the first column in each bin
+    """
+
+    n_columns = len(offsets) - 1
+
+    bin_starts = np.flatnonzero(np.diff(labels, prepend=-1))
+    bin_edges = np.append(bin_starts, n_columns)
+    n_bins = len(bin_starts)
+
+    grid = np.full((len(values), len(vertical_grid), n_bins), np.nan, dtype=dtype)
+
+    block = max(1, max_cells // max(len(vertical_grid), 1))
+
+    first_bin = 0
+
+    while first_bin < n_bins:
+
+        first = bin_edges[first_bin]
+        last_bin = max(first_bin + 1, np.searchsorted(bin_edges, first + block, side='right') - 1)
+        last = bin_edges[last_bin]
+
+        start, end = offsets[first], offsets[last]
+
+        columns = regrid_columns(heights[start:end],
+                                 values[:, start:end],
+                                 offsets[first:last + 1] - start,
+                                 vertical_grid,
+                                 kind,
+                                 None if bottoms is None else bottoms[first:last],
+                                 dtype)
+
+        for count, reducer in enumerate(how):
+            grid[count, :, first_bin:last_bin] = reduce_time_bins(columns[count],
+                                                                  bin_starts[first_bin:last_bin] - first,
+                                                                  reducer)
+
+        first_bin = last_bin
+
+    return(grid, bin_starts)
+
+
+def reduce_time_bins(grid, bin_starts, how='mean'):
+
+    """Combines runs of neighbouring grid columns into one column each, ignoring NaN cells.
+
+    Args:
+        grid (np.array): 2D grid, (heights, timesteps)
+        bin_starts (np.array): the first column of each run, ascending and starting at 0
+        how (str): 'mean', 'min', 'max', 'last' (the state at the last timestep of the run), 'mode' (the most
+            common value, ties go to the smallest) or 'grain type' (the most common primary grain shape F1, given as
+            the most common three digit grain type of that shape)
+
+    Returns:
+        reduced (np.array): grid of shape (heights, len(bin_starts)), NaN where a run has no data at that height
+    """
+
+    if how not in ['mean', 'min', 'max', 'last', 'mode', 'grain type']:
+        raise ValueError(f"Reducer '{how}' not recognised, must be 'mean', 'min', 'max', 'last', 'mode' or "
+                         f"'grain type'")
+
+    if how == 'last':
+        return(grid[:, np.append(bin_starts[1:], grid.shape[1]) - 1])
+
+    if how == 'mode':
+        return(mode_of_time_bins(grid, bin_starts))
+
+    if how == 'grain type':
+        return(mode_of_time_bins(grid, bin_starts, grain_type_digits(grid, 'F1')))
+
+    valid = ~np.isnan(grid)
+
+    if how == 'min':
+        reduced = np.fmin.reduceat(grid, bin_starts, axis=1)
+    elif how == 'max':
+        reduced = np.fmax.reduceat(grid, bin_starts, axis=1)
+    else:
+        sums = np.add.reduceat(np.where(valid, grid, 0), bin_starts, axis=1)
+        counts = np.add.reduceat(valid.astype(np.int64), bin_starts, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            reduced = sums / counts
+
+    return(reduced.astype(grid.dtype, copy=False))
+
+
+def mode_of_time_bins(grid, bin_starts, classes=None):
+
+    """The 'mode' and 'grain type' reducers of `reduce_time_bins`, done for all cells at once by sorting (bin,
+    height, class, value).
+
+    Args:
+        grid (np.array): 2D grid, (heights, timesteps)
+        bin_starts (np.array): the first column of each run, ascending and starting at 0
+        classes (np.array): optional, a class for each cell of grid, e.g. the primary grain shape of each grain
+            type. The most common class of each run wins, and the most common value of that class is returned.
+            By default every value is its own class.
+
+    Returns:
+        reduced (np.array): grid of shape (heights, len(bin_starts)), NaN where a run has no data at that height
+    """
+
+    n_rows, n_columns = grid.shape
+    n_bins = len(bin_starts)
+
+    bins = np.repeat(np.arange(n_bins), np.diff(np.append(bin_starts, n_columns)))
+
+    rows, columns = np.nonzero(~np.isnan(grid))
+    cell_values = grid[rows, columns]
+    cell_classes = cell_values if classes is None else classes[rows, columns]
+    cells = bins[columns] * n_rows + rows
+
+    order = np.lexsort((cell_values, cell_classes, cells))
+    cells, cell_classes, cell_values = cells[order], cell_classes[order], cell_values[order]
+
+    # Runs of equal classes and of equal values within a cell, then the value run of each cell with the longest
+    # class run and, within that class, the longest value run. Ties go to the smallest class and value.
+
+    new_cell = np.diff(cells, prepend=-1) != 0
+    class_starts = np.flatnonzero(new_cell | (np.diff(cell_classes, prepend=np.nan) != 0))
+    class_lengths = np.diff(np.append(class_starts, len(cells)))
+
+    run_starts = np.flatnonzero(new_cell | (np.diff(cell_classes, prepend=np.nan) != 0)
+                                | (np.diff(cell_values, prepend=np.nan) != 0))
+    run_lengths = np.diff(np.append(run_starts, len(cells)))
+    run_class_lengths = class_lengths[np.searchsorted(class_starts, run_starts, side='right') - 1]
+    run_cells, run_classes, run_values = cells[run_starts], cell_classes[run_starts], cell_values[run_starts]
+
+    longest = np.lexsort((-run_lengths, run_classes, -run_class_lengths, run_cells))
+    longest = longest[np.diff(run_cells[longest], prepend=-1) != 0]
+
+    reduced = np.full(n_bins * n_rows, np.nan, dtype=grid.dtype)
+    reduced[run_cells[longest]] = run_values[longest]
+
+    return(reduced.reshape(n_bins, n_rows).T)
+
+
+def align_grid(information, dates, method='nearest', tolerance=None):
+
+    """Lays a grid out on another time axis, e.g. to difference two runs that were output at different times.
+
+    Every target date is matched to the grid's columns with one searchsorted, like a pandas merge_asof.
+
+    Args:
+        information (dict): as returned by `create_grid`
+        dates (list or np.array): the target time axis, ascending
+        method (str): optional, how target dates are matched to columns:
+            'nearest' (default): the closest column, for dates within the grid's time span (or, given a
+                tolerance, within tolerance of a column)
+            'asof': the last column at or before the date
+            'interpolate': linear interpolation in time between the columns either side of the date
+            'exact': only a column at exactly the same time
+        tolerance (datetime.timedelta): optional, the furthest a column used for a date may be from it. For
+            'interpolate', the widest gap between two columns that will be interpolated across.
+
+    Returns:
+        grid (np.array): array of shape (rows, len(dates)), NaN where a date had no match
+        matched (np.array): boolean array, False for the dates that had no counterpart in the grid
+    """
+
+    if method not in ['nearest', 'asof', 'interpolate', 'exact']:
+        raise ValueError(f"Alignment method '{method}' not recognised, must be 'nearest', 'asof', 'interpolate' "
+                         f"or 'exact'")
+
+    source = np.array(information['dates'], dtype='datetime64[ns]')
+    target = np.array(dates, dtype='datetime64[ns]')
+    grid = information['grid']
+
+    aligned = np.full((grid.shape[0], len(target)), np.nan, dtype=grid.dtype)
+
+    if len(source) == 0 or len(target) == 0:
+        return(aligned, np.zeros(len(target), dtype=bool))
+
+    if np.array_equal(source, target):
+        return(grid, np.ones(len(target), dtype=bool))
+
+    last = len(source) - 1
+    before = np.clip(np.searchsorted(source, target, side='right') - 1, 0, last)
+    after = np.minimum(before + 1, last)
+    inside = (target >= source[0]) & (target <= source[-1])
+
+    if method == 'interpolate':
+
+        span = (source[after] - source[before]).astype(np.int64)
+        weight = np.divide((target - source[before]).astype(np.int64), span,
+                           out=np.zeros(len(target)), where=span > 0)
+
+        matched = inside if tolerance is None else inside & (span <= pd.Timedelta(tolerance).value)
+
+        aligned[:, matched] = (grid[:, before[matched]] * (1 - weight[matched])
+                               + grid[:, after[matched]] * weight[matched])
+
+        return(aligned, matched)
+
+    if method == 'nearest':
+        closer_after = (source[after] - target) < (target - source[before])
+        position = np.where(closer_after, after, before)
+        matched = inside
+    elif method == 'asof':
+        position = before
+        matched = target >= source[0]
+    else:
+        position = before
+        matched = source[before] == target
+
+    if tolerance is not None:
+        within = np.abs(target - source[position]) <= np.timedelta64(pd.Timedelta(tolerance))
+        matched = within if method == 'nearest' else matched & within
+
+    aligned[:, matched] = grid[:, position[matched]]
+
+    return(aligned, matched)
+
+
+def difference_grids(information, other, method='nearest', tolerance=None):
+
+    """Subtracts one run's grid from another's, after putting the second on the first one's time axis.
+
+    Args:
+        information (dict): as returned by `create_grid`, the run that is subtracted from
+        other (dict): as returned by `create_grid`, the run that is subtracted. Must share the vertical grid.
+        method (str): optional, how the time axes are matched, see `align_grid`
+        tolerance (datetime.timedelta): optional, see `align_grid`
+
+    Returns:
+        difference (dict): like `create_grid` returns, plus 'unmatched', the dates of the columns that had no
+            counterpart in other (these columns are NaN)
+    """
+
+    if information['grid'].shape[0] != other['grid'].shape[0] or \
+            (information['min_height'], information['max_height']) != (other['min_height'], other['max_height']):
+        raise ValueError("The grids don't share a vertical grid, give both the same ymin, ymax and resolution")
+
+    aligned, matched = align_grid(other, information['dates'], method, tolerance)
+
+    difference = dict(information)
+    difference['grid'] = information['grid'] - aligned
+    difference['unmatched'] = [date for date, found in zip(information['dates'], matched) if not found]
+
+    return(difference)
+
+
+def read_window(xmin=None, xmax=None, ymin=None, ymax=None):
+
+    """Returns the time window to pass to `read_pro` for a plot or grid with the given limits.
+
+    Only with fixed y limits can reading stop at the time window: otherwise the limits `create_grid` finds are
+    taken from the whole run, so all of it is read.
+
+    Args:
+        xmin, xmax, ymin, ymax: the limits of the plot or grid, see `create_grid`
+
+    Returns:
+        (xmin, xmax), or (None, None) if either y limit isn't given
+    """
+
+    if ymin is not None and ymax is not None:
+        return(xmin, xmax)
+
+    return(None, None)
+
+
+def in_time_window(dates, xmin=None, xmax=None):
+
+    """Returns a boolean array marking which dates fall in [xmin, xmax] (either end can be left open with None).
+
+    Args:
+        dates (np.array): datetime64 array
+        xmin (datetime.datetime): Optional, the start of the window
+        xmax (datetime.datetime): Optional, the end of the window
+    """
+
+    mask = np.ones(len(dates), dtype=bool)
+
+    if xmin:
+        mask &= dates >= np.datetime64(pd.Timestamp(xmin))
+    if xmax:
+        mask &= dates <= np.datetime64(pd.Timestamp(xmax))
+
+    return(mask)
+
+
+def select_timesteps(pro, steps, varnames=None):
+
+    """Picks some timesteps out of columnar .PRO data.
+
+    Args:
+        pro (dict): columnar .PRO data as returned by `read_pro_columns`
+        steps (np.array): indices of the timesteps to keep, in the order they should appear
+        varnames (list): Optional, the columns to keep. Defaults to all of them.
+
+    Returns:
+        pro (dict): new columnar data holding only those timesteps
+    """
+
+    steps = np.asarray(steps, dtype=np.int64)
+    offsets = pro['offsets']
+
+    starts = offsets[steps]
+    lengths = offsets[steps + 1] - starts
+    new_offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+
+    take = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+
+    if varnames is None:
+        varnames = pro['columns'].keys()
+
+    selected = {'dates': pro['dates'][steps],
+                'offsets': new_offsets,
+                'columns': {varname: pro['columns'][varname][take] for varname in varnames}}
+
+    return(selected)
+
+
+def regrid_columns(heights, values, offsets, vertical_grid, kind='nearest', bottoms=None, dtype=np.float64,
+                   max_cells=2 ** 20):
+
+    """Interpolates every snowpack column onto a common vertical grid at once.
+
+    The columns are stored back to back (see `read_pro_columns`), column i being heights[offsets[i]:offsets[i+1]].
+    The results match scipy's interp1d (with bounds_error=False and NaN fill) applied column by column, but no
+    interpolator is built: the interpolation indices of every column are found with one searchsorted.
+
+    With kind='layer' each grid cell instead takes the value of the element whose true extent, from its bottom to
+    its top, contains it, so thin layers are never shifted or merged with their neighbours.
+
+    The columns are worked through in blocks of about max_cells grid cells, so that the working arrays stay small
+    next to the grid itself however fine the vertical grid is.
+
+    Args:
+        heights (np.array): element heights of all columns, ascending within each column
+        values (np.array): the variable at those heights. Several variables can be regridded together by stacking
+            them into an array of shape (number of variables, len(heights)).
+        offsets (np.array): start of each column in heights/values, plus the total length as a final entry
+        vertical_grid (np.array): ascending heights to interpolate onto
+        kind (str): 'nearest', 'linear' or 'layer'
+        bottoms (np.array): the height of the bottom of each column, needed for kind='layer'
+        dtype: optional, the data type of the grid, e.g. np.float32 to halve its memory
+        max_cells (int): optional, roughly how many grid cells to work on at a time
+
+    Returns:
+        grid (np.array): array of shape (len(vertical_grid), number of columns), NaN outside each column. Stacked
+            values give shape (number of variables, len(vertical_grid), number of columns).
+    """
+
+    if kind not in ['nearest', 'linear', 'layer']:
+        raise ValueError(f"Interpolation kind '{kind}' not recognised, must be 'nearest', 'linear' or 'layer'")
+
+    if kind == 'layer' and bottoms is None:
+        raise ValueError("The bottom height of each column is needed to regrid with kind='layer'")
+
+    n_columns = len(offsets) - 1
+    grid = np.full(np.shape(values)[:-1] + (len(vertical_grid), n_columns), np.nan, dtype=dtype)
+
+    if n_columns == 0 or offsets[-1] == 0:
+        return(grid)
+
+    block = max(1, max_cells // max(len(vertical_grid), 1))
+
+    for first in range(0, n_columns, block):
+
+        last = min(first + block, n_columns)
+        start, end = offsets[first], offsets[last]
+
+        grid[..., first:last] = regrid_column_block(heights[start:end],
+                                                    values[..., start:end],
+                                                    offsets[first:last + 1] - start,
+                                                    vertical_grid,
+                                                    kind,
+                                                    None if bottoms is None else bottoms[first:last])
+
+    return(grid)
+
+
+def regrid_column_block(heights, values, offsets, vertical_grid, kind, bottoms):
+
+    """Does the work of `regrid_columns` for one block of columns, see there for the arguments.
+
+    Returns:
+        grid (np.array): array of shape (..., len(vertical_grid), number of columns)
+    """
+
+    n_columns = len(offsets) - 1
+    lengths = np.diff(offsets)
+
+    if offsets[-1] == 0:
+        return(np.full(np.shape(values)[:-1] + (len(vertical_grid), n_columns), np.nan))
+
+    column_of = np.repeat(np.arange(n_columns), lengths)
+    same_column = column_of[1:] == column_of[:-1]
+    first_element = np.minimum(offsets[:-1], offsets[-1] - 1)
+    last_element = np.maximum(offsets[1:] - 1, 0)
+
+    if kind == 'nearest':
+
+        # Halfway points between neighbouring elements, computed exactly as interp1d does
+
+        halves = heights / 2.0
+        bounds = (halves[1:] + halves[:-1])[same_column]
+        index = count_below(bounds, column_of[1:][same_column], vertical_grid, n_columns)
+
+        regridded = values[..., np.minimum(first_element[:, None] + index, len(heights) - 1)]
+
+        bottom = heights[first_element][:, None]
+
+    elif kind == 'linear':
+
+        index = count_below(heights, column_of, vertical_grid, n_columns)
+        hi = np.minimum(np.maximum(index, 1), (lengths - 1)[:, None])
+        lo = np.maximum(hi - 1, 0)
+        hi, lo = hi + offsets[:-1, None], lo + offsets[:-1, None]
+        hi, lo = np.minimum(hi, len(heights) - 1), np.minimum(lo, len(heights) - 1)
+
+        x_lo, x_hi = heights[lo], heights[hi]
+        y_lo, y_hi = values[..., lo], values[..., hi]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (y_hi - y_lo) / (x_hi - x_lo)
+            regridded = np.where(x_hi == x_lo, y_lo, slope * (vertical_grid - x_lo) + y_lo)
+
+        bottom = heights[first_element][:, None]
+
+    else:
+
+        # Heights are element tops, so the element holding a cell is the first one whose top isn't below it
+
+        index = count_below(heights, column_of, vertical_grid, n_columns)
+        index = np.minimum(index, np.maximum(lengths - 1, 0)[:, None])
+
+        regridded = values[..., np.minimum(offsets[:-1, None] + index, len(heights) - 1)]
+
+        bottom = np.asarray(bottoms)[:, None]
+
+    top = heights[last_element][:, None]
+    outside = (vertical_grid < bottom) | (vertical_grid > top) | (lengths == 0)[:, None]
+
+    regridded[..., outside] = np.nan
+
+    return(np.swapaxes(regridded, -1, -2))
+
+
+def count_below(points, point_columns, vertical_grid, n_columns):
+
+    """For every column and every height in vertical_grid, counts the points of that column strictly below it.
+
+    This is what searchsorted(points_of_column, vertical_grid, side='left') gives column by column, but done for
+    all columns with a single searchsorted of the points into the (shared) vertical grid.
+
+    Args:
+        points (np.array): heights, ascending within each column
+        point_columns (np.array): the column each point belongs to
+        vertical_grid (np.array): ascending heights
+        n_columns (int): number of columns
+
+    Returns:
+        counts (np.array): int array of shape (n_columns, len(vertical_grid))
+    """
+
+    n_grid = len(vertical_grid)
+
+    first_above = np.searchsorted(vertical_grid, points, side='right')
+
+    counts = np.bincount(point_columns * (n_grid + 1) + first_above,
+                         minlength=n_columns * (n_grid + 1)).reshape(n_columns, n_grid + 1)
+
+    return(np.cumsum(counts, axis=1)[:, :n_grid])
+
+
+def columns_from_snowpro_list(spl, varnames):
+
+    """Packs some columns of a list of dataframes (as returned by `read_pro`) into the columnar layout of
+    `read_pro_columns`, so that they can be handled by the same code.
+
+    Args:
+        spl (list): list of dataframes (or `SnowProfile` objects), each representing the snowpack at a point in time
+        varnames (list): the columns to pack
+
+    Returns:
+        pro (dict): columnar data with 'dates', 'offsets' and 'columns' keys.
+    """
+
+    lengths = [len(df) for df in spl]
+
+    dates = [df.date if isinstance(df, SnowProfile) else df['dates'].iloc[0] for df in spl]
+
+    pro = {'dates': np.array(dates, dtype='datetime64[ns]'),
+           'offsets': np.concatenate(([0], np.cumsum(lengths))).astype(np.int64),
+           'columns': {varname: np.concatenate([np.asarray(df[varname], dtype=np.float64) for df in spl])
+                       for varname in varnames}}
+
+    return(pro)
+
+def plot_grid(information,
+                 var_to_plot,
+                 vmin,
+                 vmax,
+                 xmin,
+                 xmax,
+                 ymin,
+                 ymax,
+                 file_name,
+                 c_scheme,
+                 yax_shift,
+                 subplot,
+                 dpi=500,
+                 show=True):
+
+    """Plots a 2D numpy array for some snowpack variable (y axis height, x axis time).
+
+    Args:
+        information (dict): includes the grid to plot and some information about the x/y axes
+        var_to_plot (str): variable to plot, gets used to name the colorbar
+        vmin (float): min value for the colorbar
+        vmax (float): max value for the colorbar
+        xmin (datetime.datetime): represents time from which data appears on the grid
+        xmax (datetime.datetime): represents time to which data appears on the grid
+        ymin (float): represents min height to which data appears on the grid
+        ymax (float): represents max height to which data appears on the grid
+        file_name: if present represents where the image should be saved
+        c_scheme: represents the scheme of the colorbar e.g. 'plasma', 'Blues'.
+        yax_shift: shifts the y axis ticks down a bit (useful if shifted to a ref value , e.g. 400cm)
+        subplot (matplotlib axes): axes to draw onto. If None a new figure is made, given a colorbar, saved to
+            file_name and shown.
+        dpi (int): optional, resolution file_name is saved at
+        show (bool): optional, if False the new figure isn't shown but closed once saved, for scripts and servers
+            (see also `render.render_grid`, which never touches pyplot)
+
+    Returns:
+        Nothing, put in a PR if you want it to!
+
+    """
+
+    grid = information['grid']
+    dates = information['dates']
+
+    # Make the plot
+
+    if subplot:
+        ax = subplot
+    else:
+        fig, ax = plt.subplots(1 ,1 ,figsize=(10 ,6))
+
+    # Specify the colormap
+
+    grid, my_cmap, vmin, vmax = grid_colormap(grid, var_to_plot, vmin, vmax, c_scheme)
+
+
+    # Set the limits of the plot
+
+    x_lims = mdates.date2num([dates[0] ,dates[-1]])
+    if xmin and xmax:
+        x_lims_specified = mdates.date2num([xmin, xmax])
+        # for spec in x_lims_specified:
+        #     assert (x_lims[0] < spec < x_lims[1])
+        x_lims = x_lims_specified
+
+    if ymin is not None and ymax is not None:
+        information['min_height'] = ymin
+        information['max_height'] = ymax
+
+    extent = [x_lims[0],
+              x_lims[1] ,
+              information['min_height'] - yax_shift,
+              information['max_height'] - yax_shift]
+
+    ax.xaxis_date()
+    date_format = mdates.DateFormatter('%m/%d')
+    ax.xaxis.set_major_formatter(date_format)
+
+    #######################
+
+    im = ax.imshow(grid,
+                   extent= extent,
+                   aspect='auto',
+                   vmin=vmin ,vmax=vmax,
+                   cmap=my_cmap)
+
+
+    ax.tick_params(right=True)
+
+    ax.set_ylabel('Height (cm)', fontsize='x-large')
+
+    if subplot:
+        return ax
+    else:
+
+        grid_colorbar(fig, ax, var_to_plot)
+
+        if file_name:
+            with stage('savefig', path=file_name, dpi=dpi) as record:
+                fig.savefig(file_name ,dpi=dpi, bbox_inches='tight')
+                record['bytes'] = file_size(file_name)
+
+        if show:
+            with stage('show'):
+                plt.show()
+        else:
+            plt.close(fig)
+
+        return 0
+
+
+def grid_colormap(grid, var_to_plot, vmin, vmax, c_scheme):
+
+    """Picks the colormap and colour limits a variable is plotted with, as `plot_grid` and `plot_mesh` do.
+
+    Grain types are drawn with `grain_type_colormap`, one colour per primary grain shape, so the three-digit codes
+    are turned into that shape first. Anything else uses c_scheme.
+
+    Args:
+        grid (np.array): values to plot
+        var_to_plot (str): the variable plotted
+        vmin (float): min value for the colorbar, or None
+        vmax (float): max value for the colorbar, or None
+        c_scheme (str): name of a matplotlib colormap, e.g. 'plasma'
+
+    Returns:
+        grid (np.array): the values to colour, grid itself unless it holds grain types
+        cmap (matplotlib colormap)
+        vmin, vmax (float): the colour limits, still None if they're left for matplotlib to pick
+    """
+
+    if "grain type" in var_to_plot:
+        cmap = grain_type_colormap()
+        grid = transform_grid_for_grain_type(grid)
+        if vmin is None and vmax is None:
+            vmin, vmax = 0.5, 9.5
+    else:
+        cmap = plt.get_cmap(c_scheme)
+
+    return(grid, cmap, vmin, vmax)
+
+
+def grid_colorbar(fig, ax, var_to_plot, room_from=None):
+
+    """Adds the colorbar that `plot_grid` (or `plot_mesh`) draws next to a standalone plot.
+
+    Args:
+        fig (matplotlib figure): the figure the plot is in
+        ax (matplotlib axes): axes that `plot_grid` or `plot_mesh` has drawn onto
+        var_to_plot (str): the variable plotted, used to label the colorbar
+        room_from (list): optional, axes to shrink to make room for the colorbar, e.g. all the axes of a column
+            sharing a time axis so they stay lined up. Defaults to ax.
+
+    Returns:
+        cbar (matplotlib colorbar)
+    """
+
+    cbar = fig.colorbar(plotted_mappable(ax), ax=ax if room_from is None else room_from, pad=0.075)
+
+    if "grain type" in var_to_plot:
+        cbar.set_ticks(np.arange(1, 10))
+        cbar.set_ticklabels(get_grain_tick_labels())
+    else:
+        cbar.set_label(var_to_plot, fontsize='x-large')
+
+    return(cbar)
+
+
+def plotted_mappable(ax):
+
+    """Returns what was last drawn onto axes by `plot_grid` (an image) or `plot_mesh` (a collection)."""
+
+    return(ax.images[-1] if ax.images else ax.collections[-1])
+
+
+def mesh_from_columns(pro, var_to_plot, yax_shift=0):
+
+    """Builds one quadrilateral per SNOWPACK element, straight from columnar .PRO data, without any regridding.
+
+    Each element spans from its bottom to its top height. The bottom of an element is the top of the one below it,
+    and for the lowest element of a timestep its top minus its thickness. In time, each timestep spans from halfway
+    to the previous timestep to halfway to the next, so irregular output intervals are drawn to their true width.
+
+    Args:
+        pro (dict): columnar .PRO data, see `read_pro_columns`. Must hold var_to_plot and 'thickness_m'.
+        var_to_plot (str): the variable to colour the elements by
+        yax_shift (float): optional, subtracted from all the heights
+
+    Returns:
+        vertices (np.array): (n_elements, 4, 2) corners of each quad, x in matplotlib date numbers, y in cm
+        values (np.array): the value of var_to_plot in each element
+    """
+
+    height_name = 'height [> 0: top, < 0: bottom of elem.] (cm)'
+
+    offsets = pro['offsets']
+    tops = pro['columns'][height_name] - yax_shift
+    lengths = np.diff(offsets)
+
+    bottoms = np.empty_like(tops)
+    bottoms[1:] = tops[:-1]
+    first_element = offsets[:-1][lengths > 0]
+    bottoms[first_element] = tops[first_element] - 100 * pro['columns']['thickness_m'][first_element]
+
+    # Timestep edges halfway between neighbouring dates, the outer ones mirrored (an hour wide if there's only one)
+
+    times = mdates.date2num(pro['dates'])
+
+    if len(times) > 1:
+        halfway = (times[1:] + times[:-1]) / 2
+        edges = np.concatenate(([2 * times[0] - halfway[0]], halfway, [2 * times[-1] - halfway[-1]]))
+    else:
+        edges = np.concatenate((times - 1 / 48, times + 1 / 48))
+
+    left = np.repeat(edges[:-1], lengths)
+    right = np.repeat(edges[1:], lengths)
+
+    vertices = np.empty((offsets[-1], 4, 2))
+    vertices[:, :, 0] = np.stack((left, right, right, left), axis=1)
+    vertices[:, :, 1] = np.stack((bottoms, bottoms, tops, tops), axis=1)
+
+    return(vertices, pro['columns'][var_to_plot])
+
+
+def plot_mesh(pro,
+              var_to_plot,
+              vmin,
+              vmax,
+              xmin,
+              xmax,
+              ymin,
+              ymax,
+              file_name,
+              c_scheme,
+              yax_shift,
+              subplot,
+              dpi=500,
+              show=True):
+
+    """Plots some snowpack variable element by element (y axis height, x axis time), as one PolyCollection.
+
+    Unlike `plot_grid` nothing is resampled: layer boundaries are drawn where SNOWPACK puts them and each timestep
+    is as wide as its share of the time axis. Takes the same arguments as `plot_grid`, except for the first.
+
+    Args:
+        pro (dict or list): columnar .PRO data (see `read_pro_columns`), or a list of dataframes or `SnowProfile`
+            objects as returned by `read_pro`
+        var_to_plot (str): variable to plot, gets used to name the colorbar
+        vmin, vmax, xmin, xmax, ymin, ymax, file_name, c_scheme, yax_shift, subplot, dpi, show: see `plot_grid`
+
+    Returns:
+        the axes drawn onto if subplot was given, otherwise 0
+    """
+
+    height_name = 'height [> 0: top, < 0: bottom of elem.] (cm)'
+
+    if not isinstance(pro, dict):
+        pro = columns_from_snowpro_list(pro, [height_name, var_to_plot, 'thickness_m'])
+
+    offsets = pro['offsets']
+    heights = pro['columns'][height_name]
+
+    # Same y limits as `create_grid` would use, taken from the whole run
+
+    if ymin is not None and ymax is not None:
+        min_height, max_height = ymin, ymax
+    else:
+        max_height = round(np.max(heights[offsets[1:] - 1]) ,5 ,'up')
+        min_height = round(np.min(heights[offsets[:-1]]) ,5 ,'down')
+
+    if xmin or xmax:
+        pro = select_timesteps(pro, np.flatnonzero(in_time_window(pro['dates'], xmin, xmax)),
+                               [height_name, var_to_plot, 'thickness_m'])
+
+    vertices, values = mesh_from_columns(pro, var_to_plot, yax_shift)
+
+    if subplot:
+        ax = subplot
+    else:
+        fig, ax = plt.subplots(1 ,1 ,figsize=(10 ,6))
+
+    values, my_cmap, vmin, vmax = grid_colormap(values, var_to_plot, vmin, vmax, c_scheme)
+
+    mesh = PolyCollection(vertices,
+                          array=np.ma.masked_invalid(values),
+                          cmap=my_cmap,
+                          edgecolors='none',
+                          antialiaseds=False)
+    mesh.set_clim(vmin, vmax)
 
-    if code.lower() in list(shortenings.keys()):
-        return(shortenings[code])
-    elif code in list(shortenings.values()):
-        return(code)
+    ax.add_collection(mesh)
+
+    if xmin and xmax:
+        ax.set_xlim(mdates.date2num([xmin, xmax]))
+    elif len(vertices):
+        ax.set_xlim(vertices[0, 0, 0], vertices[-1, 1, 0])
+    ax.set_ylim(min_height - yax_shift, max_height - yax_shift)
+
+    ax.xaxis_date()
+    date_format = mdates.DateFormatter('%m/%d')
+    ax.xaxis.set_major_formatter(date_format)
+
+    ax.tick_params(right=True)
+
+    ax.set_ylabel('Height (cm)', fontsize='x-large')
+
+    if subplot:
+        return ax
     else:
-        raise ValueError(f"Variable '{code}' not recognised, must be from {list(zip(shortenings.keys(), shortenings.values()))}")
 
+        grid_colorbar(fig, ax, var_to_plot)
 
-def grain_type_colormap():
+        if file_name:
+            with stage('savefig', path=file_name, dpi=dpi) as record:
+                fig.savefig(file_name ,dpi=dpi, bbox_inches='tight')
+                record['bytes'] = file_size(file_name)
 
-    """Returns a matplotlib colormap suitable for grain-type classification plots"""
+        if show:
+            with stage('show'):
+                plt.show()
+        else:
+            plt.close(fig)
 
-    colors = [('lime'),  # 1, precipitation particles
-              ('green'),  # 2, Decomposing fragmented PP
-              ('yellow'),  # 3 Rounded Grains (RG)
-              ('orange'),  # 4 Faceted Crystals
-              ('blue'),  # 5 Depth Hoar
-              ('gray'),  # 6 Surface Hoar
-              ('red'),  # 7 Melt FOrms
-              ('cyan'),  # 8 Ice formations
-              ('black'),  # 9 Rounded faceted particles
-              ]
+        return 0
 
 
-    cmap_name = 'grain_type_map'
+def round(num, divisor, direction):
 
-    my_cmap = LinearSegmentedColormap.from_list(cmap_name, colors, N=9)
+    """Rounds a number to the nearest, user-specified value.
 
-    return(my_cmap)
+    Args:
+        num (float): the number to be rounded.
+        divisor (int): the number to be rounded to, e.g. 5 for rounding to nearest 5.
+        direction (str): 'up' or 'down' specifiying whether the number should be rounded up or down.
 
-def get_grain_tick_labels():
+    Returns:
+        The rounded number.
+    """
 
-    """Returns a list of labels for a grain-type classification plot"""
+    if direction.lower() == 'down':
+        return floor(num / divisor) * divisor
+    elif direction.lower() == 'up':
+        return ceil(num / divisor) * divisor
 
-    grain_tick_labels = ['Precipitation particles',
-                         'Decomposing fragmented PP',
-                         'Rounded Grains',
-                         'Faceted Crystals',
-                         'Depth Hoar',
-                         'Surface Hoar',
-                         'Melt Forms',
-                         'Ice',
-                         'Rounded faceted particles']
+def read_pro(path,var_to_plot= None, columnar=False, cache=None, xmin=None, xmax=None, profiles=False, lazy=False,
+             cache_max_bytes=2 ** 30):
 
-    return(grain_tick_labels)
+    """ Reads a .PRO file and returns a list of dataframes representing the evolving state of the snowpack.
 
-##############################################################################################
+    The file is parsed in a single pass by `read_pro_columns`. The list of dataframes is built from that columnar
+    data, so if you don't need dataframes set columnar=True and skip that cost entirely.
 
-def vectorized_rounder():
+    Args:
+        path (str): String pointing to the location of the .PRO file to be read, or of a Parquet file written by
+            `pyniviz.export.export_parquet`
+        var_to_plot: Optional, use this if you're only interested in one variable (or a list of a few).
+        columnar (bool): Optional, if True return the columnar dictionary from `read_pro_columns` instead.
+        cache (bool or str): Optional, if True the parsed data is cached on disk (see `pyniviz.cache`) and reused
+            until the file changes. A string is taken as the cache directory to use.
+        xmin (datetime.datetime): Optional, only read timesteps from this time on
+        xmax (datetime.datetime): Optional, only read timesteps up to this time; the rest of the file is not read
+        profiles (bool): Optional, if True return a list of `SnowProfile` objects, which take up a fraction of the
+            memory of the dataframes but can be indexed by column name in the same way.
+        lazy (bool): Optional, if True only the lines of the variables in var_to_plot (just the heights if None) are
+            parsed, using a byte-offset index of the file (see `pyniviz.index`). Any other variable is parsed the
+            first time it's looked up in the columnar data or in a `SnowProfile`. Dataframes only hold what's loaded.
+            Can't be combined with cache, the index already makes reading a variable cheap.
+        cache_max_bytes (int): Optional, the size the cache directory is trimmed to when cache is used. Defaults to
+            1 GiB.
 
-    """Returns a vectorised function that rounds numbers to the nearest integer
+    Returns:
+        list of dataframes (one per timestep), or the columnar dictionary if columnar=True.
 
-    TODO: Improve the expressiveness of these variable names and comment code
     """
 
-    def f(num):
-        if np.isnan(num):
-            return np.nan
+    if lazy and cache:
+        raise ValueError("lazy and cache can't be used together: lazy reads go through the file's index, not the "
+                         "cache")
+
+    with stage('read_pro', path=str(path), file_bytes=file_size(path)) as record:
+
+        if lazy:
+            from pyniviz.index import read_pro_lazy
+            pro = read_pro_lazy(path, var_to_plot, xmin, xmax)
+        elif str(path).endswith('.parquet'):
+            from pyniviz.export import read_parquet_pro
+            pro = read_parquet_pro(path, var_to_plot, xmin, xmax)
+        elif cache:
+            from pyniviz.cache import read_pro_cached
+            cache_dir = cache if isinstance(cache, str) else None
+            pro = read_pro_cached(path, pro_var_codes(var_to_plot), cache_dir, cache_max_bytes)
+            if xmin or xmax:
+                pro = select_timesteps(pro, np.flatnonzero(in_time_window(pro['dates'], xmin, xmax)))
         else:
-            return num // 10 ** (int(math.log(num, 10)))
+            pro = read_pro_columns(path, pro_var_codes(var_to_plot), xmin, xmax)
 
-    vf = np.vectorize(f)
+        # Estimated from what came out rather than counted: one date line per timestep, plus a line per timestep
+        # for each variable (heights and thickness count once)
 
-    return(vf)
+        record.update(timesteps=len(pro['dates']),
+                      elements=int(pro['offsets'][-1]),
+                      lines_estimate=len(pro['dates']) * len(pro['columns']))
 
-def transform_grid_for_grain_type(grid):
+    if columnar:
+        return(pro)
 
-    """Transforms a grid of three-digit grain-types to one suitable for plotting.
+    with stage('dataframes' if not profiles else 'profiles', timesteps=len(pro['dates'])):
+
+        if profiles:
+            return(profiles_from_columns(pro))
+
+        return(snowpro_list_from_columns(pro))
+
+
+def pro_var_codes(var_to_plot=None):
+
+    """Returns the list of .PRO codes that need to be read to look at a variable.
 
     Args:
-        grid (np.array): a grid of three-digit grain types (Swiss classifiction F1F2F3
+        var_to_plot (str or list): Optional, a .PRO recognized variable name, pyniviz shortening or four character
+            .PRO code (e.g. '0533'), or a list of them. If None, the default set of codes is returned.
 
     Returns:
-        grid (np.array): a processed grid where all plotting values are 0-1 and rounded to nearest .1
+        var_codes (list): four character string codes, always starting with date ('0500') and height ('0501').
     """
 
-    vf = vectorized_rounder()
+    if not var_to_plot:
+        return(['0500', '0501', '0502', '0503', '0506', '0508',
+                '0509', '0511', '0512', '0513', '0515',
+                '0516', '0521', '0535', '0540', '0541'])
 
-    grid = vf(grid)
-    grid = grid / 10
-    grid[0, 0] = 0.05
-    grid[0, 1] = 0.95
-    return(grid)
+    if isinstance(var_to_plot, str):
+        var_to_plot = [var_to_plot]
 
+    shortenings = get_shortenings()
+    code_dict = pro_code_dict(return_all=True)
+    inverse = {value: key for key, value in code_dict.items()}
+
+    var_codes = ['0500','0501']
+    for variable in var_to_plot:
+        variable = shortenings.get(variable.lower(), variable)
+        if variable == 'thickness_m':
+            continue
+        if variable in code_dict:
+            code = variable
+        elif variable in inverse:
+            code = inverse[variable]
+        else:
+            raise ValueError(f"'{variable}' is not a .PRO variable, code or pyniviz shortening")
+        if code not in var_codes:
+            var_codes.append(code)
 
-def create_grid(spl,
-                 var_to_plot,
-                 xmin=None,
-                 xmax=None,
-                 ymin=None,
-                 ymax=None):
+    return(var_codes)
 
-    """Takes the list of dataframes and makes a 2D numpy array of a given variable and some info.
+
+def read_pro_columns(path, var_codes=None, xmin=None, xmax=None):
+
+    """Reads a .PRO file in one streaming pass and returns its contents as flat, columnar numpy arrays.
+
+    Every variable is stored as one contiguous float64 array holding the elements of all timesteps back to back.
+    The elements of timestep i are values[offsets[i]:offsets[i+1]]. The placeholder entry that the .PRO format puts
+    below the lowest element is dropped, so every variable lines up with the element tops in the height column and
+    with the 'thickness_m' column derived from them.
 
     Args:
-        spl (list): list of dataframes, each frame representing the snowpack at a point in time
-        var_to_plot: (string): a .PRO recognized string code of the variable to plot. Must be a col in dataframes
-        xmin (datetime.datetime): dt object representing the time from which the list of dataframes should be analysed
-        xmax (datetime.datetime): dt object representing the time to which the list of dataframes should be analysed
-        ymin (float): value in centimeters representing the height from which the .PRO snowpack should be analysed
-        ymax (float): value in centimeters representing the height to which the .PRO snowpack should be analysed
+        path (str): String pointing to the location of the .PRO file to be read
+        var_codes (list): Optional, four character .PRO codes to read. Defaults to `pro_var_codes()`. Date ('0500')
+            and height ('0501') are always read.
+        xmin (datetime.datetime): Optional, timesteps before this are skipped without being parsed
+        xmax (datetime.datetime): Optional, reading stops at the first timestep after this
 
     Returns:
-        return_dict (dict): a dictionary containing both the grid and some other info about its x/y axes
+        pro (dict): 'dates' (datetime64 array, one per timestep), 'offsets' (int64 array, one longer than 'dates')
+            and 'columns' (dict of float64 arrays keyed by variable name, including 'thickness_m').
 
-        """
+    """
 
-    # Find the lowest and the highest heights to calibrate the ylims
+    chunks = list(iter_pro_chunks(path, var_codes, xmin, xmax, chunk_size=None))
 
-    max_heights, min_heights, dates = [], [], []
-    for df in spl:
-        max_heights.append(df['height [> 0: top, < 0: bottom of elem.] (cm)'].iloc[-1])
-        min_heights.append(df['height [> 0: top, < 0: bottom of elem.] (cm)'].iloc[0])
-        dates.append(df['dates'].iloc[0])
+    if not chunks:
+        return(build_pro_columns(path, var_codes, [], {}, {}))
 
-    if ymin and ymax:
-        max_height = ymax
-        min_height = ymin
-    else:
-        max_height = np.max(max_heights)
-        min_height = np.min(min_heights)
-        max_height = round(max_height ,5 ,'up')
-        min_height = round(min_height ,5 ,'down')
+    return(chunks[0])
 
-    grid_resolution = 100
-    vertical_grid = np.linspace(min_height ,max_height ,grid_resolution)
 
-    # Trim spl to fit specified xmin, xmax
+def iter_pro_chunks(path, var_codes=None, xmin=None, xmax=None, chunk_size=1000):
 
-    if xmin and xmax:
+    """Streams a .PRO file, yielding its timesteps in chunks as they are read.
 
-        spl = [sp for (date,sp) in zip(dates,spl) if (xmin < date < xmax)]
-        dates = [date for date  in dates if (xmin < date < xmax)]
+    Each chunk has the layout returned by `read_pro_columns`, so a long run can be processed without ever holding
+    all of it in memory. Timesteps outside [xmin, xmax] are recognised from their date line and their data lines
+    are skipped without being split or converted, and the file is closed as soon as a date after xmax is seen.
 
-    grid = np.full((grid_resolution, len(spl)), np.nan)
+    Args:
+        path (str): String pointing to the location of the .PRO file to be read
+        var_codes (list): Optional, four character .PRO codes to read. Defaults to `pro_var_codes()`.
+        xmin (datetime.datetime): Optional, the earliest timestep to yield
+        xmax (datetime.datetime): Optional, the latest timestep to yield
+        chunk_size (int): Optional, the number of timesteps per chunk. None yields everything as one chunk.
 
-    for count, df in enumerate(spl):
+    Yields:
+        pro (dict): columnar .PRO data for up to chunk_size consecutive timesteps
+    """
 
-        heights = np.array(df['height [> 0: top, < 0: bottom of elem.] (cm)'])
-        variables = np.array(df[var_to_plot])
+    with open(path, "r") as f:
 
-        #         regular_variables = np.interp(vertical_grid, heights, variables, left = np.nan, right = np.nan)
+        # Skip the station parameters and the header, which also start with the variable codes
 
-        kind = 'nearest'
+        for line in f:
+            if line.startswith('[DATA]'):
+                break
 
-        my_interp = interpolate.interp1d(heights,
-                                         variables,
-                                         kind=kind,
-                                         bounds_error = False,
-                                         fill_value = (np.nan ,np.nan))
+        yield from iter_pro_line_chunks(f, path, var_codes, xmin, xmax, chunk_size)
 
-        regular_variables = my_interp(vertical_grid)
 
-        grid[: ,count] = np.flip(regular_variables, axis=0)
+def iter_pro_line_chunks(lines, path, var_codes=None, xmin=None, xmax=None, chunk_size=1000):
 
-    return_dict = {'grid':grid,
-                'max_height':max_height,
-                'min_height':min_height,
-                'dates':dates}
+    """Does the work of `iter_pro_chunks` on lines from the [DATA] section of a .PRO file.
 
-    return(return_dict)
+    Args:
+        lines (iterable): lines of the [DATA] section, starting at a date ('0500') line
+        path (str): the .PRO file the lines come from, for error messages
+        var_codes, xmin, xmax, chunk_size: see `iter_pro_chunks`
 
-def plot_grid(information,
-                 var_to_plot,
-                 vmin,
-                 vmax,
-                 xmin,
-                 xmax,
-                 ymin,
-                 ymax,
-                 file_name,
-                 c_scheme,
-                 yax_shift,
-                 subplot):
+    Yields:
+        pro (dict): columnar .PRO data for up to chunk_size consecutive timesteps
+    """
 
-    """Plots a 2D numpy array for some snowpack variable (y axis height, x axis time).
+    if var_codes is None:
+        var_codes = pro_var_codes()
+
+    var_codes = ['0500', '0501'] + [code for code in var_codes if code not in ['0500', '0501']]
+
+    min_key = pro_date_key(pd.Timestamp(xmin).strftime("%d.%m.%Y %H:%M:%S")) if xmin else None
+    max_key = pro_date_key(pd.Timestamp(xmax).strftime("%d.%m.%Y %H:%M:%S")) if xmax else None
+
+    def empty_chunk():
+        return([], {code: [] for code in var_codes[1:]}, {code: [] for code in var_codes[1:]})
+
+    date_strings, chunks, counts = empty_chunk()
+    seen_dates = False
+    in_window = False
+
+    for line in lines:
+
+        code = line[:4]
+
+        if code == '0500':
+
+            seen_dates = True
+            date_string = line[5:].rstrip()
+            key = pro_date_key(date_string)
+
+            if max_key and key > max_key:
+                break
+
+            in_window = not (min_key and key < min_key)
+
+            if in_window:
+
+                if chunk_size and len(date_strings) == chunk_size:
+                    yield build_pro_columns(path, var_codes, date_strings, chunks, counts)
+                    date_strings, chunks, counts = empty_chunk()
+
+                date_strings.append(date_string)
+
+            continue
+
+        if not in_window or code not in chunks:
+            continue
+
+        count, data = split_pro_line(line)
+
+        counts[code].append(count)
+        chunks[code].append(data)
+
+    if not seen_dates:
+        raise ValueError(f"No timesteps found in {path}, is it a .PRO file?")
+
+    if date_strings:
+        yield build_pro_columns(path, var_codes, date_strings, chunks, counts)
+
+
+def split_pro_line(line):
+
+    """Splits a data line of a .PRO file (e.g. '0502,3,100.0,240.5,300.1') into its value count and its values.
 
     Args:
-        information (dict): includes the grid to plot and some information about the x/y axes
-        var_to_plot (str): variable to plot, gets used to name the colorbar
-        vmin (float): min value for the colorbar
-        vmax (float): max value for the colorbar
-        xmin (datetime.datetime): represents time from which data appears on the grid
-        xmax (datetime.datetime): represents time to which data appears on the grid
-        ymin (float): represents min height to which data appears on the grid
-        ymax (float): represents max height to which data appears on the grid
-        file_name: if present represents where the image should be saved
-        c_scheme: represents the scheme of the colorbar e.g. 'plasma', 'Blues'.
-        yax_shift: shifts the y axis ticks down a bit (useful if shifted to a ref value , e.g. 400cm)
+        line (str): the line, with or without its line end
 
     Returns:
-        Nothing, put in a PR if you want it to!
+        count (int): the number of values on the line
+        data (str): the comma separated values
+    """
+
+    count, _, data = line[5:].rstrip().partition(',')
+
+    # The grain type line has a trailing graupel classification that isn't an element (bug?)
+
+    if line[:4] == '0513':
+        return(int(count) - 1, data.rpartition(',')[0])
+
+    return(int(count), data)
+
 
+def pro_date_key(date_string):
+
+    """Rearranges a .PRO date (dd.mm.yyyy HH:MM:SS) into a string that sorts in time order (yyyymmdd HH:MM:SS)."""
+
+    return(date_string[6:10] + date_string[3:5] + date_string[0:2] + date_string[10:])
+
+
+def build_pro_columns(path, var_codes, date_strings, chunks, counts):
+
+    """Turns the raw lines gathered by `iter_pro_chunks` into the columnar layout of `read_pro_columns`.
+
+    Args:
+        path (str): the .PRO file the lines came from, for error messages
+        var_codes (list): four character .PRO codes that were read
+        date_strings (list): the date of each timestep, as written in the file (or already parsed, as a datetime64
+            array)
+        chunks (dict): for each code, the data part of each of its lines
+        counts (dict): for each code, the number of values on each of its lines
+
+    Returns:
+        pro (dict): columnar .PRO data, see `read_pro_columns`
     """
 
-    grain_type = True if "grain type" in var_to_plot else False
+    if var_codes is None:
+        var_codes = pro_var_codes()
 
-    grid = information['grid']
-    dates = information['dates']
+    var_codes = ['0500', '0501'] + [code for code in var_codes if code not in ['0500', '0501']]
+    code_dict = pro_code_dict(return_all=True)
 
-    # Make the plot
+    n_steps = len(date_strings)
 
-    if subplot:
-        ax = subplot
+    if isinstance(date_strings, np.ndarray) and np.issubdtype(date_strings.dtype, np.datetime64):
+        dates = date_strings.astype('datetime64[ns]')
     else:
-        fig, ax = plt.subplots(1 ,1 ,figsize=(10 ,6))
+        dates = pd.to_datetime(date_strings, format="%d.%m.%Y %H:%M:%S").to_numpy().astype('datetime64[ns]')
 
-    # Specify the colormap
+    if n_steps == 0:
+        columns = {code_dict[code]: np.empty(0) for code in var_codes[1:]}
+        columns['thickness_m'] = np.empty(0)
+        return({'dates': dates, 'offsets': np.zeros(1, dtype=np.int64), 'columns': columns})
 
-    if grain_type:
-        my_cmap = grain_type_colormap()
-        grid = transform_grid_for_grain_type(grid)
-    else:
-        my_cmap = plt.get_cmap(c_scheme)
+    for code in var_codes[1:]:
+        if len(counts[code]) != n_steps:
+            raise ValueError(f"Found {len(counts[code])} '{code}' lines for {n_steps} timesteps in {path}")
 
+    # The height line has one more entry than there are elements: the bottom of the lowest element
 
-    # Set the limits of the plot
+    node_counts = np.array(counts['0501'], dtype=np.int64)
+    heights = parse_pro_values(chunks['0501'], node_counts.sum())
 
-    x_lims = mdates.date2num([dates[0] ,dates[-1]])
-    if xmin and xmax:
-        x_lims_specified = mdates.date2num([xmin, xmax])
-        # for spec in x_lims_specified:
-        #     assert (x_lims[0] < spec < x_lims[1])
-        x_lims = x_lims_specified
+    base_positions = np.concatenate(([0], np.cumsum(node_counts)[:-1]))
+    is_element = np.ones(len(heights), dtype=bool)
+    is_element[base_positions] = False
 
-    if ymin and ymax:
-        information['min_height'] = ymin
-        information['max_height'] = ymax
+    offsets = np.concatenate(([0], np.cumsum(node_counts - 1))).astype(np.int64)
 
-    extent = [x_lims[0],
-              x_lims[1] ,
-              information['min_height'] - yax_shift,
-              information['max_height'] - yax_shift]
+    thickness = np.diff(heights, prepend=np.nan)[is_element] / 100
 
-    ax.xaxis_date()
-    date_format = mdates.DateFormatter('%m/%d')
-    ax.xaxis.set_major_formatter(date_format)
+    columns = {code_dict['0501']: heights[is_element]}
 
-    #######################
+    for code in var_codes[2:]:
 
-    im = ax.imshow(grid,
-                   extent= extent,
-                   aspect='auto',
-                   vmin=vmin ,vmax=vmax,
-                   cmap=my_cmap)
+        var_counts = np.array(counts[code], dtype=np.int64)
+        values = parse_pro_values(chunks[code], var_counts.sum())
 
+        if np.array_equal(var_counts, node_counts):
+            values = values[is_element]
+        elif not np.array_equal(var_counts, node_counts - 1):
+            raise ValueError(f"Variable '{code}' does not have one value per element in {path}")
 
-    ax.tick_params(right=True)
+        columns[code_dict[code]] = values
 
-    ax.set_ylabel('Height (cm)', fontsize='x-large')
+    columns['thickness_m'] = thickness
 
-    if subplot:
-        return ax
-    else:
+    pro = {'dates': dates,
+           'offsets': offsets,
+           'columns': columns}
 
-        cbar = fig.colorbar(im, ax=ax, pad=0.075)
+    return(pro)
 
-        if grain_type:           cbar.ax.set_yticklabels(get_grain_tick_labels())
-        else:                    cbar.set_label(var_to_plot, fontsize='x-large')
 
+def parse_pro_values(chunks, n_values):
 
-        if file_name:
-            fig.savefig(file_name ,dpi=500, bbox_inches='tight')
+    """Converts the comma separated data from a list of .PRO lines into one float64 array.
+
+    Args:
+        chunks (list): strings of comma separated numbers, one per line, with the code and count already removed
+        n_values (int): the number of values the lines should hold in total
 
-        plt.show()
+    Returns:
+        values (np.array): float64 array of length n_values
+    """
 
-        return 0
+    values = np.fromstring(','.join(chunks), dtype=np.float64, sep=',') if n_values else np.empty(0)
 
+    if len(values) != n_values:
+        raise ValueError(f"Expected {n_values} values but parsed {len(values)}, the .PRO file may be corrupted")
 
-def round(num, divisor, direction):
+    return(values)
 
-    """Rounds a number to the nearest, user-specified value.
+
+def snowpro_list_from_columns(pro):
+
+    """Builds the list of dataframes returned by `read_pro` from the columnar output of `read_pro_columns`.
 
     Args:
-        num (float): the number to be rounded.
-        divisor (int): the number to be rounded to, e.g. 5 for rounding to nearest 5.
-        direction (str): 'up' or 'down' specifiying whether the number should be rounded up or down.
+        pro (dict): columnar .PRO data as returned by `read_pro_columns`
 
     Returns:
-        The rounded number.
+        snowpro_list (list): one dataframe per timestep, each representing the state of the snowpack at that time.
     """
 
-    if direction.lower() == 'down':
-        return floor(num / divisor) * divisor
-    elif direction.lower() == 'up':
-        return ceil(num / divisor) * divisor
+    return([profile.to_dataframe() for profile in profiles_from_columns(pro)])
 
-def read_pro(path,var_to_plot= None):
 
-    """ Reads a .PRO file and returns a list of dataframes representing the evolving state of the snowpack.
+def profiles_from_columns(pro):
+
+    """Splits columnar .PRO data into one `SnowProfile` per timestep, without copying any of the data.
 
     Args:
-        path (str): String pointing to the location of the .PRO file to be read
-        var_to_plot: Optional, use this if you're only interested in one variable.
+        pro (dict): columnar .PRO data as returned by `read_pro_columns`
 
     Returns:
+        profiles (list): one `SnowProfile` per timestep
+    """
+
+    offsets = pro['offsets']
+    columns = pro['columns']
+
+    return([SnowProfile(date, columns, offsets[date_index], offsets[date_index + 1])
+            for date_index, date in enumerate(pd.to_datetime(pro['dates']))])
+
+
+class SnowProfile:
 
+    """The state of the snowpack at one point in time, a light stand-in for the dataframes `read_pro` returns.
+
+    A profile holds no data of its own, just the time and where its elements are in the arrays of columnar .PRO data
+    (see `read_pro_columns`), which all the profiles of a file share. Indexing it with a column name gives a numpy
+    view of that column, with the same column names as the dataframes, and `to_dataframe` builds the dataframe
+    itself when one is really needed.
+
+    Args:
+        date (pd.Timestamp): the time of the profile
+        columns (dict): the 'columns' of the columnar .PRO data
+        start (int): index of the profile's first element in the columns
+        end (int): index just past the profile's last element
     """
 
-    # Which variables are you interested in?
+    __slots__ = ('date', '_columns', '_start', '_end')
 
-    if var_to_plot:
-        var_codes = ['0500','0501',pro_code_dict(var_to_plot,inverse=True)]
-    else:
-        var_codes = ['0500', '0501', '0502', '0503', '0506', '0508',
-                     '0509', '0511', '0512', '0513', '0515',
-                     '0516', '0521', '0535', '0540', '0541']
+    def __init__(self, date, columns, start, end):
 
-    # Set up the dictionary to be returned. Dictionary is organised by variable name.
+        self.date = date
+        self._columns = columns
+        self._start = int(start)
+        self._end = int(end)
 
-    code_dict = pro_code_dict(return_all=True)
+    def __len__(self):
 
-    variables = {}
-    for var in var_codes:
-        variables[code_dict[var]] = []
+        return(self._end - self._start)
 
-    # Open the .PRO file
+    def __getitem__(self, varname):
 
-    with open(path, "r") as f:
+        if varname == 'dates':
+            return(np.full(len(self), np.datetime64(self.date, 'ns')))
+
+        return(self._columns[varname][self._start:self._end])
+
+    def __contains__(self, varname):
 
-        # Iterate line by line
+        return(varname == 'dates' or varname in self._columns)
 
-        for line in f.readlines():
+    def __repr__(self):
 
-            # If the variable code (first four chars) matches the variable of interest,
-            # append that line to the list of lines
+        return(f"SnowProfile({self.date}, {len(self)} elements)")
 
-            if line[:4] in var_codes:
-                    variables[code_dict[line[:4]]].append(line)
+    @property
+    def columns(self):
 
+        """The column names, as in the dataframe `to_dataframe` would build."""
 
-    # Now remove the header data
+        return(list(self._columns.keys()) + ['dates'])
 
-    for variable in variables.keys():
+    def to_dataframe(self):
 
-        variables[variable].pop(0)
+        """Returns the profile as a dataframe, laid out exactly like those returned by `read_pro`."""
 
-    snowpro_list = [snowpro_from_snapshot(date_index, variables) for date_index in range(len(variables['Date']))]
+        dataframe_dict = {varname: values[self._start:self._end] for varname, values in self._columns.items()}
 
-    return (snowpro_list)
+        df = pd.DataFrame(dataframe_dict, index=pd.RangeIndex(1, len(self) + 1))
+        df['dates'] = self.date
+
+        return(df)
 
 
 def pro_code_dict(code=False, inverse=False, return_all=False):
@@ -545,46 +1817,104 @@ def series_from_line(variables, varname, index):
 
         return (datetime.datetime.strptime(series[1][:-1], "%d.%m.%Y %H:%M:%S"))
 
-def read_smet(path, var):
+def read_smet_header(path):
 
-    """ Reads a .smet file and returns a time series of the defined variable as a pandas data frame.
+    """Reads the [HEADER] block of a .smet file.
 
     Args:
         path (str): String pointing to the location of the .smet file to be read.
-        var  (str): Variable you want to plot
 
     Returns:
-        Time series of defined variable as a pandas data frame.
-
+        header (dict): 'fields' (list of column names), 'nodata' (float), 'units' (dict of each field's plot_unit,
+            if given), 'metadata' (dict of every header key, numbers converted to floats) and 'data_line' (number
+            of lines before the first data line)
     """
 
-    # Load .smet file as a Pandas data frame
-    df = pd.read_csv(path)
+    metadata = {}
+
+    with open(path) as f:
+        for count, line in enumerate(f):
+            if line.strip() == '[DATA]':
+                break
+            if '=' in line:
+                key, value = (part.strip() for part in line.split('=', 1))
+                try:
+                    metadata[key] = float(value)
+                except ValueError:
+                    metadata[key] = value
+        else:
+            raise ValueError(f"No [DATA] section found in {path}, is it a .smet file?")
+
+    if 'fields' not in metadata:
+        raise ValueError(f"No fields line in the header of {path}")
+
+    fields = str(metadata['fields']).split()
+    units = str(metadata.get('plot_unit', '')).split()
+
+    header = {'fields': fields,
+              'nodata': metadata.get('nodata', -999.),
+              'units': dict(zip(fields, units)) if len(units) == len(fields) else {},
+              'metadata': metadata,
+              'data_line': count + 1}
+
+    return(header)
+
+def read_smet(path, var=None):
 
-    # Determine indices for data retrieval
-    bump = 2
+    """ Reads a .smet file and returns time series of the defined variables as a pandas data frame.
 
-    fields_row = np.where(df[df.columns[0]].str.startswith("fields"))[0][0] + bump
+    The header is parsed once, then all the requested columns are read together in a single pass over the data.
+    nodata values are set to NaN.
 
-    data_row = np.where(df[df.columns[0]] == '[DATA]')[0][0] + bump
+    Args:
+        path (str): String pointing to the location of the .smet file to be read.
+        var  (str or list): Variable(s) you want to plot, as named on the fields line. Defaults to all of them.
 
-    fields =  np.loadtxt(path, skiprows=fields_row - 1, max_rows=1, dtype='str')
+    Returns:
+        Time series of defined variables as a pandas data frame, one column per variable. The header is kept in the
+        frame's attrs, see `read_smet_header`.
 
-    data_col = np.where(fields == var)[0][0] - bump
+    """
 
-    # Creates pandas data frame
-    time = np.loadtxt(path, skiprows=data_row, usecols=0, dtype = 'str')
+    header = read_smet_header(path)
+    fields = header['fields']
 
-    time = pd.to_datetime(time, format='%Y-%m-%dT%H:%M:%S')
+    if 'timestamp' in fields:
+        time_field = 'timestamp'
+    elif 'julian' in fields:
+        time_field = 'julian'
+    else:
+        raise ValueError(f"{path} has neither a timestamp nor a julian field")
 
-    data = np.loadtxt(path, skiprows=data_row, usecols=data_col)
+    if var is None:
+        variables = [field for field in fields if field != time_field]
+    else:
+        variables = [var] if isinstance(var, str) else list(var)
+
+    missing = [variable for variable in variables if variable not in fields]
+    if missing:
+        raise ValueError(f"{missing} not in the fields of {path}, which are {fields}")
+
+    data = pd.read_csv(path,
+                       sep=r'\s+',
+                       skiprows=header['data_line'],
+                       header=None,
+                       names=fields,
+                       usecols=[time_field] + variables,
+                       dtype={variable: np.float64 for variable in variables})
+
+    if time_field == 'timestamp':
+        time = pd.to_datetime(data[time_field], format='%Y-%m-%dT%H:%M:%S')
+    else:
+        time = pd.to_datetime(data[time_field], unit='D', origin='julian')
 
-    ts = pd.DataFrame(data, index=time)
+    ts = data[variables].set_axis(pd.DatetimeIndex(time).rename(None), axis=0)
 
     # Set no data values to nan
-    ts[ts == -999] = np.nan
+    ts = ts.mask(ts == header['nodata'])
+
+    ts.attrs = header
 
-    # Return time series as Pandas data frame
     return ts
 
 def check_difference_with_conditions(ymin,ymax,variable):
@@ -598,10 +1928,10 @@ def check_difference_with_conditions(ymin,ymax,variable):
 
     """
 
-    if variable.lower() in ['grain type (Swiss Code F1F2F3)', 'grain type']:
+    if "grain type" in variable.lower():
         raise ValueError("You are trying to difference a categorical variable like grain type!")
 
-    if all([ymin,ymax]):
+    if ymin is not None and ymax is not None:
         return 0
     else:
         raise ValueError('To use the difference method you must specify y limits.')
@@ -7,12 +7,17 @@ setup(
     url='https://github.com/robbiemallett/pyniviz',
     license='MIT',
     author='Robbie Mallett',
+    python_requires='>=3.9',
     install_requires=['pandas',
                       'numpy',
                       'scipy',
                       'matplotlib',
                       'docutils',
                       'Pygments'],
+    extras_require={'export': ['pyarrow',
+                               'netCDF4',
+                               'xarray',
+                               'zarr']},
     author_email='robbie.mallett.17@ucl.ac.uk',
     long_description='pyniviz is a Python tool for visualising the output of the SNOWPACK model. For information and a link to the documentation please visit the github page.'
 )
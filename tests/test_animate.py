@@ -0,0 +1,61 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from PIL import Image
+from pyniviz import tools
+from pyniviz.animate import ProfileAnimator, animate_profiles
+
+class TestAnimate(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.variables = ['element temperature (degC)', 'grain size (mm)']
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def test_blitted_frame(self):
+
+        pro = tools.read_pro('examples/sample.pro', self.variables, columnar=True)
+
+        animator = ProfileAnimator(pro, self.variables, dpi=50)
+        animator.render(0)
+        frame = np.asarray(animator.render(100)).copy()
+
+        # The same timestep drawn from scratch
+
+        full = ProfileAnimator(pro, self.variables, dpi=50)
+        for artist in full.artists:
+            artist.set_animated(False)
+        full.update(100)
+        full.canvas.draw()
+
+        np.testing.assert_array_equal(frame, np.asarray(full.canvas.buffer_rgba()))
+        self.assertEqual(frame.shape[:2][::-1], animator.size)
+
+    def test_animate_profiles(self):
+
+        serial = os.path.join(self.directory, 'serial.gif')
+        parallel = os.path.join(self.directory, 'parallel.gif')
+
+        self.assertEqual(animate_profiles('examples/sample.pro', serial, stride=24, dpi=40), 16)
+        self.assertEqual(animate_profiles('examples/sample.pro', parallel, stride=24, dpi=40, processes=2), 16)
+
+        with Image.open(serial) as first, Image.open(parallel) as second:
+            self.assertEqual(first.n_frames, 16)
+            self.assertEqual(second.n_frames, 16)
+            self.assertEqual(first.size, second.size)
+
+    @unittest.skipIf(shutil.which('ffmpeg'), "ffmpeg is installed")
+    def test_video_needs_ffmpeg(self):
+
+        with self.assertRaises(ValueError):
+            animate_profiles('examples/sample.pro', os.path.join(self.directory, 'season.mp4'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+import pandas as pd
+from pyniviz import batch
+
+render_file = batch.render_file
+
+def crash_on_crash_files(path, *args):
+
+    """Renders like batch.render_file, but kills the worker process outright on files named crash*."""
+
+    if os.path.basename(path).startswith('crash'):
+        os._exit(1)
+
+    return(render_file(path, *args))
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        shutil.copy('examples/sample.pro', os.path.join(self.directory, 'good.pro'))
+        with open(os.path.join(self.directory, 'bad.pro'), 'w') as f:
+            f.write('not a .PRO file\n')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def test_render_batch(self):
+
+        output_dir = os.path.join(self.directory, 'plots')
+
+        summary = batch.render_batch(os.path.join(self.directory, '*.pro'),
+                                     ['temperature', 'density'],
+                                     output_dir,
+                                     max_workers=2,
+                                     dpi=50)
+
+        self.assertEqual(list(summary['status']), ['failed', 'ok'])
+        self.assertIn('No timesteps', summary['error'].iloc[0])
+
+        for variable in ['element temperature (degC)', 'element density (kg m-3)']:
+            png = os.path.join(output_dir, batch.output_name('good.pro', variable))
+            self.assertTrue(os.path.exists(png))
+
+        self.assertTrue(os.path.exists(os.path.join(output_dir, 'summary.csv')))
+
+    def test_worker_crash(self):
+
+        for name in ['crash.pro', 'good2.pro', 'good3.pro', 'good4.pro']:
+            shutil.copy('examples/sample.pro', os.path.join(self.directory, name))
+
+        output_dir = os.path.join(self.directory, 'plots')
+
+        with mock.patch('pyniviz.batch.render_file', crash_on_crash_files):
+            summary = batch.render_batch(os.path.join(self.directory, '*.pro'), ['density'], output_dir,
+                                         max_workers=2, dpi=30)
+
+        status = dict(zip(summary['path'].map(os.path.basename), summary['status']))
+
+        self.assertEqual(status, {'bad.pro': 'failed', 'crash.pro': 'failed', 'good.pro': 'ok', 'good2.pro': 'ok',
+                                  'good3.pro': 'ok', 'good4.pro': 'ok'})
+        self.assertIn('BrokenProcessPool', summary['error'].iloc[1])
+
+    def test_time_window_arguments(self):
+
+        output_dir = os.path.join(self.directory, 'plots')
+
+        with mock.patch('pyniviz.batch.render_batch', return_value=pd.DataFrame(columns=['path', 'status'])) as run:
+            batch.main([os.path.join(self.directory, 'good.pro'), '-v', 'density', '-o', output_dir,
+                        '--xmin', '2021-01-01', '--xmax', '2021-03-01 12:00'])
+
+        self.assertEqual(run.call_args.kwargs['xmin'], pd.Timestamp('2021-01-01').to_pydatetime())
+        self.assertEqual(run.call_args.kwargs['xmax'], pd.Timestamp('2021-03-01 12:00').to_pydatetime())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+from pyniviz import tools, cache
+import numpy as np
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+
+        self.cache_dir = tempfile.mkdtemp()
+        self.pro_path = os.path.join(self.cache_dir, 'sample.pro')
+        shutil.copy('examples/sample.pro', self.pro_path)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.cache_dir)
+
+    def test_cache_round_trip(self):
+
+        parsed = tools.read_pro(self.pro_path, 'element density (kg m-3)', columnar=True)
+        first = tools.read_pro(self.pro_path, 'element density (kg m-3)', columnar=True, cache=self.cache_dir)
+        second = tools.read_pro(self.pro_path, 'element density (kg m-3)', columnar=True, cache=self.cache_dir)
+
+        self.assertTrue(os.path.exists(cache.cache_file(self.pro_path, self.cache_dir)))
+
+        for pro in [first, second]:
+            np.testing.assert_array_equal(pro['dates'], parsed['dates'])
+            np.testing.assert_array_equal(pro['offsets'], parsed['offsets'])
+            self.assertEqual(list(pro['columns'].keys()), list(parsed['columns'].keys()))
+            for varname in parsed['columns']:
+                np.testing.assert_array_equal(pro['columns'][varname], parsed['columns'][varname])
+
+        # A second variable gets added to the same entry
+
+        temperature = tools.read_pro(self.pro_path, 'element temperature (degC)', columnar=True, cache=self.cache_dir)
+        self.assertIn('element temperature (degC)', temperature['columns'])
+
+    def test_cache_invalidation(self):
+
+        tools.read_pro(self.pro_path, 'element density (kg m-3)', columnar=True, cache=self.cache_dir)
+
+        # Drop the last timestep: everything from its date line onwards
+
+        with open(self.pro_path) as f:
+            lines = f.readlines()
+        last_date = max(i for i, line in enumerate(lines) if line.startswith('0500'))
+        with open(self.pro_path, 'w') as f:
+            f.writelines(lines[:last_date])
+
+        pro = tools.read_pro(self.pro_path, 'element density (kg m-3)', columnar=True, cache=self.cache_dir)
+        self.assertEqual(len(pro['dates']), len(tools.read_pro_columns('examples/sample.pro')['dates']) - 1)
+
+    def test_one_parse_for_several_variables(self):
+
+        # The first miss parses the default variables too, so the panels of a multiplot after it are cache hits
+
+        with mock.patch('pyniviz.cache.read_pro_columns', wraps=tools.read_pro_columns) as parse:
+            for variable in ['grain size', 'temperature', 'density', 'bulk_sal']:
+                pro = tools.read_pro(self.pro_path, variable, columnar=True, cache=self.cache_dir)
+                self.assertIn(tools.variable_shortenings(variable), pro['columns'])
+
+        self.assertEqual(parse.call_count, 1)
+
+        # A variable outside the defaults is parsed on its own and added
+
+        with mock.patch('pyniviz.cache.read_pro_columns', wraps=tools.read_pro_columns) as parse:
+            tools.read_pro(self.pro_path, 'stability index Sk38', columnar=True, cache=self.cache_dir)
+
+        self.assertEqual(parse.call_args[0][1], ['0533'])
+
+    def test_max_bytes(self):
+
+        other = os.path.join(self.cache_dir, 'other.pro')
+        shutil.copy(self.pro_path, other)
+
+        tools.read_pro(self.pro_path, 'density', columnar=True, cache=self.cache_dir)
+        tools.read_pro(other, 'density', columnar=True, cache=self.cache_dir, cache_max_bytes=0)
+
+        self.assertFalse(os.path.exists(cache.cache_file(self.pro_path, self.cache_dir)))
+        self.assertTrue(os.path.exists(cache.cache_file(other, self.cache_dir)))
+
+    def test_eviction(self):
+
+        tools.read_pro(self.pro_path, 'element density (kg m-3)', columnar=True, cache=self.cache_dir)
+        entry = cache.cache_file(self.pro_path, self.cache_dir)
+
+        cache.evict(self.cache_dir, 0, keep=entry)
+        self.assertTrue(os.path.exists(entry))
+
+        cache.clear_cache(self.cache_dir)
+        self.assertFalse(os.path.exists(entry))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+from pyniviz import tools, derived
+
+class TestDerived(unittest.TestCase):
+
+    def test_bulk_quantities(self):
+
+        profiles = tools.read_pro('examples/sample.pro')
+        bulk = derived.read_bulk('examples/sample.pro')
+
+        self.assertEqual(len(bulk), len(profiles))
+        self.assertEqual(list(bulk.columns), list(derived.BULK_NEEDS))
+
+        for count in [0, 150, len(profiles) - 1]:
+
+            df = profiles[count]
+            row = bulk.iloc[count]
+
+            thickness = df['thickness_m'].to_numpy()
+            density = df['element density (kg m-3)'].to_numpy()
+            temperature = df['element temperature (degC)'].to_numpy()
+            ice = df['grain type (Swiss Code F1F2F3)'].to_numpy() // 100 == 8
+
+            self.assertEqual(bulk.index[count], df['dates'].iloc[0])
+            self.assertAlmostEqual(row['depth (cm)'], 100 * thickness.sum())
+            self.assertAlmostEqual(row['SWE (kg m-2)'], (density * thickness).sum())
+            self.assertAlmostEqual(row['mean temperature (degC)'], np.average(temperature, weights=thickness))
+            self.assertEqual(row['top temperature (degC)'], temperature[-1])
+            self.assertEqual(row['bottom temperature (degC)'], temperature[0])
+            self.assertAlmostEqual(row['cold content (J m-2)'] / derived.C_ICE,
+                                   (density * thickness * np.maximum(-temperature, 0)).sum())
+            self.assertAlmostEqual(row['ice thickness (cm)'], 100 * thickness[ice].sum())
+            self.assertAlmostEqual(row['snow depth (cm)'], 100 * thickness[~ice].sum())
+
+    def test_empty_columns(self):
+
+        offsets = np.array([0, 2, 2, 3])
+        values = np.array([1., 2., 4.])
+
+        np.testing.assert_array_equal(derived.column_sums(values, offsets), [3, 0, 4])
+        np.testing.assert_array_equal(derived.column_ends(values, offsets, 'top'), [2, np.nan, 4])
+
+        with self.assertRaises(ValueError):
+            derived.bulk_quantities(tools.read_pro('examples/sample.pro', 'density', columnar=True),
+                                    ['total LWC (mm)'])
+
+
+if __name__ == '__main__':
+    unittest.main()
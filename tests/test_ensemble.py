@@ -0,0 +1,102 @@
+import unittest
+import os
+import shutil
+import warnings
+import tempfile
+import tracemalloc
+import numpy as np
+from pyniviz import ensemble, tools
+
+class TestEnsemble(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for count in range(3):
+            self.paths.append(os.path.join(self.directory, f"member{count}.pro"))
+            shutil.copy('examples/sample.pro', self.paths[-1])
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def test_running_stats(self):
+
+        rng = np.random.default_rng(0)
+        grids = rng.normal(size=(20, 5, 7))
+        grids[rng.random(grids.shape) < 0.3] = np.nan
+        grids[:, 0, 0] = np.nan
+
+        stats = ensemble.RunningStats((5, 7))
+        for grid in grids:
+            stats.add(grid)
+        result = stats.result()
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            np.testing.assert_allclose(result['mean'], np.nanmean(grids, axis=0))
+            np.testing.assert_allclose(result['std'], np.nanstd(grids, axis=0))
+            np.testing.assert_array_equal(result['max'], np.nanmax(grids, axis=0))
+
+        np.testing.assert_array_equal(result['count'], (~np.isnan(grids)).sum(axis=0))
+
+        percentiles = ensemble.member_percentiles(grids, [10, 50], max_cells=50)
+        np.testing.assert_allclose(percentiles[50][1:], np.nanpercentile(grids[:, 1:], 50, axis=0))
+        self.assertTrue(np.isnan(percentiles[10][0, 0]))
+
+    def test_ensemble_stats(self):
+
+        stats = ensemble.ensemble_stats(self.paths[1:], 'temperature', 385, 420, reference=self.paths[0],
+                                        percentiles=[50], max_workers=2)
+
+        expected = tools.create_grid(tools.read_pro(self.paths[0], columnar=True), 'element temperature (degC)',
+                                     ymin=385, ymax=420)['grid']
+
+        np.testing.assert_allclose(stats['mean'], expected)
+        np.testing.assert_allclose(stats['percentiles'][50], expected)
+        np.testing.assert_array_equal(stats['difference'][~np.isnan(expected)], 0)
+        self.assertEqual(stats['count'].max(), 2)
+
+    def test_ensemble_stats_from_zero(self):
+
+        # Sea ice and low snowpacks sit right at 0 cm, which is as much a limit as any other height
+
+        stats = ensemble.ensemble_stats(self.paths, 'temperature', 0, 420, max_workers=2, grid_resolution=50)
+
+        expected = tools.create_grid(tools.read_pro(self.paths[0], columnar=True), 'element temperature (degC)',
+                                     ymin=0, ymax=420, grid_resolution=50)['grid']
+
+        self.assertEqual((stats['min_height'], stats['max_height']), (0, 420))
+        np.testing.assert_allclose(stats['mean'], expected)
+
+        with self.assertRaises(ValueError):
+            ensemble.ensemble_stats(self.paths, 'grain type', 385, 420)
+
+        with self.assertRaises(ValueError):
+            ensemble.ensemble_stats(self.paths, 'temperature', None, None)
+
+    def test_memory_does_not_grow_with_members(self):
+
+        paths = []
+        for count in range(8):
+            paths.append(os.path.join(self.directory, f"extra{count}.pro"))
+            shutil.copy('examples/sample.pro', paths[-1])
+
+        # Fine grids (about 3 MB each) so holding one per member would show
+
+        peaks = []
+        for n_members in (2, 8):
+            tracemalloc.start()
+            try:
+                ensemble.ensemble_stats(paths[:n_members], 'temperature', 385, 420, max_workers=2,
+                                        grid_resolution=1000)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+
+        self.assertLess(peaks[1], 1.25 * peaks[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
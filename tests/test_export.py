@@ -0,0 +1,78 @@
+import unittest
+import os
+import shutil
+import tempfile
+import datetime
+import importlib.util
+import numpy as np
+from pyniviz import tools, export
+
+def installed(*modules):
+    return(all(importlib.util.find_spec(module) is not None for module in modules))
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.pro = tools.read_pro_columns('examples/sample.pro')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    @unittest.skipUnless(installed('pyarrow'), 'needs pyarrow')
+    def test_parquet_round_trip(self):
+
+        out_path = os.path.join(self.directory, 'sample.parquet')
+
+        self.assertEqual(export.export_parquet('examples/sample.pro', out_path, chunk_size=50), 373)
+
+        pro = tools.read_pro(out_path, columnar=True)
+
+        np.testing.assert_array_equal(pro['dates'], self.pro['dates'])
+        np.testing.assert_array_equal(pro['offsets'], self.pro['offsets'])
+        for varname, values in self.pro['columns'].items():
+            np.testing.assert_array_equal(pro['columns'][varname], values)
+
+        xmin, xmax = datetime.datetime(2020, 2, 1), datetime.datetime(2020, 2, 3)
+        window = tools.read_pro(out_path, 'density', columnar=True, xmin=xmin, xmax=xmax)
+        expected = tools.read_pro('examples/sample.pro', 'density', columnar=True, xmin=xmin, xmax=xmax)
+        np.testing.assert_array_equal(window['dates'], expected['dates'])
+        np.testing.assert_array_equal(window['columns']['element density (kg m-3)'],
+                                      expected['columns']['element density (kg m-3)'])
+
+    @unittest.skipUnless(installed('netCDF4', 'xarray'), 'needs netCDF4 and xarray')
+    def test_netcdf_round_trip(self):
+
+        self.check_grids(os.path.join(self.directory, 'sample.nc'))
+
+    @unittest.skipUnless(installed('zarr', 'xarray'), 'needs zarr and xarray')
+    def test_zarr_round_trip(self):
+
+        self.check_grids(os.path.join(self.directory, 'sample.zarr'))
+
+    def check_grids(self, out_path):
+
+        export.export_grids('examples/sample.pro', out_path, ['density', 'temperature'], chunk_size=50)
+
+        grids = export.load_grids(out_path)
+
+        for varname in ['element density (kg m-3)', 'element temperature (degC)']:
+            expected = tools.create_grid(self.pro, varname, dtype=np.float32)
+            np.testing.assert_array_equal(grids[varname]['grid'], expected['grid'])
+            self.assertEqual(grids[varname]['dates'], expected['dates'])
+            self.assertEqual(grids[varname]['max_height'], expected['max_height'])
+
+    def test_missing_dependency(self):
+
+        with self.assertRaises(ValueError):
+            export.export_grids('examples/sample.pro', os.path.join(self.directory, 'sample.h5'))
+
+        if not installed('pyarrow'):
+            with self.assertRaises(ImportError):
+                export.export_parquet('examples/sample.pro', os.path.join(self.directory, 'sample.parquet'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import os
+import shutil
+import tempfile
+import matplotlib
+matplotlib.use('Agg')
+from pyniviz import tools
+from pyniviz.follow import ProFollower
+import numpy as np
+
+class TestFollow(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.pro_path = os.path.join(self.directory, 'growing.pro')
+
+        # Left as it is, without a line end after the last line, like SNOWPACK leaves it
+
+        with open('examples/sample.pro', 'rb') as f:
+            self.contents = f.read()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def test_follow_growing_file(self):
+
+        follower = ProFollower(self.pro_path, 'temperature', ymin=395, ymax=420)
+
+        # Write the file in uneven pieces, cutting through lines and timesteps
+
+        for end in list(range(0, len(self.contents), 30011)) + [len(self.contents)]:
+
+            with open(self.pro_path, 'wb') as f:
+                f.write(self.contents[:end])
+
+            follower.poll()
+            follower.draw()
+
+        # The last timestep can't be told from one still being written until the file stops growing
+
+        self.assertEqual(len(follower.info['dates']), 372)
+        self.assertEqual(follower.poll(), 1)
+        follower.draw()
+
+        expected = tools.create_grid(tools.read_pro_columns('examples/sample.pro'),
+                                     'element temperature (degC)', ymin=395, ymax=420)
+
+        np.testing.assert_array_equal(follower.info['grid'], expected['grid'])
+        self.assertEqual(follower.info['dates'], expected['dates'])
+        self.assertEqual(follower.image.get_array().shape, expected['grid'].shape)
+
+    def test_final_poll(self):
+
+        with open(self.pro_path, 'wb') as f:
+            f.write(self.contents)
+
+        follower = ProFollower(self.pro_path, 'temperature', ymin=395, ymax=420)
+
+        self.assertEqual(follower.poll(final=True), 373)
+
+        # Half of the last line is never taken as complete
+
+        with open(self.pro_path, 'wb') as f:
+            f.write(self.contents[:-20])
+
+        follower = ProFollower(self.pro_path, 'temperature', ymin=395, ymax=420)
+
+        self.assertEqual(follower.poll(), 372)
+        self.assertEqual(follower.poll(), 0)
+
+    def test_growing_heights(self):
+
+        # Without ymin and ymax the grid has to grow with the snowpack, which is about 15 cm deeper by the end
+
+        follower = ProFollower(self.pro_path, 'temperature')
+
+        with open(self.pro_path, 'wb') as f:
+            f.write(self.contents[:len(self.contents) // 4])
+
+        follower.poll()
+        first_top = follower.info['max_height']
+
+        with open(self.pro_path, 'wb') as f:
+            f.write(self.contents)
+
+        follower.poll(final=True)
+        follower.draw()
+
+        pro = tools.read_pro_columns('examples/sample.pro')
+        heights = pro['columns']['height [> 0: top, < 0: bottom of elem.] (cm)']
+
+        self.assertLess(first_top, heights.max())
+        self.assertGreaterEqual(follower.info['max_height'], heights.max())
+
+        expected = tools.create_grid(pro, 'element temperature (degC)', ymin=follower.info['min_height'],
+                                     ymax=follower.info['max_height'])
+
+        np.testing.assert_array_equal(follower.info['grid'], expected['grid'])
+        self.assertEqual(follower.image.get_extent()[3], follower.info['max_height'])
+
+
+if __name__ == '__main__':
+    unittest.main()
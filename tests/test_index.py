@@ -0,0 +1,116 @@
+import unittest
+import os
+import shutil
+import tempfile
+import datetime
+from pyniviz import tools, index
+import pandas as pd
+import numpy as np
+
+class TestIndex(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.pro_path = os.path.join(self.directory, 'sample.pro')
+        shutil.copy('examples/sample.pro', self.pro_path)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def test_get_snapshot(self):
+
+        time_of_interest = datetime.datetime(year=2020, month=2, day=11, hour=7)
+
+        snapshot = index.get_snapshot(self.pro_path, time_of_interest)
+        self.assertTrue(os.path.exists(index.index_file(self.pro_path)))
+
+        expected = [df for df in tools.read_pro(self.pro_path) if df['dates'].iloc[0] == time_of_interest][0]
+        pd.testing.assert_frame_equal(snapshot, expected)
+
+        nearest = index.get_snapshot(self.pro_path, time_of_interest + datetime.timedelta(minutes=20))
+        self.assertEqual(nearest['dates'].iloc[0], time_of_interest)
+
+        with self.assertRaises(KeyError):
+            index.get_snapshot(self.pro_path, time_of_interest + datetime.timedelta(minutes=20), nearest=False)
+
+    def test_get_snapshots(self):
+
+        xmin = datetime.datetime(year=2020, month=1, day=29)
+        xmax = datetime.datetime(year=2020, month=2, day=8)
+
+        pro = index.get_snapshots(self.pro_path, xmin, xmax, 'density', columnar=True)
+        expected = tools.read_pro_columns(self.pro_path, ['0502'], xmin, xmax)
+
+        np.testing.assert_array_equal(pro['dates'], expected['dates'])
+        np.testing.assert_array_equal(pro['columns']['element density (kg m-3)'],
+                                      expected['columns']['element density (kg m-3)'])
+
+    def test_index_rebuilt(self):
+
+        first = index.load_index(self.pro_path)
+
+        with open(self.pro_path) as f:
+            lines = f.readlines()
+        last_date = max(i for i, line in enumerate(lines) if line.startswith('0500'))
+        with open(self.pro_path, 'w') as f:
+            f.writelines(lines[:last_date])
+
+        self.assertEqual(len(index.load_index(self.pro_path)['dates']), len(first['dates']) - 1)
+
+    def test_lazy_columns(self):
+
+        pro = tools.read_pro(self.pro_path, ['0533', '0606'], columnar=True, lazy=True)
+        expected = tools.read_pro_columns(self.pro_path, ['0502', '0533', '0606'])
+
+        self.assertEqual(set(pro['columns']), {'height [> 0: top, < 0: bottom of elem.] (cm)', 'thickness_m',
+                                               'stability index Sk38', 'critical cut length (m)'})
+        np.testing.assert_array_equal(pro['offsets'], expected['offsets'])
+        for variable in pro['columns']:
+            np.testing.assert_array_equal(pro['columns'][variable], expected['columns'][variable])
+
+        # Not asked for, so only parsed now
+
+        np.testing.assert_array_equal(pro['columns']['element density (kg m-3)'],
+                                      expected['columns']['element density (kg m-3)'])
+        self.assertIn('element density (kg m-3)', pro['columns'])
+
+        with self.assertRaises(ValueError):
+            tools.read_pro(self.pro_path, 'not a variable', columnar=True, lazy=True)
+
+        with self.assertRaises(ValueError):
+            tools.read_pro(self.pro_path, 'density', columnar=True, lazy=True, cache=True)
+
+    def test_lazy_columns_file_changed(self):
+
+        pro = tools.read_pro(self.pro_path, 'density', columnar=True, lazy=True)
+        temperature = pro['columns']['element temperature (degC)']
+
+        # SNOWPACK appends another timestep: the loaded columns no longer match the file
+
+        with open(self.pro_path, 'a') as f:
+            f.write('\n0500,12.02.2020 13:00:00')
+
+        with self.assertRaises(ValueError):
+            pro['columns']['stability index Sk38']
+
+        # Columns loaded before the change are still there
+
+        self.assertIs(pro['columns']['element temperature (degC)'], temperature)
+
+    def test_lazy_window(self):
+
+        xmin = datetime.datetime(year=2020, month=2, day=1)
+        xmax = datetime.datetime(year=2020, month=2, day=5)
+
+        pro = tools.read_pro(self.pro_path, 'density', columnar=True, lazy=True, xmin=xmin, xmax=xmax)
+        expected = tools.read_pro_columns(self.pro_path, ['0503'], xmin, xmax)
+
+        np.testing.assert_array_equal(pro['dates'], expected['dates'])
+        np.testing.assert_array_equal(pro['columns']['element temperature (degC)'],
+                                      expected['columns']['element temperature (degC)'])
+
+
+if __name__ == '__main__':
+    unittest.main()
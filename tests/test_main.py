@@ -0,0 +1,73 @@
+import unittest
+import os
+import shutil
+import tempfile
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import matplotlib.image
+from pyniviz import main
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def test_plot_pro_panels(self):
+
+        file_name = os.path.join(self.directory, 'panels.png')
+        variables = ['grain size', 'temperature', 'density']
+
+        fig = main.plot_pro_panels('examples/sample.pro', variables, vmins=[0, -15, 100], vmaxs=[6, 0, 500],
+                                   file_name=file_name, dpi=40, show=False)
+
+        # A plot and a colorbar per panel, and nothing left open in pyplot
+
+        self.assertEqual(len(fig.axes), 2 * len(variables))
+        self.assertNotIn(fig.number, plt.get_fignums())
+
+        image = matplotlib.image.imread(file_name)
+        width, height = fig.get_size_inches() * 40
+
+        self.assertLessEqual(image.shape[1], width + 1)
+        self.assertLessEqual(image.shape[0], height + 1)
+        self.assertEqual(fig.axes[3].get_xlabel(), 'element temperature (degC)')
+
+        with self.assertRaises(ValueError):
+            main.plot_pro_panels('examples/sample.pro', variables, renderer='vector', show=False)
+
+    def test_difference_from_zero(self):
+
+        # A limit at 0 cm counts as a limit, low snowpacks and sea ice sit right on it
+
+        file_name = os.path.join(self.directory, 'difference.png')
+
+        main.plot_pro('examples/sample.pro', 'density', ymin=0, ymax=420, difference_with='examples/sample.pro',
+                      file_name=file_name, dpi=40, show=False)
+
+        self.assertTrue(os.path.exists(file_name))
+
+    def test_plot_stability_index(self):
+
+        # Anything read_pro can read can be plotted, by code or by full name
+
+        for variable in ['0533', 'stability index Sk38']:
+
+            file_name = os.path.join(self.directory, 'sk38.png')
+
+            main.plot_pro('examples/sample.pro', variable, file_name=file_name, dpi=40, show=False)
+
+            self.assertTrue(os.path.exists(file_name))
+            os.remove(file_name)
+
+        fig = main.plot_pro_panels('examples/sample.pro', ['0533', 'density'], dpi=40, show=False)
+        self.assertEqual(fig.axes[1].get_xlabel(), 'stability index Sk38')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import os
+import shutil
+import tempfile
+import pstats
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from pyniviz import main, tools
+from pyniviz.profiling import PipelineReport, stage
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        plt.close('all')
+        shutil.rmtree(self.directory)
+
+    def test_plot_pro_report(self):
+
+        file_name = os.path.join(self.directory, 'density.png')
+
+        report = main.plot_pro('examples/sample.pro', 'density', file_name=file_name, report=True)
+
+        self.assertIsInstance(report, PipelineReport)
+        self.assertEqual([record['stage'] for record in report.stages],
+                         ['read_pro', 'create_grid', 'plot_grid', 'savefig', 'show'])
+        self.assertEqual([record['depth'] for record in report.stages], [0, 0, 0, 1, 1])
+
+        read = report.stages[0]
+        self.assertEqual(read['file_bytes'], os.path.getsize('examples/sample.pro'))
+        self.assertEqual(read['timesteps'], 373)
+        self.assertEqual(read['elements'], 11483)
+        self.assertEqual(report.stages[3]['bytes'], os.path.getsize(file_name))
+
+        for record in report.stages:
+            self.assertGreaterEqual(record['seconds'], 0)
+            self.assertGreaterEqual(record['peak_mb'], 0)
+
+        # A stage's peak covers the stages inside it
+
+        self.assertGreaterEqual(report.stages[2]['peak_mb'], report.stages[3]['peak_mb'])
+        self.assertIn('savefig', str(report))
+
+        self.assertIsNone(main.plot_pro('examples/sample.pro', 'density'))
+
+    def test_profile_and_callback(self):
+
+        profile = os.path.join(self.directory, 'plot.prof')
+        seen = []
+
+        with PipelineReport(memory=False, callback=seen.append) as report:
+            main.plot_pro('examples/sample.pro', 'density', report=report)
+            tools.read_pro('examples/sample.pro', 'density')
+
+        self.assertEqual([record['stage'] for record in seen],
+                         ['read_pro', 'create_grid', 'show', 'plot_grid', 'read_pro', 'dataframes'])
+        self.assertNotIn('peak_mb', report.stages[0])
+
+        main.plot_pro('examples/sample.pro', 'density', profile=profile)
+        self.assertGreater(pstats.Stats(profile).total_calls, 0)
+
+        with stage('unreported') as record:
+            record['bytes'] = 1
+        self.assertEqual(len(report.stages), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
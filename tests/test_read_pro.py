@@ -3,6 +3,10 @@ from pyniviz import tools
 import pandas as pd
 import datetime
 import numpy as np
+from scipy import interpolate
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
 
 class TestTools(unittest.TestCase):
 
@@ -29,6 +33,23 @@ class TestTools(unittest.TestCase):
         self.assertEqual(self.list_of_dfs[0]['dates'].iloc[0],
                          self.list_of_dfs[0]['dates'].iloc[-1])
 
+    def test_read_pro_columns(self):
+
+        pro = tools.read_pro_columns('examples/sample.pro')
+
+        self.assertEqual(len(pro['dates']), len(self.list_of_dfs))
+        self.assertEqual(len(pro['offsets']), len(pro['dates']) + 1)
+
+        for varname, values in pro['columns'].items():
+            self.assertEqual(len(values), pro['offsets'][-1])
+
+        first = self.list_of_dfs[0]
+        np.testing.assert_array_equal(pro['columns']['element density (kg m-3)'][:pro['offsets'][1]],
+                                      first['element density (kg m-3)'])
+
+        columnar_info = tools.create_grid(pro, 'element density (kg m-3)')
+        np.testing.assert_array_equal(columnar_info['grid'], self.info['grid'])
+
     def test_create_grid(self):
 
         self.assertIsInstance(self.info['grid'], np.ndarray)
@@ -37,6 +58,220 @@ class TestTools(unittest.TestCase):
         self.assertEqual(np.isnan(self.info['grid']).all(), False)
 
 
+    def test_snow_profiles(self):
+
+        profiles = tools.read_pro('examples/sample.pro', profiles=True)
+
+        self.assertEqual(len(profiles), len(self.list_of_dfs))
+        self.assertEqual(profiles[0].date, datetime.datetime(year=2020,month=1,day=27))
+        self.assertEqual(profiles[0].columns, list(self.list_of_dfs[0].columns))
+
+        np.testing.assert_array_equal(profiles[10]['grain size (mm)'], self.list_of_dfs[10]['grain size (mm)'])
+        pd.testing.assert_frame_equal(profiles[10].to_dataframe(), self.list_of_dfs[10])
+
+        info = tools.create_grid(profiles, 'element density (kg m-3)')
+        np.testing.assert_array_equal(info['grid'], self.info['grid'])
+
+    def test_time_window(self):
+
+        xmin = datetime.datetime(year=2020, month=1, day=29)
+        xmax = datetime.datetime(year=2020, month=2, day=8)
+
+        full = tools.read_pro_columns('examples/sample.pro')
+        window = tools.read_pro_columns('examples/sample.pro', xmin=xmin, xmax=xmax)
+
+        expected = tools.select_timesteps(full, np.flatnonzero(tools.in_time_window(full['dates'], xmin, xmax)))
+
+        np.testing.assert_array_equal(window['dates'], expected['dates'])
+        np.testing.assert_array_equal(window['offsets'], expected['offsets'])
+        for varname in expected['columns']:
+            np.testing.assert_array_equal(window['columns'][varname], expected['columns'][varname])
+
+        chunks = list(tools.iter_pro_chunks('examples/sample.pro', chunk_size=50))
+        self.assertEqual(sum(len(chunk['dates']) for chunk in chunks), len(full['dates']))
+
+    def test_create_grid_resolution(self):
+
+        pro = tools.read_pro_columns('examples/sample.pro')
+        variable = 'grain type (Swiss Code F1F2F3)'
+
+        info = tools.create_grid(pro, variable, ymin=395, ymax=420, grid_resolution=51)
+        self.assertEqual(info['grid'].shape, (51, len(pro['dates'])))
+
+        fine = tools.create_grid(pro, variable, ymin=395, ymax=420, kind='layer', spacing=0.1, dtype=np.float32)
+        self.assertEqual(fine['grid'].shape, (251, len(pro['dates'])))
+        self.assertEqual(fine['grid'].dtype, np.float32)
+
+        # Each cell takes the grain type of the element whose extent contains it
+
+        vertical_grid = np.linspace(395, 420, 251)
+        heights = pro['columns']['height [> 0: top, < 0: bottom of elem.] (cm)']
+        column = slice(pro['offsets'][200], pro['offsets'][201])
+        tops = heights[column]
+        bottom = tops[0] - 100 * pro['columns']['thickness_m'][column][0]
+
+        expected = np.full(len(vertical_grid), np.nan)
+        inside = (vertical_grid >= bottom) & (vertical_grid <= tops[-1])
+        expected[inside] = pro['columns'][variable][column][np.searchsorted(tops, vertical_grid[inside])]
+
+        np.testing.assert_array_equal(np.flip(fine['grid'][:, 200]), expected.astype(np.float32))
+
+    def test_zero_height_limit(self):
+
+        # A limit of 0 cm is as much a limit as any other
+
+        start, end = datetime.datetime(2020, 2, 1), datetime.datetime(2020, 2, 10)
+
+        self.assertEqual(tools.read_window(start, end, 0, 420), (start, end))
+        self.assertEqual(tools.read_window(start, end, None, 420), (None, None))
+
+        pro = tools.read_pro_columns('examples/sample.pro')
+        info = tools.create_grid(pro, 'element density (kg m-3)', ymin=0, ymax=420)
+
+        self.assertEqual((info['min_height'], info['max_height']), (0, 420))
+
+    def test_grain_type_digits(self):
+
+        grid = np.array([[880., 72., np.nan], [0., -999., 591.]])
+
+        np.testing.assert_array_equal(tools.grain_type_digits(grid, 'F1'), [[8, 7, np.nan], [np.nan, np.nan, 5]])
+        np.testing.assert_array_equal(tools.grain_type_digits(grid, 'F2'), [[8, 2, np.nan], [np.nan, np.nan, 9]])
+        np.testing.assert_array_equal(tools.grain_type_digits(grid, 'F1F2'), [[88, 72, np.nan], [np.nan, np.nan, 59]])
+
+        original = grid.copy()
+        tools.transform_grid_for_grain_type(grid)
+        np.testing.assert_array_equal(grid, original)
+
+    def test_mesh_from_columns(self):
+
+        pro = tools.read_pro_columns('examples/sample.pro')
+
+        # Irregular steps: 1 h, then 3 h, then 1 h
+        pro = tools.select_timesteps(pro, [0, 1, 4, 5])
+
+        heights = pro['columns']['height [> 0: top, < 0: bottom of elem.] (cm)']
+        thickness = pro['columns']['thickness_m']
+        vertices, values = tools.mesh_from_columns(pro, 'element density (kg m-3)')
+
+        self.assertEqual(vertices.shape, (pro['offsets'][-1], 4, 2))
+        np.testing.assert_array_equal(values, pro['columns']['element density (kg m-3)'])
+
+        # Elements stack up without gaps and the lowest one is as thick as .PRO says
+        np.testing.assert_array_equal(vertices[:, 2, 1], heights)
+        column = slice(pro['offsets'][1], pro['offsets'][2])
+        np.testing.assert_array_equal(vertices[column, 0, 1][1:], heights[column][:-1])
+        np.testing.assert_allclose(vertices[column, 2, 1] - vertices[column, 0, 1], 100 * thickness[column])
+
+        widths = vertices[pro['offsets'][:-1], 1, 0] - vertices[pro['offsets'][:-1], 0, 0]
+        np.testing.assert_allclose(widths * 24, [1, 2, 2, 1])
+
+        fig, ax = plt.subplots()
+        tools.plot_mesh(pro, 'grain type (Swiss Code F1F2F3)', None, None, None, None, None, None, None,
+                        'plasma', 0, ax)
+        self.assertEqual(len(tools.plotted_mappable(ax).get_paths()), pro['offsets'][-1])
+        plt.close(fig)
+
+    def test_time_bins(self):
+
+        pro = tools.read_pro_columns('examples/sample.pro')
+        variable = 'element temperature (degC)'
+
+        full = tools.create_grid(pro, variable)
+        daily = tools.create_grid(pro, variable, time_bins='1D')
+
+        labels = tools.time_bin_labels(pro['dates'], '1D')
+        self.assertEqual(daily['grid'].shape, (100, len(np.unique(pro['dates'].astype('datetime64[D]')))))
+        self.assertEqual(daily['dates'][1], datetime.datetime(2020, 1, 28))
+
+        for count in range(daily['grid'].shape[1]):
+            in_bin = full['grid'][:, labels == count]
+            has_data = ~np.isnan(in_bin).all(axis=1)
+            np.testing.assert_allclose(daily['grid'][has_data, count], np.nanmean(in_bin[has_data], axis=1))
+            self.assertTrue(np.isnan(daily['grid'][~has_data, count]).all())
+
+        self.assertEqual(tools.create_grid(pro, variable, time_bins=40)['grid'].shape, (100, 40))
+
+        grid = np.array([[1., 2., 2., 5., np.nan, 3.],
+                         [np.nan, np.nan, 7., 4., 4., 3.]])
+        bin_starts = np.array([0, 3])
+
+        np.testing.assert_array_equal(tools.reduce_time_bins(grid, bin_starts, 'mode'), [[2, 3], [7, 4]])
+        np.testing.assert_array_equal(tools.reduce_time_bins(grid, bin_starts, 'max'), [[2, 5], [7, 4]])
+        np.testing.assert_array_equal(tools.reduce_time_bins(grid, bin_starts, 'last'), [[2, 3], [7, 3]])
+
+    def test_grain_type_time_bins(self):
+
+        # Three timesteps of faceted crystals (4) outvote two of ice (8), even though 880 is the commonest code
+
+        grain_types = np.array([[410., 420., 430., 880., 880.],
+                                [880., 410., 420., 880., np.nan]])
+
+        # A tie between shapes goes to the smaller F1, like ties between values do
+
+        np.testing.assert_array_equal(tools.reduce_time_bins(grain_types, np.array([0]), 'mode'), [[880], [880]])
+        np.testing.assert_array_equal(tools.reduce_time_bins(grain_types, np.array([0]), 'grain type'),
+                                      [[410], [410]])
+
+        variable = 'grain type (Swiss Code F1F2F3)'
+        pro = {'dates': pd.date_range('2021-01-01', periods=5, freq='h').to_numpy(),
+               'offsets': np.arange(6),
+               'columns': {'height [> 0: top, < 0: bottom of elem.] (cm)': np.full(5, 10.),
+                           variable: grain_types[0],
+                           'thickness_m': np.full(5, 0.1)}}
+
+        binned = tools.create_grid(pro, variable, time_bins=1)
+
+        self.assertEqual(binned['grid'].shape[1], 1)
+        self.assertEqual(set(binned['grid'][~np.isnan(binned['grid'])]), {410.})
+
+    def test_align_grid(self):
+
+        pro = tools.read_pro_columns('examples/sample.pro')
+        variable = 'element temperature (degC)'
+
+        hourly = tools.create_grid(pro, variable, ymin=385, ymax=420)
+        three_hourly = tools.create_grid(tools.select_timesteps(pro, np.arange(1, 373, 3)), variable,
+                                         ymin=385, ymax=420)
+
+        aligned, matched = tools.align_grid(three_hourly, hourly['dates'], 'exact')
+        np.testing.assert_array_equal(matched, np.arange(373) % 3 == 1)
+        np.testing.assert_array_equal(aligned[:, matched], three_hourly['grid'])
+
+        aligned, matched = tools.align_grid(three_hourly, hourly['dates'], 'nearest')
+        self.assertFalse(matched[0])
+        np.testing.assert_array_equal(matched, (np.arange(373) >= 1) & (np.arange(373) <= 370))
+        np.testing.assert_array_equal(aligned[:, 3], three_hourly['grid'][:, 1])
+
+        aligned, matched = tools.align_grid(three_hourly, hourly['dates'], 'asof', datetime.timedelta(hours=1))
+        np.testing.assert_array_equal(matched, np.arange(373) % 3 != 0)
+        np.testing.assert_array_equal(aligned[:, 2], three_hourly['grid'][:, 0])
+
+        aligned, matched = tools.align_grid(three_hourly, hourly['dates'], 'interpolate')
+        np.testing.assert_allclose(aligned[:, 2], (2 * three_hourly['grid'][:, 0] + three_hourly['grid'][:, 1]) / 3)
+
+        difference = tools.difference_grids(hourly, three_hourly, 'exact')
+        self.assertEqual(len(difference['unmatched']), 373 - len(three_hourly['dates']))
+        np.testing.assert_array_equal(difference['grid'][:, 1][~np.isnan(difference['grid'][:, 1])], 0)
+
+    def test_regrid_columns(self):
+
+        pro = tools.read_pro_columns('examples/sample.pro')
+
+        offsets = pro['offsets']
+        heights = pro['columns']['height [> 0: top, < 0: bottom of elem.] (cm)']
+        values = pro['columns']['element temperature (degC)']
+        vertical_grid = np.linspace(390, 430, 100)
+
+        for kind in ['nearest', 'linear']:
+
+            grid = tools.regrid_columns(heights, values, offsets, vertical_grid, kind)
+
+            for count in range(len(offsets) - 1):
+                column = slice(offsets[count], offsets[count + 1])
+                my_interp = interpolate.interp1d(heights[column], values[column], kind=kind,
+                                                 bounds_error=False, fill_value=(np.nan, np.nan))
+                np.testing.assert_array_equal(grid[:, count], my_interp(vertical_grid))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
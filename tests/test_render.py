@@ -0,0 +1,61 @@
+import unittest
+import io
+import struct
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from pyniviz import tools
+from pyniviz.render import FigurePool, render_grid, render_pro
+
+class TestRender(unittest.TestCase):
+
+    def setUp(self):
+
+        self.variable = 'element density (kg m-3)'
+        pro = tools.read_pro('examples/sample.pro', self.variable, columnar=True)
+        self.info = tools.create_grid(pro, self.variable)
+
+    def test_render_grid(self):
+
+        png = render_grid(self.info, self.variable, dpi=50, figsize=(4, 3))
+
+        self.assertEqual(png[:8], b'\x89PNG\r\n\x1a\n')
+        self.assertEqual(struct.unpack('>II', png[16:24]), (200, 150))
+
+        buffer = io.BytesIO()
+        self.assertIs(render_grid(self.info, self.variable, format='svg', buffer=buffer), buffer)
+        self.assertTrue(buffer.getvalue().startswith(b'<?xml'))
+
+        self.assertEqual(plt.get_fignums(), [])
+
+    def test_pool(self):
+
+        with FigurePool(size=1) as pool:
+
+            first = render_pro('examples/sample.pro', 'grain type', dpi=50, pool=pool)
+            for _ in range(3):
+                again = render_pro('examples/sample.pro', 'grain type', dpi=50, pool=pool)
+
+            self.assertEqual(first, again)
+            self.assertEqual(pool.created, 1)
+
+            # A figure in use isn't lent out twice
+
+            with pool.figure() as (fig, ax):
+                render_grid(self.info, self.variable, dpi=50, pool=pool)
+                self.assertEqual(pool.created, 2)
+
+            self.assertEqual(len(fig.axes), 0)
+
+        self.assertEqual(plt.get_fignums(), [])
+
+    def test_plot_grid_without_show(self):
+
+        tools.plot_grid(self.info, self.variable, None, None, None, None, None, None, None, 'plasma', 0, None,
+                        show=False)
+
+        self.assertEqual(plt.get_fignums(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
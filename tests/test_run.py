@@ -0,0 +1,73 @@
+import unittest
+import os
+import datetime
+import tempfile
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from pyniviz import tools
+from pyniviz.run import SnowpackRun
+
+class TestRun(unittest.TestCase):
+
+    def setUp(self):
+
+        # Half-hourly forcing over the sample run: TA counts the half hours, PSUM is 1 every step
+
+        self.pro = tools.read_pro_columns('examples/sample.pro')
+        times = np.arange(self.pro['dates'][0], self.pro['dates'][-1] + np.timedelta64(1, 'h'),
+                          np.timedelta64(30, 'm'))
+
+        with tempfile.NamedTemporaryFile('w', suffix='.smet', delete=False) as f:
+            f.write("SMET 1.1 ASCII\n[HEADER]\nnodata = -999\nfields = timestamp TA PSUM\n"
+                    "plot_unit = time K kg/m2\n[DATA]\n")
+            for count, time in enumerate(times):
+                f.write(f"{str(time)[:19]} {count} 1\n")
+            self.smet = f.name
+
+        self.run = SnowpackRun('examples/sample.pro', self.smet)
+
+    def tearDown(self):
+
+        os.remove(self.smet)
+        plt.close('all')
+
+    def test_window(self):
+
+        xmin, xmax = datetime.datetime(2020, 2, 1), datetime.datetime(2020, 2, 3)
+        window = self.run[xmin:xmax]
+
+        pro = window.profiles('density')
+        expected = tools.select_timesteps(self.pro, np.flatnonzero(tools.in_time_window(self.pro['dates'], xmin, xmax)))
+        np.testing.assert_array_equal(pro['dates'], expected['dates'])
+        np.testing.assert_array_equal(pro['columns']['element density (kg m-3)'],
+                                      expected['columns']['element density (kg m-3)'])
+
+        # The window shares what the run has read
+        self.assertIn('element density (kg m-3)', self.run._store['pro']['columns'])
+
+        forcing = window.forcing()
+        self.assertEqual(forcing.index[0], xmin)
+        self.assertEqual(forcing.index[-1], xmax)
+
+    def test_forcing_aligned(self):
+
+        nearest = self.run.forcing('TA', align='nearest')
+        np.testing.assert_array_equal(nearest.index, self.pro['dates'])
+        np.testing.assert_array_equal(nearest['TA'], 2 * np.arange(len(self.pro['dates'])))
+
+        # The forcing starts at the first profile, so the first interval only holds one value
+        summed = self.run.forcing('PSUM', align='sum')
+        self.assertEqual(summed['PSUM'].iloc[0], 1)
+        np.testing.assert_array_equal(summed['PSUM'].iloc[1:], 2)
+
+    def test_plot(self):
+
+        fig = self.run.plot('temperature', ['TA', 'PSUM'], ['SWE (kg m-2)'], ymin=385, ymax=420)
+        self.assertEqual(len(fig.axes), 5)
+        self.assertEqual(fig.axes[0].get_ylabel(), 'TA (K)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from pyniviz import tools
+
+class TestSmet(unittest.TestCase):
+
+    def test_read_smet_header(self):
+
+        header = tools.read_smet_header('examples/sample.smet')
+
+        self.assertEqual(header['fields'], ['timestamp', 'TA', 'RH', 'QI', 'VW', 'ISWR', 'ILWR', 'PSUM'])
+        self.assertEqual(header['nodata'], -999)
+        self.assertEqual(header['units']['TA'], 'K')
+        self.assertEqual(header['metadata']['station_id'], 'AWS6')
+        self.assertEqual(header['metadata']['altitude'], 1245.4)
+
+    def test_read_smet(self):
+
+        df = tools.read_smet('examples/sample.smet', ['TA', 'RH'])
+
+        self.assertEqual(list(df.columns), ['TA', 'RH'])
+        self.assertEqual(df.index[2], pd.Timestamp(2014, 1, 1, 2))
+        self.assertEqual(df['TA'].iloc[2], 257.39)
+        self.assertTrue(np.isnan(df['RH'].iloc[0]))
+        self.assertFalse((df == -999).any().any())
+
+        single = tools.read_smet('examples/sample.smet', 'RH')
+        np.testing.assert_array_equal(single['RH'], df['RH'])
+
+        with self.assertRaises(ValueError):
+            tools.read_smet('examples/sample.smet', 'not a field')
+
+    def test_julian(self):
+
+        with tempfile.NamedTemporaryFile('w', suffix='.smet', delete=False) as f:
+            f.write("SMET 1.1 ASCII\n[HEADER]\nnodata = -9999\nfields = julian TA\n[DATA]\n"
+                    "2456658.5 270.1\n2456658.541666667 -9999\n")
+
+        try:
+            df = tools.read_smet(f.name)
+        finally:
+            os.remove(f.name)
+
+        self.assertEqual(df.index[0], pd.Timestamp(2014, 1, 1))
+        self.assertTrue(np.isnan(df['TA'].iloc[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
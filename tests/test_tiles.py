@@ -0,0 +1,98 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+import matplotlib.image
+from pyniviz import tools
+from pyniviz.tiles import downsample, export_tiles
+
+class TestTiles(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def test_downsample(self):
+
+        grid = np.array([[1, 2, 3],
+                         [4, np.nan, 6],
+                         [7, 8, 9]])
+
+        np.testing.assert_allclose(downsample(grid), [[7 / 3, 4.5], [7.5, 9]])
+
+        grain_types = np.array([[880, 880, 220, np.nan],
+                                [110, 110, np.nan, np.nan]])
+
+        np.testing.assert_array_equal(downsample(grain_types, 'mode'), [[110, 220]])
+
+        # Grain types are counted by primary shape: two faceted crystals (4) of different codes count as much as two
+        # of ice (880), and three rounded grains (3) outvote one of ice
+
+        grain_types = np.array([[410, 880, 350, 340],
+                                [420, 880, 880, 340]], dtype=float)
+
+        np.testing.assert_array_equal(downsample(grain_types, 'mode'), [[880, 340]])
+        np.testing.assert_array_equal(downsample(grain_types, 'grain type'), [[410, 340]])
+
+    def test_export_tiles(self):
+
+        variable = 'element temperature (degC)'
+        out_dir = os.path.join(self.directory, 'npy')
+
+        manifest = export_tiles('examples/sample.pro', out_dir, 'temperature', format='npy', tile_size=64,
+                                grid_resolution=200, max_workers=1)
+
+        with open(os.path.join(out_dir, 'manifest.json')) as f:
+            self.assertEqual(json.load(f), manifest)
+
+        self.assertEqual([(level['rows'], level['columns']) for level in manifest['levels']],
+                         [(25, 47), (50, 94), (100, 187), (200, 373)])
+        self.assertEqual((manifest['levels'][0]['tiles_x'], manifest['levels'][-1]['tiles_x']), (1, 6))
+
+        with open(os.path.join(out_dir, 'dates.json')) as f:
+            self.assertEqual(len(json.load(f)), 373)
+
+        # Finest level tiles hold the grid itself
+
+        pro = tools.read_pro('examples/sample.pro', variable, columnar=True)
+        grid = tools.create_grid(pro, variable, grid_resolution=200, dtype=np.float32)['grid']
+
+        tile = np.load(os.path.join(out_dir, '3', '1', '3.npy'))
+        np.testing.assert_array_equal(tile, grid[64:128, 192:256])
+
+        written = sum(len(files) for _, _, files in os.walk(out_dir)) - 2
+        self.assertEqual(written, manifest['tile_count'])
+
+    def test_png_tiles_parallel(self):
+
+        serial = export_tiles('examples/sample.pro', os.path.join(self.directory, 'serial'), 'grain type',
+                              tile_size=128, max_workers=1)
+        export_tiles('examples/sample.pro', os.path.join(self.directory, 'parallel'), 'grain type',
+                     tile_size=128, max_workers=2)
+
+        self.assertEqual(serial['colormap'], 'grain_type_map')
+        self.assertEqual((serial['vmin'], serial['vmax']), (0.5, 9.5))
+
+        for level in serial['levels']:
+            for row in range(level['tiles_y']):
+                for column in range(level['tiles_x']):
+                    tile = os.path.join(str(level['level']), str(row), f"{column}.png")
+                    first = os.path.join(self.directory, 'serial', tile)
+                    self.assertEqual(os.path.exists(first),
+                                     os.path.exists(os.path.join(self.directory, 'parallel', tile)))
+                    if os.path.exists(first):
+                        image = matplotlib.image.imread(first)
+                        np.testing.assert_array_equal(image, matplotlib.image.imread(
+                            os.path.join(self.directory, 'parallel', tile)))
+
+        self.assertEqual(image.shape, (128, 128, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()